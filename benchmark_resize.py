@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Compare resizing images the old way with multiupload.imaging.render.
+
+Usage: python benchmark_resize.py [image or folder ...]
+
+Each image is resized to fit in 1280x1280, as for FurAffinity and Twitter, by
+both paths. Every run happens in a new process so the peak memory used by
+the resize can be measured. Without arguments a few large images are
+generated to use instead.
+"""
+
+from io import BytesIO
+from multiprocessing import Pool
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from multiupload.imaging import render
+
+SIZE = 1280
+RUNS = 5
+
+
+def legacy_render(source: bytes, height: int, width: int) -> bytes:
+    """How Submission.resize_image resized images before render."""
+    image = Image.open(BytesIO(source))
+    format = image.format
+
+    if not image.mode.startswith('RGB'):
+        image = image.convert('RGBA')
+
+    image.thumbnail((height, width), Image.ANTIALIAS)
+
+    data = BytesIO()
+    image.save(data, format)
+
+    return data.getvalue()
+
+
+PATHS: Dict[str, Callable[..., bytes]] = {'legacy': legacy_render, 'render': render}
+
+
+def measure(path: str, name: str) -> Optional[Tuple[float, int]]:
+    with open(path, 'rb') as f:
+        source = f.read()
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    try:
+        PATHS[name](source, SIZE, SIZE)
+    except OSError:
+        return None
+    duration = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+    return duration, peak
+
+
+def generate_corpus(folder: str) -> List[str]:
+    images = [
+        ('photo.jpg', 'RGB', (8000, 6000), 'JPEG'),
+        ('print.jpg', 'CMYK', (6000, 4000), 'JPEG'),
+        ('sketch.jpg', 'L', (6000, 8000), 'JPEG'),
+        ('painting.png', 'RGBA', (4000, 4000), 'PNG'),
+        ('small.jpg', 'RGB', (1600, 1200), 'JPEG'),
+    ]
+
+    paths = []
+
+    for name, mode, size, format in images:
+        path = os.path.join(folder, name)
+
+        # Noise keeps encoders from making the files unrealistically small
+        image = Image.effect_noise(size, 64).convert(mode)
+        image.save(path, format)
+
+        paths.append(path)
+
+    return paths
+
+
+def find_images(args: Iterable[str]) -> Iterator[str]:
+    for arg in args:
+        if os.path.isdir(arg):
+            for name in sorted(os.listdir(arg)):
+                yield os.path.join(arg, name)
+        else:
+            yield arg
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        paths = list(find_images(sys.argv[1:])) or generate_corpus(folder)
+
+        print(
+            '{0:<20} {1:>8} {2:>12} {3:>12} {4:>10}'.format(
+                'image', 'path', 'median ms', 'peak MiB', 'speedup'
+            )
+        )
+
+        for path in paths:
+            results: Dict[str, Optional[Tuple[float, float]]] = {}
+
+            for name in PATHS:
+                # A new process for every run, so peak memory starts from zero
+                with Pool(1, maxtasksperchild=1) as pool:
+                    runs = [pool.apply(measure, (path, name)) for _ in range(RUNS)]
+
+                measured = [run for run in runs if run]
+
+                if len(measured) < len(runs):
+                    results[name] = None
+                else:
+                    results[name] = (
+                        statistics.median(run[0] for run in measured),
+                        max(run[1] for run in measured) / 1024,
+                    )
+
+            for name, result in results.items():
+                image = os.path.basename(path)[:20]
+
+                if not result:
+                    print('{0:<20} {1:>8} {2:>12}'.format(image, name, 'failed'))
+                    continue
+
+                duration, peak = result
+
+                speedup = '-'
+                if results['legacy']:
+                    speedup = '{0:.2f}x'.format(results['legacy'][0] / duration)
+
+                print(
+                    '{0:<20} {1:>8} {2:>12.1f} {3:>12.1f} {4:>10}'.format(
+                        image, name, duration * 1000, peak, speedup
+                    )
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Batches that upload everything a user has pending review.
+
+Each submittable item becomes a scheduled UploadJob. Start times are spaced so
+every site gets the same pause between uploads as the items of a group, and
+because jobs are stored in the database a batch carries on after restarts.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import g
+
+from multiupload.constant import Sites
+from multiupload.models import (
+    Account,
+    JobStatus,
+    SavedSubmission,
+    SubmissionGroup,
+    UploadBatch,
+    UploadJob,
+    db,
+)
+from multiupload.sites.known import KNOWN_SITES
+
+
+@dataclass
+class BatchItem:
+    """A saved submission or group to upload, with how many uploads it makes
+    to each site."""
+
+    kind: str
+    target_id: int
+    uploads: Dict[Sites, int]
+
+
+@dataclass
+class BatchProgress:
+    total: int
+    done: int
+    failed: int
+    cancelled: int
+    # Finished jobs per hour, once any have finished
+    throughput: Optional[float]
+    eta: Optional[datetime]
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.done - self.failed - self.cancelled
+
+
+def count_uploads(accounts: List[Account], items: int = 1) -> Dict[Sites, int]:
+    """Count uploads by site, sites without group support get every item of a
+    group uploaded separately."""
+    uploads: Dict[Sites, int] = Counter()
+
+    for account in accounts:
+        site = next(site for site in KNOWN_SITES if site.SITE == account.site)
+        uploads[account.site] += 1 if site.supports_group() else items
+
+    return dict(uploads)
+
+
+def pending_items() -> List[BatchItem]:
+    """Items pending review that are ready to upload and are not already
+    queued or scheduled."""
+    items: List[BatchItem] = []
+
+    for sub in SubmissionGroup.get_ungrouped_submissions():
+        if sub.has_all() and not UploadJob.find_active('art', sub.id):
+            items.append(BatchItem('art', sub.id, count_uploads(sub.accounts)))
+
+    for group in SubmissionGroup.get_groups():
+        if not group.grouped or not group.submittable:
+            continue
+
+        master: Optional[SavedSubmission] = group.master
+        if not master or not master.accounts:
+            continue
+
+        if not UploadJob.find_active('group', group.id):
+            uploads = count_uploads(master.accounts, len(group.submissions))
+            items.append(BatchItem('group', group.id, uploads))
+
+    return items
+
+
+def plan_batch(
+    items: List[BatchItem], delays: Dict[Sites, float], start: datetime
+) -> List[Tuple[BatchItem, datetime]]:
+    """Pick a start time for each item, in order. An item starts once every
+    site it uploads to has had its delay since the previous item's uploads."""
+    available: Dict[Sites, datetime] = {}
+    planned: List[Tuple[BatchItem, datetime]] = []
+
+    for item in items:
+        at = max([start] + [available.get(site, start) for site in item.uploads])
+
+        for site, count in item.uploads.items():
+            available[site] = at + timedelta(seconds=delays.get(site, 0) * count)
+
+        planned.append((item, at))
+
+    return planned
+
+
+def create_batch() -> Optional[UploadBatch]:
+    """Schedule everything pending for the current user in a new batch."""
+    items = pending_items()
+    if not items:
+        return None
+
+    batch = UploadBatch(g.user)
+    db.session.add(batch)
+    db.session.commit()
+
+    delays = {site.SITE: site.group_delay() for site in KNOWN_SITES}
+
+    for item, at in plan_batch(items, delays, datetime.utcnow()):
+        db.session.add(UploadJob(g.user, item.kind, item.target_id, at, batch))
+
+    db.session.commit()
+
+    return batch
+
+
+def batch_progress(batch: UploadBatch, now: Optional[datetime] = None) -> BatchProgress:
+    """How far along a batch is, and when it is expected to finish.
+
+    Throughput is measured from when the first job was due, the estimate is
+    never before the last job is scheduled to start. Cancelled jobs never run,
+    so they are left out of both."""
+    now = now or datetime.utcnow()
+    jobs: List[UploadJob] = batch.jobs.all()
+
+    done = sum(1 for job in jobs if job.status == JobStatus.done)
+    failed = sum(1 for job in jobs if job.status == JobStatus.failed)
+    cancelled = sum(1 for job in jobs if job.status == JobStatus.cancelled)
+    remaining = len(jobs) - done - failed - cancelled
+
+    scheduled = [
+        job.scheduled_at or job.created_at
+        for job in jobs
+        if job.status != JobStatus.cancelled
+    ]
+    started = min(scheduled, default=now)
+
+    throughput: Optional[float] = None
+    elapsed = (now - started).total_seconds()
+    if done + failed and elapsed > 0:
+        throughput = (done + failed) / elapsed * 3600
+
+    eta: Optional[datetime] = None
+    if remaining:
+        eta = max(scheduled)
+        if throughput:
+            eta = max(eta, now + timedelta(hours=remaining / throughput))
+
+    return BatchProgress(len(jobs), done, failed, cancelled, throughput, eta)
@@ -0,0 +1,171 @@
+"""Circuit breakers for sites, fed by the responses given to write_site_response.
+
+After enough consecutive failed or slow responses from a site its breaker
+opens, and uploads to the site stop being attempted. Once the cooldown has
+passed the breaker is half-open, and a single probe decides if it closes again
+or stays open for another cooldown. State is kept in a SQLite database, so it
+is shared by every thread and process on the machine.
+"""
+
+from enum import Enum
+import os
+import sqlite3
+import tempfile
+from threading import Lock
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+
+
+class BreakerState(Enum):
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half-open'
+
+
+class CircuitBreaker(object):
+    """CircuitBreaker tracks consecutive failures for each key.
+
+    A response is a failure if the site was overloaded or had an error, or if
+    it took longer than slow seconds."""
+
+    def __init__(
+        self, path: str, failures: int = 5, slow: float = 30, cooldown: float = 60
+    ) -> None:
+        self.path = path
+        self.failures = failures
+        self.slow = slow
+        self.cooldown = cooldown
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS breaker '
+                '(key TEXT PRIMARY KEY, failures INTEGER NOT NULL, '
+                'opened_at REAL, probe_at REAL)'
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def _load(
+        self, conn: sqlite3.Connection, key: str
+    ) -> Tuple[int, Optional[float], Optional[float]]:
+        row = conn.execute(
+            'SELECT failures, opened_at, probe_at FROM breaker WHERE key = ?', (key,)
+        ).fetchone()
+
+        return row or (0, None, None)
+
+    def _state(self, opened_at: Optional[float], now: float) -> BreakerState:
+        if opened_at is None:
+            return BreakerState.closed
+
+        if now - opened_at < self.cooldown:
+            return BreakerState.open
+
+        return BreakerState.half_open
+
+    def record(self, key: str, ok: bool) -> None:
+        """Record the outcome of a request."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+
+            failures, opened_at, probe_at = self._load(conn, key)
+
+            if ok:
+                failures, opened_at, probe_at = 0, None, None
+            else:
+                failures += 1
+                if failures >= self.failures:
+                    opened_at, probe_at = time.time(), None
+
+            conn.execute(
+                'INSERT OR REPLACE INTO breaker (key, failures, opened_at, probe_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, failures, opened_at, probe_at),
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def observe(self, key: str, status_code: int, duration: float) -> None:
+        """Record a response from the site."""
+        failed = status_code >= 500 or status_code == 429 or duration > self.slow
+
+        self.record(key, not failed)
+
+    def state(self, key: str) -> BreakerState:
+        conn = self._connect()
+        try:
+            _, opened_at, _ = self._load(conn, key)
+        finally:
+            conn.close()
+
+        return self._state(opened_at, time.time())
+
+    def retry_in(self, key: str) -> float:
+        """Seconds until the breaker is half-open, 0 if it is not open."""
+        conn = self._connect()
+        try:
+            _, opened_at, _ = self._load(conn, key)
+        finally:
+            conn.close()
+
+        if opened_at is None:
+            return 0
+
+        return max(opened_at + self.cooldown - time.time(), 0)
+
+    def claim_probe(self, key: str) -> bool:
+        """Claim the probe of a half-open breaker. Only one caller gets it
+        until the probe's result is recorded, or a cooldown has passed."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+
+            now = time.time()
+
+            failures, opened_at, probe_at = self._load(conn, key)
+
+            claimed = self._state(opened_at, now) == BreakerState.half_open and (
+                probe_at is None or now - probe_at > self.cooldown
+            )
+
+            if claimed:
+                conn.execute(
+                    'UPDATE breaker SET probe_at = ? WHERE key = ?', (now, key)
+                )
+
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+        return claimed
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Get the CircuitBreaker for the database in BREAKER_DB."""
+    path = current_app.config.get(
+        'BREAKER_DB', os.path.join(tempfile.gettempdir(), 'multiupload-breakers.db')
+    )
+
+    with _breakers_lock:
+        breaker = _breakers.get(path)
+        if not breaker:
+            breaker = _breakers[path] = CircuitBreaker(
+                path,
+                current_app.config.get('BREAKER_FAILURES', 5),
+                current_app.config.get('BREAKER_SLOW', 30),
+                current_app.config.get('BREAKER_COOLDOWN', 60),
+            )
+
+    return breaker
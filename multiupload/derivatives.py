@@ -0,0 +1,127 @@
+"""A store on disk for images derived from uploads, such as resized copies.
+
+Derivatives are named by the SHA-256 of their source image and the transform
+that made them, so they can be shared by every worker using the same folder
+no matter what the source file was called. Files are written somewhere else
+and moved into place so a partial file is never read. Once the folder grows
+past its maximum size, the least recently used files are removed.
+"""
+
+import os
+from os.path import join
+from threading import Lock, get_ident
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+# Removing files until the store is this much of its maximum size, so it is
+# not scanned again after every write
+EVICT_TO = 0.9
+
+
+class DerivativeStore(object):
+    """DerivativeStore keeps derivatives in folder, removing old ones once
+    they use more than max_size bytes."""
+
+    def __init__(self, folder: str, max_size: int) -> None:
+        self.folder = folder
+        self.max_size = max_size
+
+        # Bytes that can be written before the folder needs to be checked,
+        # unknown until it is scanned
+        self.free: Optional[int] = None
+        self.lock = Lock()
+
+    def path(self, digest: str, transform: str) -> str:
+        return join(self.folder, digest[:2], '{0}-{1}'.format(digest, transform))
+
+    def get(self, digest: str, transform: str) -> Optional[bytes]:
+        path = self.path(digest, transform)
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return data
+
+    def put(self, digest: str, transform: str, data: bytes) -> None:
+        path = self.path(digest, transform)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp = '{0}.{1}-{2}.tmp'.format(path, os.getpid(), get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            if self.free is not None:
+                self.free -= len(data)
+
+            if self.free is None or self.free < 0:
+                self.evict()
+
+    def files(self) -> List[Tuple[float, int, str]]:
+        """Every derivative with when it was last used and its size."""
+        files = []
+
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+
+                path = join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        return files
+
+    def evict(self) -> None:
+        """Remove the least recently used files if the store is too large."""
+        files = sorted(self.files())
+        size = sum(file[1] for file in files)
+
+        if size > self.max_size:
+            target = self.max_size * EVICT_TO
+
+            for _, file_size, path in files:
+                if size <= target:
+                    break
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # Already removed by another worker
+
+                size -= file_size
+
+        # Other workers write to the folder too, so check again before long
+        self.free = int(min(self.max_size - size, self.max_size * (1 - EVICT_TO)))
+
+
+_stores: Dict[str, DerivativeStore] = {}
+_stores_lock = Lock()
+
+
+def get_store() -> DerivativeStore:
+    """Get the DerivativeStore for the folder in DERIVATIVE_FOLDER."""
+    folder = current_app.config.get(
+        'DERIVATIVE_FOLDER', join(current_app.config['UPLOAD_FOLDER'], 'derivatives')
+    )
+
+    with _stores_lock:
+        store = _stores.get(folder)
+        if not store:
+            store = _stores[folder] = DerivativeStore(
+                folder, current_app.config.get('DERIVATIVE_MAX_SIZE', 1024 ** 3)
+            )
+
+    return store
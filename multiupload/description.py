@@ -1,5 +1,181 @@
+"""Descriptions written once, converted for each site.
+
+A description is parsed into a tree of tokens: mentions of users on a site,
+Markdown links, emphasis, inline code and horizontal rules, with plain text
+between them. The tree is then rendered for the site being uploaded to,
+converting mentions to each site's own syntax and Markdown to BBCode or HTML
+for the sites without support for it. Each Site declares how it writes
+mentions and Markdown, and the known sites are added to the tables used here
+the first time a description is rendered.
+
+Previews are rendered again each time the description is edited, so they go
+through a DescriptionCache holding the most recently rendered descriptions.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from hashlib import sha256
 import re
-from typing import Optional
+from threading import Lock
+from typing import Dict, Iterable, List, Match, Optional, Tuple, Union
+
+from flask import current_app
+
+from multiupload.constant import Sites
+
+MENTION = re.compile(r'<\|(\S+?),(\d+?),(\d)\|>')
+
+# Mentions are swapped for placeholders before Markdown is parsed, so Markdown
+# can't start or end inside of one. Private use characters that can't mean
+# anything in a description mark them.
+PLACEHOLDER = re.compile('\ue000(\\d+)\ue001')
+PLACEHOLDER_CHARS = str.maketrans('', '', '\ue000\ue001')
+
+# Every Markdown token, tried in this order at each position of the
+# description. Emphasis ends at the first closing mark that isn't part of a
+# longer run of marks, so several emphasized words on one line stay separate.
+TOKEN = re.compile(
+    r'(?P<link>\[(?P<link_text>[^\]]+)\]\((?P<url>[^)"]+)(?P<title> \"[^\"]+\")?\))'
+    r'|(?P<code>`(?P<code_text>.+?)`)'
+    r'|(?P<strong>(?P<strong_mark>[*_]{2})(?P<strong_text>.+?)(?P=strong_mark)(?![*_]))'
+    r'|(?P<strike>(?P<strike_mark>~~)(?P<strike_text>.+?)~~)'
+    r'|(?P<em>(?P<em_mark>[*_])(?P<em_text>.+?)(?<![*_])(?P=em_mark)(?![*_]))'
+    r'|(?P<rule>\n-{5,})'
+)
+
+
+@dataclass
+class Text:
+    text: str
+
+
+@dataclass
+class Mention:
+    username: str
+    linking_to: int
+    link_type: int
+
+
+@dataclass
+class Link:
+    children: List['Node']
+    url: List['Node']
+    title: str  # As written, with the space and quotes
+
+
+@dataclass
+class Code:
+    children: List['Node']
+
+
+@dataclass
+class Emphasis:
+    style: str  # strong, em or strike
+    mark: str
+    children: List['Node']
+
+
+@dataclass
+class Rule:
+    text: str
+
+
+Node = Union[Text, Mention, Link, Code, Emphasis, Rule]
+
+# A site's mentions of users on a site, one template for every link type or a
+# template for each. Templates are given the username, the username in lower
+# case, the username as a SoFurry subdomain and a link to a Mastodon user.
+MentionFormats = Union[str, Dict[int, str]]
+
+# Link types are a single digit
+LINK_TYPES = range(10)
+
+
+@dataclass(frozen=True)
+class Markup:
+    """Markup is how Markdown is written on a site without support for it.
+    Each style is the text opening and closing it."""
+
+    strong: Tuple[str, str]
+    em: Tuple[str, str]
+    strike: Tuple[str, str]
+    code: Tuple[str, str]
+    link: str  # Template given the url and text
+    rule: str = ''  # Horizontal rules are removed when not set
+
+
+BBCODE = Markup(
+    strong=('[b]', '[/b]'),
+    em=('[i]', '[/i]'),
+    strike=('[s]', '[/s]'),
+    code=('[code]', '[/code]'),
+    link='[url={url}]{text}[/url]',
+)
+
+HTML = Markup(
+    strong=('<strong>', '</strong>'),
+    em=('<em>', '</em>'),
+    strike=('<strike>', '</strike>'),
+    code=('', ''),
+    link='<a href="{url}">{text}</a>',
+)
+
+# Mentions on sites with Markdown, as Markdown links
+MARKDOWN_MENTIONS: Dict[Sites, MentionFormats] = {
+    Sites.FurAffinity: '[{username}](https://www.furaffinity.net/user/{username}/)',
+    Sites.Weasyl: '[{username}](https://www.weasyl.com/~{username})',
+    Sites.FurryNetwork: '[{username}](https://beta.furrynetwork.com/{username})',
+    Sites.Inkbunny: '[{username}](https://inkbunny.net/{username})',
+    Sites.SoFurry: '[{username}](https://{sofurry}.sofurry.com/)',
+    Sites.Twitter: '[{username}](https://twitter.com/{username})',
+    Sites.Mastodon: '[{username}]({mastodon})',
+    Sites.Tumblr: '[{username}](https://{username}.tumblr.com/)',
+    Sites.DeviantArt: '[{username}](https://{lower}.deviantart.com/)',
+}
+
+# Mention templates by the site uploaded to, the site of the user and the link
+# type, and Markup by the site uploaded to. Filled from each known site.
+MENTIONS: Dict[Tuple[int, int, int], str] = {}
+MARKUP: Dict[int, Markup] = {}
+
+_known_sites_added = False
+_known_sites_lock = Lock()
+
+
+def add_site(
+    site: Sites, mentions: Dict[Sites, MentionFormats], markup: Optional[Markup]
+) -> None:
+    """Add how a site writes mentions and Markdown to the tables descriptions
+    are rendered with."""
+    for linking_to, formats in mentions.items():
+        if isinstance(formats, str):
+            formats = {link_type: formats for link_type in LINK_TYPES}
+
+        for link_type, template in formats.items():
+            MENTIONS[(site.value, linking_to.value, link_type)] = template
+
+    if markup:
+        MARKUP[site.value] = markup
+
+
+def add_known_sites() -> None:
+    """Add every known site to the tables, once. Sites import this module to
+    declare their formats, so they can't be added when it is loaded."""
+    global _known_sites_added
+
+    if _known_sites_added:
+        return
+
+    from multiupload.sites.known import KNOWN_SITES
+
+    with _known_sites_lock:
+        if _known_sites_added:
+            return
+
+        for site in KNOWN_SITES:
+            add_site(site.SITE, site.MENTIONS, site.MARKUP)
+
+        _known_sites_added = True
 
 
 def get_mastodon_link(username: str) -> Optional[str]:
@@ -12,290 +188,252 @@ def get_mastodon_link(username: str) -> Optional[str]:
     )
 
 
+def parse(description: str) -> List[Node]:
+    """Parse a description into tokens. Mentions are found first and can't be
+    broken up by Markdown around them, then Markdown is parsed in a single
+    pass."""
+    mentions: List[Mention] = []
+
+    def hold(match: Match) -> str:
+        mentions.append(
+            Mention(match.group(1), int(match.group(2)), int(match.group(3)))
+        )
+        return '\ue000{0}\ue001'.format(len(mentions) - 1)
+
+    text = MENTION.sub(hold, description.translate(PLACEHOLDER_CHARS))
+
+    return parse_markdown(text, mentions)
+
+
+def parse_text(text: str, mentions: List[Mention]) -> List[Node]:
+    """Split text into plain text and the mentions held in it."""
+    nodes: List[Node] = []
+    position = 0
+
+    for match in PLACEHOLDER.finditer(text):
+        start, end = match.span(0)
+        if start > position:
+            nodes.append(Text(text[position:start]))
+        position = end
+
+        nodes.append(mentions[int(match.group(1))])
+
+    if position < len(text):
+        nodes.append(Text(text[position:]))
+
+    return nodes
+
+
+def parse_markdown(text: str, mentions: List[Mention]) -> List[Node]:
+    nodes: List[Node] = []
+    position = 0
+
+    for match in TOKEN.finditer(text):
+        start, end = match.span(0)
+        if start > position:
+            nodes.extend(parse_text(text[position:start], mentions))
+        position = end
+
+        kind = match.lastgroup
+        if kind == 'link':
+            nodes.append(
+                Link(
+                    parse_markdown(match.group('link_text'), mentions),
+                    parse_text(match.group('url'), mentions),
+                    match.group('title') or '',
+                )
+            )
+        elif kind == 'code':
+            nodes.append(Code(parse_text(match.group('code_text'), mentions)))
+        elif kind == 'rule':
+            nodes.append(Rule(match.group('rule')))
+        elif kind:
+            nodes.append(
+                Emphasis(
+                    kind,
+                    match.group(kind + '_mark'),
+                    parse_markdown(match.group(kind + '_text'), mentions),
+                )
+            )
+
+    if position < len(text):
+        nodes.extend(parse_text(text[position:], mentions))
+
+    return nodes
+
+
+def render_mention(
+    username: str, linking_to: int, link_type: int, uploading_to: int
+) -> str:
+    """Link to a user on linking_to, in a description for uploading_to."""
+    add_known_sites()
+
+    template = MENTIONS.get((uploading_to, linking_to, link_type))
+    if not template:
+        return ''
+
+    return template.format(
+        username=username,
+        lower=username.lower(),
+        sofurry=username.lower().replace(' ', '-').replace('_', '-'),
+        mastodon=get_mastodon_link(username),
+    )
+
+
+def render(nodes: List[Node], uploading_to: int) -> str:
+    """Render parsed tokens as a description for uploading_to."""
+    add_known_sites()
+
+    parts: List[str] = []
+    render_into(parts, nodes, uploading_to)
+
+    return ''.join(parts)
+
+
+def render_into(parts: List[str], nodes: List[Node], uploading_to: int) -> None:
+    markup = MARKUP.get(uploading_to)
+
+    for node in nodes:
+        if isinstance(node, Text):
+            parts.append(node.text)
+        elif isinstance(node, Mention):
+            parts.append(
+                render_mention(
+                    node.username, node.linking_to, node.link_type, uploading_to
+                )
+            )
+        elif isinstance(node, Link):
+            text: List[str] = []
+            render_into(text, node.children, uploading_to)
+
+            url: List[str] = []
+            render_into(url, node.url, uploading_to)
+
+            link = markup.link if markup else '[{text}]({url}{title})'
+            parts.append(
+                link.format(text=''.join(text), url=''.join(url), title=node.title)
+            )
+        elif isinstance(node, Code):
+            opening, closing = markup.code if markup else ('`', '`')
+
+            parts.append(opening)
+            render_into(parts, node.children, uploading_to)
+            parts.append(closing)
+        elif isinstance(node, Emphasis):
+            opening, closing = (
+                getattr(markup, node.style) if markup else (node.mark, node.mark)
+            )
+
+            parts.append(opening)
+            render_into(parts, node.children, uploading_to)
+            parts.append(closing)
+        elif isinstance(node, Rule):
+            parts.append(markup.rule if markup else node.text)
+
+
 def parse_description(description: Optional[str], uploading_to: int) -> Optional[str]:
     """Attempt to parse a description into a format valid for each site."""
     if not description:
         return None
 
-    exp = r'<\|(\S+?),(\d+?),(\d)\|>'
-    match = re.search(exp, description)
+    return render(parse(description), uploading_to)
 
-    runs = 0
 
-    while match:
-        if runs > 500:
-            break
-        runs += 1
+def render_all(
+    description: Optional[str], sites: Iterable[int]
+) -> Dict[int, Optional[str]]:
+    """Parse a description once and render it for each of sites."""
+    if not description:
+        return {site: None for site in sites}
 
-        start, end = match.span(0)
+    nodes = parse(description)
+
+    return {site: render(nodes, site) for site in sites}
+
+
+class DescriptionCache(object):
+    """DescriptionCache keeps the max_size most recently used descriptions
+    rendered for a site, by the hash of the description and the site."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+
+        self.descriptions: 'OrderedDict[Tuple[str, int], Optional[str]]' = OrderedDict()
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def render_all(
+        self, description: Optional[str], sites: Iterable[int]
+    ) -> Dict[int, Optional[str]]:
+        """Render a description for each of sites, parsing it only if some
+        sites weren't already rendered."""
+        digest = sha256((description or '').encode('utf-8')).hexdigest()
+        sites = list(sites)
+
+        rendered: Dict[int, Optional[str]] = {}
+
+        with self.lock:
+            for site in sites:
+                key = (digest, site)
+
+                if key in self.descriptions:
+                    self.descriptions.move_to_end(key)
+                    rendered[site] = self.descriptions[key]
+
+            missing = [site for site in sites if site not in rendered]
+
+            self.hits += len(rendered)
+            self.misses += len(missing)
+
+        self.report(len(rendered), len(missing))
+
+        if not missing:
+            return rendered
+
+        # Rendered without the lock, so other descriptions aren't held up
+        values = render_all(description, missing)
+        rendered.update(values)
+
+        with self.lock:
+            for site, value in values.items():
+                self.descriptions[(digest, site)] = value
+
+            while len(self.descriptions) > self.max_size:
+                self.descriptions.popitem(last=False)
+
+        return rendered
+
+    def report(self, hits: int, misses: int) -> None:
+        # Imported here as models imports submissions, which render with this
+        from multiupload.utils import send_to_influx
+
+        send_to_influx(
+            {
+                'measurement': 'description_cache',
+                'fields': {
+                    'hits': hits,
+                    'misses': misses,
+                    'size': len(self.descriptions),
+                },
+            }
+        )
+
+
+_cache: Optional[DescriptionCache] = None
+_cache_lock = Lock()
+
+
+def get_description_cache() -> DescriptionCache:
+    """Get the DescriptionCache for this process, holding at most
+    DESCRIPTION_CACHE_SIZE descriptions."""
+    global _cache
+
+    with _cache_lock:
+        if not _cache:
+            _cache = DescriptionCache(
+                current_app.config.get('DESCRIPTION_CACHE_SIZE', 2048)
+            )
 
-        try:
-            username = match.group(1)
-            linking_to = int(match.group(2))
-            link_type = int(match.group(3))
-        except ValueError:
-            return None
-
-        masto_link = get_mastodon_link(username)
-
-        new_text = ''
-
-        if uploading_to == linking_to:  # Uploading to same site
-            if uploading_to == 1:  # FurAffinity
-                if link_type == 0:  # Just link
-                    new_text = ':link%s:' % username
-                elif link_type == 1:  # Just icon
-                    new_text = ':%sicon:' % username
-                elif link_type == 2:  # Both
-                    new_text = ':icon%s:' % username
-            elif uploading_to == 2:  # Weasyl
-                if link_type == 0:
-                    new_text = '<~%s>' % username
-                elif link_type == 1:
-                    new_text = '<!%s>' % username
-                elif link_type == 2:
-                    new_text = '<!~%s>' % username
-            elif uploading_to == 3:  # FurryNetwork
-                new_text = '[{0}](https://beta.furrynetwork.com/{0}/)'.format(username)
-            elif uploading_to == 4:
-                if link_type == 0:
-                    new_text = '[name]%s[/name]' % username
-                elif link_type == 1:
-                    new_text = '[icon]%s[/icon]' % username
-                elif link_type == 2:
-                    new_text = '[iconname]%s[/iconname]' % username
-            elif uploading_to == 5:
-                if link_type == 0:
-                    clean = username.lower().replace(' ', '-').replace('_', '-')
-                    new_text = '[url=https://{clean}.sofurry.com/]{username}[/url]'.format(
-                        username=username, clean=clean
-                    )
-                elif link_type == 1:
-                    new_text = ':%sicon:' % username
-                elif link_type == 2:
-                    new_text = ':icon%s:' % username
-            elif uploading_to == 7:
-                new_text = '[{0}](https://{0}.tumblr.com/)'.format(username)
-            elif uploading_to == 8:
-                if link_type == 0:
-                    new_text = ':dev{0}:'.format(username)
-                else:
-                    new_text = ':icon{0}:'.format(username)
-        else:  # Uploading to other site
-            if uploading_to == 1:  # Uploading to FurAffinity
-                if linking_to == 2:
-                    new_text = '[url=https://www.weasyl.com/~{0}]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 3:
-                    new_text = '[url=https://beta.furrynetwork.com/{0}]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 4:
-                    new_text = '[url=https://inkbunny.net/{0}]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 5:
-                    clean = username.lower().replace(' ', '-').replace('_', '-')
-                    new_text = '[url=https://{clean}.sofurry.com/]{username}[/url]'.format(
-                        username=username, clean=clean
-                    )
-                elif linking_to == 100:
-                    new_text = '[url=https://twitter.com/{0}]{0}[/url]'.format(username)
-                elif linking_to == 101:
-                    new_text = '[url={0}]{1}[/url]'.format(masto_link, username)
-                elif linking_to == 7:
-                    new_text = '[url=https://{0}.tumblr.com/]{0}[/url]'.format(username)
-                elif linking_to == 8:
-                    new_text = '[url=https://{0}.deviantart.com/]{1}[/url]'.format(
-                        username.lower(), username
-                    )
-            elif uploading_to == 2:
-                if linking_to == 1:
-                    new_text = '<fa:{0}>'.format(username)
-                elif linking_to == 3:  # FurryNetwork
-                    new_text = '[{0}](https://beta.furrynetwork.com/{0})'.format(
-                        username
-                    )
-                elif linking_to == 4:
-                    new_text = '<ib:{0}>'.format(username)
-                elif linking_to == 5:
-                    new_text = '<sf:{0}>'.format(username)
-                elif linking_to == 100:
-                    new_text = '[{0}](https://twitter.com/{0})'.format(username)
-                elif linking_to == 101:
-                    new_text = '[{0}]({1})'.format(username, masto_link)
-                elif linking_to == 7:
-                    new_text = '[{0}](https://{1}.tumblr.com/)'.format(
-                        username, username.lower()
-                    )
-                elif linking_to == 8:
-                    new_text = '<da:{0}>'.format(username)
-            elif uploading_to in (3, 7):
-                if linking_to == 1:
-                    new_text = '[{0}](https://www.furaffinity.net/user/{0}/)'.format(
-                        username
-                    )
-                elif linking_to == 2:  # Weasyl
-                    new_text = '[{0}](https://www.weasyl.com/~{0})'.format(username)
-                elif linking_to == 3:  # FurryNetwork
-                    new_text = '[{0}](https://beta.furrynetwork.com/{0})'.format(
-                        username
-                    )
-                elif linking_to == 4:
-                    new_text = '[{0}](https://inkbunny.net/{0})'.format(username)
-                elif linking_to == 5:
-                    clean = username.lower().replace(' ', '-').replace('_', '-')
-                    new_text = '[{username}](https://{clean}.sofurry.com/)'.format(
-                        username=username, clean=clean
-                    )
-                elif linking_to == 100:
-                    new_text = '[{0}](https://twitter.com/{0})'.format(username)
-                elif linking_to == 101:
-                    new_text = '[{0}]({1})'.format(username, masto_link)
-                elif linking_to == 7:
-                    new_text = '[{0}](https://{0}.tumblr.com/)'.format(username)
-                elif linking_to == 8:
-                    new_text = '[{1}](https://{0}.deviantart.com/)'.format(
-                        username.lower(), username
-                    )
-            elif uploading_to == 4:
-                if linking_to == 1:
-                    new_text = '[fa]%s[/fa]' % username
-                elif linking_to == 2:
-                    new_text = '[w]%s[/w]' % username
-                elif linking_to == 3:
-                    new_text = '[url=https://beta.furrynetwork.com/{0}/]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 5:
-                    new_text = '[sf]%s[/sf]' % username
-                elif linking_to == 100:
-                    new_text = '[url=https://twitter.com/{0}]{0}[/url]'.format(username)
-                elif linking_to == 101:
-                    new_text = '[url={0}]{1}[/url]'.format(masto_link, username)
-                elif linking_to == 7:
-                    new_text = '[url=https://{0}.tumblr.com/]{0}[/url]'.format(username)
-                elif linking_to == 8:
-                    new_text = '[da]{0}[/da]'.format(username)
-            elif uploading_to == 5:
-                if linking_to == 1:
-                    new_text = 'fa!%s' % username
-                elif linking_to == 2:
-                    new_text = '[url=https://www.weasyl.com/~{0}]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 3:
-                    new_text = '[url=https://beta.furrynetwork.com/{0}]{0}[/url]'.format(
-                        username
-                    )
-                elif linking_to == 4:
-                    new_text = 'ib!%s' % username
-                elif linking_to == 100:
-                    new_text = '[url=https://twitter.com/{0}]{0}[/url]'.format(username)
-                elif linking_to == 101:
-                    new_text = '[url={0}]{1}[/url]'.format(masto_link, username)
-                elif linking_to == 7:
-                    new_text = '[url=https://{0}.tumblr.com/]{0}[/url]'.format(username)
-                elif linking_to == 8:
-                    new_text = '[url=https://{0}.deviantart.com/]{1}[/url]'.format(
-                        username.lower(), username
-                    )
-            elif uploading_to == 8:
-                if linking_to == 1:
-                    new_text = '<a href="https://www.furaffinity.net/user/{0}">{0}</a>'.format(
-                        username
-                    )
-                elif linking_to == 2:
-                    new_text = '<a href="https://www.weasyl.com/~{0}">{0}</a>'.format(
-                        username
-                    )
-                elif linking_to == 3:
-                    new_text = '<a href="https://beta.furrynetwork.com/{0}">{0}</a>'.format(
-                        username
-                    )
-                elif linking_to == 4:
-                    new_text = '<a href="https://inkbunny.net/{0}">{0}</a>'.format(
-                        username
-                    )
-                elif linking_to == 5:
-                    clean = username.lower().replace(' ', '-').replace('_', '-')
-                    new_text = '<a href="https://{clean}.sofurry.com/">{username}</a>'.format(
-                        username=username, clean=clean
-                    )
-                elif linking_to == 7:
-                    new_text = '<a href="https://{1}.tumblr.com/">{0}</a>'.format(
-                        username, username.lower()
-                    )
-                elif linking_to == 100:
-                    new_text = '<a href="https://twitter.com/{0}">{0}</a>'.format(
-                        username
-                    )
-                elif linking_to == 101:
-                    new_text = '<a href="{0}">{1}</a>'.format(masto_link, username)
-
-        description = description[0:start] + new_text + description[end:]
-
-        # TODO: not sure why MyPy flags this
-        match = re.search(exp, description)  # type: ignore
-
-    # Various sites don't support Markdown, try and convert some stuff
-    if uploading_to in (1, 4, 5, 8):
-        url = re.compile(r'\[([^\]]+)\]\(([^)"]+)(?: \"([^\"]+)\")?\)')
-        match = url.search(description)
-
-        runs = 0
-
-        while match:
-            if runs > 500:
-                break
-            runs += 1
-
-            start, end = match.span(0)
-
-            if uploading_to == 8:  # DeviantArt uses HTML
-                new_link = '<a href="{url}">{text}</a>'
-            else:
-                new_link = '[url={url}]{text}[/url]'
-
-            new_link = new_link.format(text=match.group(1), url=match.group(2))
-
-            description = description[0:start] + new_link + description[end:]
-
-            match = url.search(description)
-
-        if uploading_to == 8:
-            description = re.sub(
-                r'([*_]{2})(.+)\1', r'<strong>\2</strong>', description
-            )  # strong
-            description = re.sub(r'([*_])(.+)\1', r'<em>\2</em>', description)  # italic
-            description = re.sub(
-                r'(~{2})(.+)\1', r'<strike>\2</strike>', description
-            )  # strikethrough
-            description = re.sub(r'`(.+)`', r'\1', description)  # inline code block
-        else:
-            description = re.sub(
-                r'([*_]{2})(.+)\1', r'[b]\2[/b]', description
-            )  # strong
-            description = re.sub(r'([*_])(.+)\1', r'[i]\2[/i]', description)  # italic
-            description = re.sub(
-                r'(~{2})(.+)\1', r'[s]\2[/s]', description
-            )  # strikethrough
-            description = re.sub(
-                r'`(.+)`', r'[code]\1[/code]', description
-            )  # inline code block
-
-        if uploading_to == 1:
-            description = re.sub(
-                r'\n-{5,}', r'\n[hr]', description
-            )  # horizontal rule, FA style
-        elif uploading_to == 5:
-            description = re.sub(
-                r'\n-{5,}', r'\n[rule]', description
-            )  # horizontal rule, SF style
-        else:
-            description = re.sub(
-                r'\n-{5,}', '', description
-            )  # remove horizontal rule on other sites
-
-    return description
+    return _cache
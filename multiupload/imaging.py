@@ -0,0 +1,460 @@
+"""Image transforms run in a pool of processes.
+
+Decoding, resizing and encoding a large image holds the GIL for a long time,
+so it is done in other processes to keep the rest of the worker responsive.
+IMAGE_PROCESSES sets how many, 0 runs transforms in the calling thread. At
+most IMAGE_QUEUE transforms are sent to the pool at once, others wait for a
+slot. The queue depth and how long each transform waited are sent to InfluxDB.
+
+Stored images are read through an ImageSource, which maps the file into memory
+once and gives every upload its own stream of it instead of its own copy. They
+are sent to the pool by path, and mapped again by the process transforming
+them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import SEEK_CUR, SEEK_END, SEEK_SET, BytesIO, RawIOBase
+import math
+import mmap
+import os
+from threading import BoundedSemaphore, Lock
+import time
+from typing import Any, Callable, Optional, Tuple, Union
+
+from PIL import Image
+from flask import current_app
+
+
+class MappedReader(RawIOBase):
+    """MappedReader is a read only stream of a buffer with its own position,
+    reading without copying more than what was asked for."""
+
+    def __init__(self, buffer: memoryview) -> None:
+        super().__init__()
+        self.buffer = buffer
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, self.position + size)
+
+        data = bytes(self.buffer[self.position : end])
+        self.position = max(self.position, end)
+
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, b: Any) -> int:
+        data = self.buffer[self.position : self.position + len(b)]
+        b[: len(data)] = data
+        self.position += len(data)
+
+        return len(data)
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_CUR:
+            offset += self.position
+        elif whence == SEEK_END:
+            offset += len(self.buffer)
+
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def getbuffer(self) -> memoryview:
+        return self.buffer
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
+
+
+# A stream of an image, uploaded or read from a stored file
+ImageStream = Union[BytesIO, MappedReader]
+
+# The contents of an image, a memoryview when it wasn't copied
+ImageData = Union[bytes, memoryview]
+
+
+class ImageSource(object):
+    """ImageSource is a stored image, mapped into memory the first time it is
+    read. Pages are shared by every stream of it and loaded as needed."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        self._buffer: Optional[memoryview] = None
+        self.lock = Lock()
+
+    @property
+    def buffer(self) -> memoryview:
+        with self.lock:
+            if self._buffer is None:
+                with open(self.path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        self._buffer = memoryview(data)
+                    else:
+                        self._buffer = memoryview(b'')  # Empty files can't be mapped
+
+        return self._buffer
+
+    def open(self) -> MappedReader:
+        """Get a new stream of the image."""
+        return MappedReader(self.buffer)
+
+    def __getstate__(self) -> str:
+        # Only the path is sent to other processes, they map the file again
+        return self.path
+
+    def __setstate__(self, path: str) -> None:
+        self.path = path
+
+        self._buffer = None
+        self.lock = Lock()
+
+
+# An image to transform, stored images are sent to the pool by path
+ImageInput = Union[ImageData, ImageSource]
+
+
+def image_data(source: ImageInput) -> ImageData:
+    """The contents of an image to transform, mapping a stored image."""
+    if isinstance(source, ImageSource):
+        return source.buffer
+
+    return source
+
+
+def open_image(source: ImageInput) -> Image.Image:
+    """Open an image to transform without copying it."""
+    if isinstance(source, ImageSource):
+        return Image.open(source.open())
+
+    return Image.open(BytesIO(source))
+
+
+# JPEGs are decoded at a reduced scale that is still at least this many times
+# the target size, so resampling the rest of the way keeps the same quality
+DRAFT_GAP = 2.0
+
+# Images are first reduced by a whole factor while still at least this many
+# times the target size, which is much faster and looks the same
+REDUCING_GAP = 3.0
+
+# Formats with a quality setting, searched to fit an image in a size limit
+LOSSY_FORMATS = ('JPEG', 'WEBP')
+QUALITY = (40, 95)
+QUALITY_STEPS = 6
+
+# How much larger than the limit a PNG can be for optimizing it to be tried
+PNG_OPTIMIZE_GAIN = 1.25
+
+# Times to shrink an image that is too large at the lowest quality, aiming a
+# little below the limit each time
+SHRINK_STEPS = 4
+SHRINK_MARGIN = 0.9
+
+
+def plan_downscale(
+    size: Tuple[int, int], box: Tuple[int, int], format: Optional[str]
+) -> Tuple[Optional[Tuple[int, int]], Optional[float]]:
+    """Pick the size to ask the JPEG decoder for and the reducing gap to use
+    when shrinking an image of size to fit in box. Images only shrinking a
+    little are resampled directly."""
+    scale = max(size[0] / box[0], size[1] / box[1])
+    if scale < DRAFT_GAP:
+        return None, None
+
+    draft = None
+    if format == 'JPEG':
+        draft = (int(box[0] * DRAFT_GAP), int(box[1] * DRAFT_GAP))
+
+    return draft, REDUCING_GAP
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """EncodingProfile is what a site accepts. Images are shrunk to at most
+    max_dimension pixels on each side and re-encoded to stay under max_bytes.
+    Images in other formats are converted to the first of formats."""
+
+    max_bytes: Optional[int] = None
+    max_dimension: Optional[int] = None
+    formats: Tuple[str, ...] = ()
+
+    @property
+    def transform(self) -> str:
+        return 'fit-{0}-{1}-{2}'.format(
+            self.max_bytes, self.max_dimension, '+'.join(self.formats)
+        )
+
+    def format_for(self, format: Optional[str]) -> Optional[str]:
+        if not self.formats or format in self.formats:
+            return format
+
+        return self.formats[0]
+
+    def fits(self, width: int, height: int, size: int, format: Optional[str]) -> bool:
+        """If an image can be uploaded as it is."""
+        if self.max_bytes and size > self.max_bytes:
+            return False
+
+        if self.max_dimension and max(width, height) > self.max_dimension:
+            return False
+
+        return self.format_for(format) == format
+
+
+def load(
+    source: ImageInput, box: Optional[Tuple[int, int]], format: Optional[str] = None
+) -> Tuple[Image.Image, str]:
+    """Decode an image shrunk to fit in box, in a mode that can be saved as
+    format. Returns the image with format, which defaults to its own."""
+    image = open_image(source)
+    format = format or image.format
+
+    draft, reducing_gap = None, None
+    if box:
+        draft, reducing_gap = plan_downscale(image.size, box, image.format)
+
+    # Must happen before anything loads the image
+    if draft:
+        image.draft(None, draft)
+
+    if not image.mode.startswith('RGB'):
+        # Everything works better as RGB, JPEGs can't have transparency
+        image = image.convert('RGB' if format == 'JPEG' else 'RGBA')
+    elif image.mode == 'RGBA' and format == 'JPEG':
+        image = image.convert('RGB')
+
+    if box:
+        image.thumbnail(box, Image.LANCZOS, reducing_gap=reducing_gap)
+
+    return image, format
+
+
+def save(image: Image.Image, format: str, **params: Any) -> bytes:
+    data = BytesIO()
+    image.save(data, format, **params)
+
+    return data.getvalue()
+
+
+def render(
+    source: ImageInput,
+    height: int,
+    width: int,
+    format: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> bytes:
+    """Resize an image to fit in height and width, keeping its format unless
+    another one is given."""
+    image, format = load(source, (height, width), format)
+
+    params = {}
+    if quality:
+        params['quality'] = quality
+
+    return save(image, format, **params)
+
+
+def encode_under(
+    image: Image.Image, format: str, max_bytes: Optional[int]
+) -> Tuple[Optional[bytes], int]:
+    """Encode an image as well as possible in at most max_bytes. Returns the
+    data, or None if it didn't fit, with the smallest size it was encoded to."""
+
+    def fits(data: bytes) -> bool:
+        return not max_bytes or len(data) <= max_bytes
+
+    if format not in LOSSY_FORMATS:
+        data = save(image, format)
+
+        # Optimizing is slow, and never saves enough for images far too large
+        if not fits(data) and format == 'PNG' and max_bytes:
+            if len(data) <= max_bytes * PNG_OPTIMIZE_GAIN:
+                data = save(image, format, optimize=True)
+
+        return (data if fits(data) else None), len(data)
+
+    data = save(image, format, quality=QUALITY[1])
+    if fits(data):
+        return data, len(data)
+
+    # Search for the highest quality that fits
+    best, smallest = None, len(data)
+    low, high = QUALITY[0], QUALITY[1] - 1
+
+    for _ in range(QUALITY_STEPS):
+        if low > high:
+            break
+
+        quality = (low + high) // 2
+        data = save(image, format, quality=quality)
+        smallest = min(smallest, len(data))
+
+        if fits(data):
+            best = data
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    return best, smallest
+
+
+def fit(source: ImageInput, profile: EncodingProfile) -> bytes:
+    """Encode an image to fit in profile, as large and with as high quality
+    as possible."""
+    image = open_image(source)
+
+    original = image_data(source)
+    if profile.fits(image.width, image.height, len(original), image.format):
+        return bytes(original)
+
+    format = profile.format_for(image.format) or 'PNG'
+
+    size = image.size
+    if profile.max_dimension:
+        size = (
+            min(size[0], profile.max_dimension),
+            min(size[1], profile.max_dimension),
+        )
+
+    for _ in range(SHRINK_STEPS):
+        resized, format = load(source, size, format)
+
+        data, smallest = encode_under(resized, format, profile.max_bytes)
+        if data is not None:
+            return data
+
+        assert profile.max_bytes
+
+        # Size in bytes goes with the number of pixels, so shrink both sides
+        # by the square root of how much smaller it has to be
+        scale = math.sqrt(profile.max_bytes / smallest) * SHRINK_MARGIN
+        size = (
+            max(1, int(resized.width * scale)),
+            max(1, int(resized.height * scale)),
+        )
+
+    raise ImageTooLarge()
+
+
+class ImagePool(object):
+    def __init__(self, processes: int, queue: int) -> None:
+        self.executor = ProcessPoolExecutor(processes)
+        self.slots = BoundedSemaphore(queue)
+
+        self.pending = 0
+        self.lock = Lock()
+
+    def track(self, change: int) -> int:
+        with self.lock:
+            self.pending += change
+            return self.pending
+
+    def run(self, func: Callable[..., bytes], *args: Any) -> bytes:
+        start_time = time.time()
+        depth = self.track(1)
+
+        try:
+            with self.slots:
+                waited = time.time() - start_time
+
+                # Sent to another process, so views of uploaded images have to
+                # be copied anyway. Stored images are sent by path instead
+                args = tuple(
+                    bytes(arg) if isinstance(arg, memoryview) else arg for arg in args
+                )
+
+                data = self.executor.submit(func, *args).result()
+        finally:
+            self.track(-1)
+
+        # Imported here as models imports submissions, which resize with this
+        from multiupload.utils import send_to_influx
+
+        send_to_influx(
+            {
+                'measurement': 'image_queue',
+                'fields': {
+                    'depth': depth,
+                    'wait': waited,
+                    'duration': time.time() - start_time,
+                },
+            }
+        )
+
+        return data
+
+
+_pool: Optional[ImagePool] = None
+_pool_lock = Lock()
+
+
+def get_pool() -> Optional[ImagePool]:
+    """Get the ImagePool for this process, or None if IMAGE_PROCESSES is 0."""
+    global _pool
+
+    processes = current_app.config.get('IMAGE_PROCESSES', os.cpu_count() or 1)
+    if not processes:
+        return None
+
+    with _pool_lock:
+        if not _pool:
+            _pool = ImagePool(
+                processes, current_app.config.get('IMAGE_QUEUE', processes * 2)
+            )
+
+    return _pool
+
+
+def run(func: Callable[..., bytes], *args: Any) -> bytes:
+    """Run an image transform in the pool, waiting for it to finish."""
+    global _pool
+
+    pool = get_pool()
+    if not pool:
+        return func(*args)
+
+    try:
+        return pool.run(func, *args)
+    except BrokenProcessPool:
+        # A process was killed, start a new pool for the next transform
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def resize(
+    source: ImageInput,
+    height: int,
+    width: int,
+    format: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> bytes:
+    """Resize an image to fit in height and width in the pool."""
+    return run(render, source, height, width, format, quality)
+
+
+def fit_profile(source: ImageInput, profile: EncodingProfile) -> bytes:
+    """Encode an image to fit in profile in the pool."""
+    return run(fit, source, profile)
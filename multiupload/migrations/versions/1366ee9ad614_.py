@@ -0,0 +1,25 @@
+"""image metadata
+
+Revision ID: 1366ee9ad614
+Revises: 4c6409f48d21
+Create Date: 2026-10-17 10:15:02.931846
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '1366ee9ad614'
+down_revision = '4c6409f48d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('saved_submission', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_meta', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('saved_submission', schema=None) as batch_op:
+        batch_op.drop_column('image_meta')
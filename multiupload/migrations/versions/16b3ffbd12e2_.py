@@ -0,0 +1,25 @@
+"""upload batch secret
+
+Revision ID: 16b3ffbd12e2
+Revises: 1366ee9ad614
+Create Date: 2026-10-17 10:42:19.504733
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '16b3ffbd12e2'
+down_revision = '1366ee9ad614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_batch', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('secret', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('upload_batch', schema=None) as batch_op:
+        batch_op.drop_column('secret')
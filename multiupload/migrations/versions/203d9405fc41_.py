@@ -0,0 +1,33 @@
+"""upload records
+
+Revision ID: 203d9405fc41
+Revises: 4ec64f1fd7fc
+Create Date: 2026-10-17 09:58:13.640271
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '203d9405fc41'
+down_revision = '4ec64f1fd7fc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_record',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('link', sa.String(length=1000), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['account.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key', 'account_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('upload_record')
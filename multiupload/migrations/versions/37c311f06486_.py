@@ -0,0 +1,65 @@
+"""upload jobs
+
+Revision ID: 37c311f06486
+Revises: 7cc507bd6c72
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '37c311f06486'
+down_revision = '7cc507bd6c72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'status',
+            sa.Enum('pending', 'running', 'done', 'failed', name='jobstatus'),
+            nullable=False,
+        ),
+        sa.Column('secret', sa.LargeBinary(), nullable=True),
+        sa.Column('worker', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f('ix_upload_job_status'), ['status'], unique=False
+        )
+
+    op.create_table(
+        'upload_job_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['upload_job.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('upload_job_event', schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f('ix_upload_job_event_job_id'), ['job_id'], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('upload_job_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_job_event_job_id'))
+
+    op.drop_table('upload_job_event')
+
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_job_status'))
+
+    op.drop_table('upload_job')
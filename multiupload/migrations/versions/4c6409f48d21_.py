@@ -0,0 +1,50 @@
+"""cancel upload jobs
+
+Revision ID: 4c6409f48d21
+Revises: 203d9405fc41
+Create Date: 2026-10-17 10:06:38.275519
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4c6409f48d21'
+down_revision = '203d9405fc41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                'cancel_requested',
+                sa.Boolean(),
+                nullable=False,
+                server_default=sa.false(),
+            )
+        )
+        batch_op.alter_column(
+            'status',
+            existing_type=sa.Enum(
+                'pending', 'running', 'done', 'failed', name='jobstatus'
+            ),
+            type_=sa.Enum(
+                'pending', 'running', 'done', 'failed', 'cancelled', name='jobstatus'
+            ),
+            existing_nullable=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.alter_column(
+            'status',
+            existing_type=sa.Enum(
+                'pending', 'running', 'done', 'failed', 'cancelled', name='jobstatus'
+            ),
+            type_=sa.Enum('pending', 'running', 'done', 'failed', name='jobstatus'),
+            existing_nullable=False,
+        )
+        batch_op.drop_column('cancel_requested')
@@ -0,0 +1,44 @@
+"""upload batches
+
+Revision ID: 4ec64f1fd7fc
+Revises: e7abe86a4f91
+Create Date: 2026-10-17 09:44:52.116380
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4ec64f1fd7fc'
+down_revision = 'e7abe86a4f91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_batch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('batch_id', sa.Integer(), nullable=True))
+        batch_op.create_index(
+            batch_op.f('ix_upload_job_batch_id'), ['batch_id'], unique=False
+        )
+        batch_op.create_foreign_key(
+            'fk_upload_job_batch_id', 'upload_batch', ['batch_id'], ['id']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_upload_job_batch_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_upload_job_batch_id'))
+        batch_op.drop_column('batch_id')
+
+    op.drop_table('upload_batch')
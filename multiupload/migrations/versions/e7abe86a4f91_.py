@@ -0,0 +1,29 @@
+"""scheduled upload jobs
+
+Revision ID: e7abe86a4f91
+Revises: 37c311f06486
+Create Date: 2026-10-17 09:31:07.802915
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e7abe86a4f91'
+down_revision = '37c311f06486'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('scheduled_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            batch_op.f('ix_upload_job_scheduled_at'), ['scheduled_at'], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('upload_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_job_scheduled_at'))
+        batch_op.drop_column('scheduled_at')
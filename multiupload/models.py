@@ -1,7 +1,11 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from hashlib import sha256
 import json
+from os.path import join
 from random import SystemRandom
 from string import ascii_letters
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from authlib.integrations.sqla_oauth2 import (
     OAuth2AuthorizationCodeMixin,
@@ -9,14 +13,15 @@ from authlib.integrations.sqla_oauth2 import (
     OAuth2TokenMixin,
 )
 from bcrypt import gensalt, hashpw
-from flask import g, session
+from flask import current_app, g, session
 from flask_sqlalchemy import SQLAlchemy
 from simplecrypt import encrypt
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Query
 
 from multiupload.constant import Sites
-from multiupload.submission import Rating, Submission
+from multiupload.submission import ImageInfo, Rating, Submission
 
 db = SQLAlchemy()
 
@@ -116,6 +121,20 @@ class Account(db.Model):  # type: ignore
     def find(cls, account_id: int) -> Optional['Account']:
         return cls.query.filter_by(id=account_id).filter_by(user_id=g.user.id).first()
 
+    @classmethod
+    def find_sites(cls, account_ids: List[int]) -> Dict[int, Sites]:
+        """Get the site of each of account_ids owned by the user, in one query."""
+        if not account_ids:
+            return {}
+
+        rows = (
+            cls.query.filter_by(user_id=g.user.id)
+            .filter(cls.id.in_(account_ids))
+            .with_entities(cls.id, cls.site_id)
+        )
+
+        return {account_id: Sites(site_id) for account_id, site_id in rows}
+
     @classmethod
     def all(cls) -> List['Account']:
         return (
@@ -230,6 +249,7 @@ class SavedSubmission(db.Model):  # type: ignore
     image_mimetype = db.Column(db.String(50), nullable=True)
     account_ids = db.Column(db.String(1000), nullable=True)
     site_data = db.Column(db.Text, nullable=True)  # arbitrary data stored as JSON
+    image_meta = db.Column(db.Text, nullable=True)  # ImageInfo stored as JSON
 
     group_id = db.Column(
         db.Integer, db.ForeignKey('submission_group.id'), nullable=True
@@ -254,6 +274,12 @@ class SavedSubmission(db.Model):  # type: ignore
     def set_accounts(self, ids: List[str]) -> None:
         self.account_ids = ' '.join([str(i) for i in ids])
 
+    @property
+    def upload_key(self) -> str:
+        """Identifies the submission in UploadRecords. IDs may be reused after
+        a submission is deleted, its randomly named image is not."""
+        return 'saved-{id}-{image}'.format(id=self.id, image=self.image_filename)
+
     @property
     def group(self) -> Optional['SubmissionGroup']:
         return (
@@ -313,6 +339,32 @@ class SavedSubmission(db.Model):  # type: ignore
             ]
         )
 
+    @property
+    def image_info(self) -> Optional[ImageInfo]:
+        """Metadata about the image. It is read from the image's header the
+        first time it is needed after the image changes, and saved with the
+        submission for later."""
+        if not self.image_filename:
+            return None
+
+        meta = json.loads(self.image_meta) if self.image_meta else {}
+        if meta.get('filename') == self.image_filename:
+            return ImageInfo.from_dict(meta['info'])
+
+        try:
+            with open(
+                join(current_app.config['UPLOAD_FOLDER'], self.image_filename), 'rb'
+            ) as f:
+                info = ImageInfo.read(f)
+        except OSError:
+            return None
+
+        self.image_meta = json.dumps(
+            {'filename': self.image_filename, 'info': info.to_dict()}
+        )
+
+        return info
+
     @property
     def data(self) -> dict:
         return json.loads(self.site_data) if self.site_data else {}
@@ -361,6 +413,14 @@ class SubmissionGroup(db.Model):  # type: ignore
             .all()
         )
 
+    @property
+    def upload_key(self) -> str:
+        """Identifies the group in UploadRecords."""
+        submissions = self.submissions
+        image = submissions[0].image_filename if submissions else None
+
+        return 'group-{id}-{image}'.format(id=self.id, image=image)
+
     @property
     def submittable(self) -> bool:
         return all([sub.has_all(ignore_sites=True) for sub in self.submissions])
@@ -406,6 +466,332 @@ class SavedTemplate(db.Model):  # type: ignore
         return {'id': self.id, 'name': self.name, 'content': self.content}
 
 
+class JobStatus(Enum):
+    """JobStatus is the state of an UploadJob."""
+
+    pending = 'pending'
+    running = 'running'
+    done = 'done'
+    failed = 'failed'
+    cancelled = 'cancelled'
+
+
+class UploadJob(db.Model):  # type: ignore
+    """An upload run by the worker process instead of a web request, so it
+    finishes even if the browser disconnects. Events are recorded as they
+    happen so clients can follow along and reattach."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    kind = db.Column(db.String(16), nullable=False)  # art or group
+    target_id = db.Column(db.Integer, nullable=False)  # submission or group ID
+    status = db.Column(
+        db.Enum(JobStatus), nullable=False, default=JobStatus.pending, index=True
+    )
+    # Password encrypted with SECRET_KEY so the worker can decrypt credentials,
+    # jobs in a batch share the batch's instead
+    secret = db.Column(db.LargeBinary, nullable=True)
+    worker = db.Column(db.String(255), nullable=True)
+    # UTC time to start the job at, jobs without one start as soon as possible
+    scheduled_at = db.Column(db.DateTime, nullable=True, index=True)
+    batch_id = db.Column(
+        db.Integer, db.ForeignKey('upload_batch.id'), nullable=True, index=True
+    )
+    # Set to stop a running job, checked by the worker while uploading
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    events = db.relationship('UploadJobEvent', lazy='dynamic', cascade='delete')
+
+    def __init__(
+        self,
+        user: User,
+        kind: str,
+        target_id: int,
+        scheduled_at: Optional[datetime] = None,
+        batch: Optional['UploadBatch'] = None,
+    ):
+        self.user_id = user.id
+        self.kind = kind
+        self.target_id = target_id
+        self.status = JobStatus.pending
+        self.scheduled_at = scheduled_at
+        if batch:
+            self.batch_id = batch.id
+        else:
+            self.secret = encrypt(current_app.config['SECRET_KEY'], session['password'])
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.done, JobStatus.failed, JobStatus.cancelled)
+
+    def add_event(self, text: str) -> 'UploadJobEvent':
+        event = UploadJobEvent(self, text)
+        db.session.add(event)
+
+        self.updated_at = datetime.utcnow()
+
+        return event
+
+    def events_after(self, event_id: int) -> List['UploadJobEvent']:
+        return (
+            self.events.filter(UploadJobEvent.id > event_id)
+            .order_by(UploadJobEvent.id.asc())
+            .all()
+        )
+
+    @property
+    def password_secret(self) -> Optional[bytes]:
+        """The encrypted password to run the job with."""
+        if self.batch_id:
+            batch = UploadBatch.query.get(self.batch_id)
+            return batch.secret if batch else None
+
+        return self.secret
+
+    def finish(self, status: JobStatus) -> None:
+        self.status = status
+        self.secret = None
+        self.updated_at = datetime.utcnow()
+
+        self.release_batch_secret()
+
+    def release_batch_secret(self) -> None:
+        if self.batch_id:
+            batch = UploadBatch.query.get(self.batch_id)
+            if batch:
+                batch.release_secret()
+
+    def cancel(self) -> None:
+        """Cancel the job. A pending job is finished right away, a running job
+        is stopped by its worker before it uploads to more accounts."""
+        cancelled = UploadJob.query.filter_by(
+            id=self.id, status=JobStatus.pending
+        ).update(
+            {'status': JobStatus.cancelled, 'secret': None, 'cancel_requested': True},
+            synchronize_session=False,
+        )
+
+        if cancelled:
+            db.session.refresh(self)
+            self.add_event('event: done\ndata: completed\n\n')
+            self.release_batch_secret()
+        else:
+            self.cancel_requested = True
+
+    @classmethod
+    def is_cancel_requested(cls, job_id: int) -> bool:
+        return bool(
+            db.session.query(cls.cancel_requested).filter_by(id=job_id).scalar()
+        )
+
+    @classmethod
+    def heartbeat(cls, job_id: int) -> None:
+        """Mark a running job as still being worked on, so it isn't taken for
+        stale while it waits on cooldowns or slow uploads."""
+        cls.query.filter_by(id=job_id, status=JobStatus.running).update(
+            {'updated_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    def requeue(self) -> None:
+        """Put a job whose worker stopped back in the queue."""
+        self.status = JobStatus.pending
+        self.worker = None
+        self.updated_at = datetime.utcnow()
+
+    @classmethod
+    def find(cls, job_id: int) -> Optional['UploadJob']:
+        return cls.query.filter_by(user_id=g.user.id).filter_by(id=job_id).first()
+
+    @classmethod
+    def find_active(cls, kind: str, target_id: int) -> Optional['UploadJob']:
+        return (
+            cls.query.filter_by(user_id=g.user.id)
+            .filter_by(kind=kind, target_id=target_id)
+            .filter(cls.status.in_([JobStatus.pending, JobStatus.running]))
+            .first()
+        )
+
+    @classmethod
+    def scheduled(cls) -> Dict[Tuple[str, int], 'UploadJob']:
+        """Pending jobs that are scheduled to start later, by kind and target."""
+        jobs = (
+            cls.query.filter_by(user_id=g.user.id)
+            .filter_by(status=JobStatus.pending)
+            .filter(cls.scheduled_at > datetime.utcnow())
+            .all()
+        )
+
+        return {(job.kind, job.target_id): job for job in jobs}
+
+    @classmethod
+    def claim_next(cls, worker: str) -> Optional['UploadJob']:
+        """Claim the oldest pending job that is due. Safe to call from multiple
+        workers, a job is only claimed if it was still pending when updated."""
+        pending = (
+            cls.query.filter_by(status=JobStatus.pending)
+            .filter(
+                db.or_(
+                    cls.scheduled_at.is_(None), cls.scheduled_at <= datetime.utcnow()
+                )
+            )
+            .order_by(cls.id.asc())
+            .limit(10)
+            .all()
+        )
+
+        for job in pending:
+            claimed = cls.query.filter_by(id=job.id, status=JobStatus.pending).update(
+                {
+                    'status': JobStatus.running,
+                    'worker': worker,
+                    'updated_at': datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+            db.session.commit()
+
+            if claimed:
+                db.session.refresh(job)
+                return job
+
+        return None
+
+    @classmethod
+    def stale(cls, timeout: timedelta) -> List['UploadJob']:
+        """Running jobs that have not recorded an event or heartbeat within
+        timeout, their worker has most likely stopped."""
+        return (
+            cls.query.filter_by(status=JobStatus.running)
+            .filter(cls.updated_at < datetime.utcnow() - timeout)
+            .all()
+        )
+
+
+class UploadBatch(db.Model):  # type: ignore
+    """Jobs created together to upload everything a user had pending."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # Password encrypted with SECRET_KEY once for every job, until they finish
+    secret = db.Column(db.LargeBinary, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    jobs = db.relationship('UploadJob', lazy='dynamic')
+
+    def __init__(self, user: User):
+        self.user_id = user.id
+        self.secret = encrypt(current_app.config['SECRET_KEY'], session['password'])
+
+    def release_secret(self) -> None:
+        """Forget the password once no job in the batch will run again."""
+        active = self.jobs.filter(
+            UploadJob.status.in_([JobStatus.pending, JobStatus.running])
+        ).count()
+
+        if not active:
+            self.secret = None
+
+    @classmethod
+    def find(cls, batch_id: int) -> Optional['UploadBatch']:
+        return cls.query.filter_by(user_id=g.user.id).filter_by(id=batch_id).first()
+
+    @classmethod
+    def get_active(cls) -> List['UploadBatch']:
+        """Batches with jobs that have not finished yet."""
+        return (
+            cls.query.filter_by(user_id=g.user.id)
+            .filter(
+                cls.jobs.any(
+                    UploadJob.status.in_([JobStatus.pending, JobStatus.running])
+                )
+            )
+            .order_by(cls.id.asc())
+            .all()
+        )
+
+
+class UploadRecord(db.Model):  # type: ignore
+    """A submission being posted to an account. It is written before posting
+    and updated with the link afterwards, so a repeated attempt, such as a
+    resubmitted form or a replayed job, gets the link instead of posting the
+    submission again."""
+
+    __table_args__ = (db.UniqueConstraint('key', 'account_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # SHA-256 of the key identifying the submission, keys can be any length
+    key = db.Column(db.String(64), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+
+    link = db.Column(db.String(1000), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, key: str, account_id: int):
+        self.key = self.digest(key)
+        self.account_id = account_id
+        self.started_at = datetime.utcnow()
+
+    @staticmethod
+    def digest(key: str) -> str:
+        return sha256(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def claim(
+        cls, key: str, account_id: int, timeout: timedelta
+    ) -> Optional['UploadRecord']:
+        """Get the record to post a submission to an account. Returns None if
+        another attempt started posting within timeout and has not finished,
+        older attempts are assumed to have stopped without posting."""
+        record = cls.query.filter_by(key=cls.digest(key), account_id=account_id).first()
+
+        if record:
+            if record.link:
+                return record
+
+            if record.started_at > datetime.utcnow() - timeout:
+                return None
+
+            record.started_at = datetime.utcnow()
+            db.session.commit()
+
+            return record
+
+        record = cls(key, account_id)
+        db.session.add(record)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another attempt created it first
+            db.session.rollback()
+            return None
+
+        return record
+
+
+class UploadJobEvent(db.Model):  # type: ignore
+    """An event from an UploadJob, stored as the text sent to clients."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(
+        db.Integer, db.ForeignKey('upload_job.id'), nullable=False, index=True
+    )
+    text = db.Column(db.Text, nullable=False)
+
+    job = db.relationship('UploadJob', back_populates='events')
+
+    def __init__(self, job: UploadJob, text: str):
+        self.job_id = job.id
+        self.text = text
+
+
 class MastodonApp(db.Model):  # type: ignore
     id = db.Column(db.Integer, primary_key=True)
 
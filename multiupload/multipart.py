@@ -0,0 +1,155 @@
+"""Multipart form bodies read as they are sent.
+
+Given files, requests builds the whole multipart body in memory, making
+another copy of every image uploaded. A MultipartBody only encodes the
+headers of each part ahead of time. File contents are read in chunks as the
+connection sends them, straight from the stream they were given as.
+"""
+
+from io import SEEK_END
+from typing import Any, BinaryIO, Dict, List, Mapping, Optional, Tuple, Union
+import uuid
+
+# A form field name and its value, or a list of values
+Fields = Union[Mapping[str, Any], List[Tuple[str, Any]]]
+
+# A file field name and a (filename, stream) or (filename, stream, mimetype)
+Files = Union[Mapping[str, tuple], List[Tuple[str, tuple]]]
+
+Part = Union[bytes, Tuple[BinaryIO, int, int]]
+
+
+def quote(value: str) -> str:
+    """Escape a header parameter the same way browsers do."""
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+def items(fields: Union[Fields, Files, None]) -> List[Tuple[str, Any]]:
+    if not fields:
+        return []
+
+    if isinstance(fields, Mapping):
+        pairs = list(fields.items())
+    else:
+        pairs = list(fields)
+
+    flat: List[Tuple[str, Any]] = []
+    for name, value in pairs:
+        if isinstance(value, list):
+            flat.extend((name, item) for item in value)
+        else:
+            flat.append((name, value))
+
+    return flat
+
+
+class MultipartBody(object):
+    """MultipartBody is a multipart/form-data body of fields and files,
+    encoded the same way as requests does but read as it is sent."""
+
+    def __init__(
+        self, data: Optional[Fields] = None, files: Optional[Files] = None
+    ) -> None:
+        self.boundary = uuid.uuid4().hex
+        self.parts: List[Part] = []
+
+        for name, value in items(data):
+            if value is None:
+                continue
+
+            if not isinstance(value, bytes):
+                value = str(value).encode('utf-8')
+
+            self.add_header(name)
+            self.parts.append(value + b'\r\n')
+
+        for name, file in items(files):
+            filename, stream = file[0], file[1]
+            mimetype = file[2] if len(file) > 2 else None
+
+            self.add_header(name, filename, mimetype)
+
+            start = stream.tell()
+            end = stream.seek(0, SEEK_END)
+            stream.seek(start)
+
+            self.parts.append((stream, start, end))
+            self.parts.append(b'\r\n')
+
+        self.parts.append('--{0}--\r\n'.format(self.boundary).encode('utf-8'))
+
+        self.length = sum(
+            len(part) if isinstance(part, bytes) else part[2] - part[1]
+            for part in self.parts
+        )
+
+        # Where reading is in the body, and in the current part
+        self.position = 0
+        self.part = 0
+        self.offset = 0
+
+    def add_header(
+        self, name: str, filename: Optional[str] = None, mimetype: Optional[str] = None
+    ) -> None:
+        disposition = 'form-data; name="{0}"'.format(quote(name))
+        if filename is not None:
+            disposition += '; filename="{0}"'.format(quote(filename))
+
+        header = '--{0}\r\nContent-Disposition: {1}\r\n'.format(
+            self.boundary, disposition
+        )
+        if mimetype:
+            header += 'Content-Type: {0}\r\n'.format(mimetype)
+
+        self.parts.append((header + '\r\n').encode('utf-8'))
+
+    @property
+    def content_type(self) -> str:
+        return 'multipart/form-data; boundary={0}'.format(self.boundary)
+
+    def headers(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Headers to send the body with, added to headers."""
+        return {**(headers or {}), 'Content-Type': self.content_type}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Only rewinding is supported, so the body can be sent again."""
+        if offset != 0 or whence != 0:
+            raise ValueError('MultipartBody can only be rewound')
+
+        self.position = 0
+        self.part = 0
+        self.offset = 0
+
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        remaining = self.length - self.position if size < 0 else size
+
+        while remaining > 0 and self.part < len(self.parts):
+            part = self.parts[self.part]
+
+            if isinstance(part, bytes):
+                chunk = part[self.offset : self.offset + remaining]
+            else:
+                stream, start, end = part
+                stream.seek(start + self.offset)
+                chunk = stream.read(min(remaining, end - start - self.offset))
+
+            if not chunk:
+                self.part += 1
+                self.offset = 0
+                continue
+
+            chunks.append(chunk)
+            self.offset += len(chunk)
+            self.position += len(chunk)
+            remaining -= len(chunk)
+
+        return b''.join(chunks)
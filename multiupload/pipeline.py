@@ -0,0 +1,690 @@
+"""Uploads of a submission or group to many accounts.
+
+Every account goes through the same stages: decrypting its credentials,
+validating, preparing the image, submitting and recording the result. Events
+from each stage are given to sinks, which report them as server-sent events,
+flashed messages or entries in a job's log.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+import json
+from threading import Event
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+)
+
+from flask import copy_current_request_context, current_app, flash, g, session
+from requests import HTTPError
+import simplecrypt
+
+from multiupload.constant import Sites
+from multiupload.derivatives import get_store
+from multiupload.models import (
+    Account,
+    SavedSubmission,
+    SubmissionGroup,
+    UploadJob,
+    UploadRecord,
+    User,
+    db,
+)
+from multiupload.rendition import RenditionCache
+from multiupload.scheduler import Task, UploadScheduler
+from multiupload.sites import BadCredentials, Site, SiteError
+from multiupload.sites.known import KNOWN_SITES
+from multiupload.submission import Submission
+from multiupload.utils import save_debug_pages, send_to_influx, write_upload_time
+
+UploadException = Union[BadCredentials, SiteError, HTTPError]
+
+
+class UploadCancelled(Exception):
+    """Raised when starting a stage of an upload that has been cancelled."""
+
+
+@dataclass
+class UploadEvent:
+    """Something that happened while uploading.
+
+    Kinds are count, upload, validationerror, badcreds, siteerror, httperror,
+    cancelled, delay, groupdone, failed and done. Events about an account carry its
+    ID, site and username instead of the Account, as they are created in
+    other threads."""
+
+    kind: str
+    data: Any = None
+    account_id: Optional[int] = None
+    site: Optional[Sites] = None
+    username: Optional[str] = None
+
+    @classmethod
+    def for_account(
+        cls, kind: str, account: Account, data: Any = None
+    ) -> 'UploadEvent':
+        return cls(kind, data, account.id, account.site, account.username)
+
+    @property
+    def name(self) -> str:
+        return '{site} - {account}'.format(site=self.site_name, account=self.username)
+
+    @property
+    def site_name(self) -> str:
+        assert self.site is not None
+        return self.site.name
+
+    @property
+    def failed(self) -> bool:
+        return self.kind in ('badcreds', 'siteerror', 'httperror')
+
+
+class UploadSink(object):
+    """UploadSink receives every event from an UploadPipeline. Anything it
+    returns is yielded by UploadPipeline.run."""
+
+    def handle(self, event: UploadEvent) -> Optional[str]:
+        return None
+
+
+class SSESink(UploadSink):
+    """Formats events as server-sent events for the upload pages."""
+
+    def handle(self, event: UploadEvent) -> Optional[str]:
+        if event.kind == 'count':
+            data = str(event.data)
+        elif event.kind == 'upload':
+            data = json.dumps({'link': event.data, 'name': event.name})
+        elif event.kind in ('badcreds', 'cancelled'):
+            data = json.dumps({'site': event.site_name, 'account': event.username})
+        elif event.kind in ('siteerror', 'validationerror'):
+            data = json.dumps(
+                {'msg': event.data, 'site': event.site_name, 'account': event.username}
+            )
+        elif event.kind == 'httperror':
+            data = json.dumps(
+                {'site': event.site_name, 'account': event.username, 'code': event.data}
+            )
+        elif event.kind == 'delay':
+            data = json.dumps(
+                {
+                    'site': event.site_name,
+                    'account': event.username,
+                    'delay': event.data,
+                }
+            )
+        elif event.kind == 'groupdone':
+            data = 'done'
+        elif event.kind == 'failed':
+            data = json.dumps({'msg': event.data})
+        elif event.kind == 'done':
+            data = 'completed'
+        else:
+            return None
+
+        return 'event: {kind}\ndata: {data}\n\n'.format(kind=event.kind, data=data)
+
+
+class FlashSink(UploadSink):
+    """Flashes errors, and collects uploads to show after the request."""
+
+    def __init__(self) -> None:
+        self.uploads: List[dict] = []
+
+    def handle(self, event: UploadEvent) -> Optional[str]:
+        if event.kind == 'upload':
+            self.uploads.append({'link': event.data, 'name': event.name})
+        elif event.kind == 'validationerror':
+            flash(event.data)
+        elif event.kind == 'badcreds':
+            flash(
+                'Unable to upload on {site} to account {account}, you may need to log in again.'.format(
+                    site=event.site_name, account=event.username
+                )
+            )
+        elif event.kind == 'siteerror':
+            flash(
+                'Unable to upload on {site} to account {account}: {msg}'.format(
+                    site=event.site_name, account=event.username, msg=event.data
+                )
+            )
+        elif event.kind == 'httperror':
+            flash(
+                'Unable to upload on {site} to account {account} due to a site issue.'.format(
+                    site=event.site_name, account=event.username
+                )
+            )
+        elif event.kind == 'cancelled':
+            flash(
+                'Upload on {site} to account {account} was cancelled.'.format(
+                    site=event.site_name, account=event.username
+                )
+            )
+
+        return None
+
+
+class JobLogSink(UploadSink):
+    """Records events in an UploadJob's log, for clients following the job."""
+
+    def __init__(self, job: UploadJob) -> None:
+        self.job = job
+        self.sse = SSESink()
+
+    def handle(self, event: UploadEvent) -> Optional[str]:
+        text = self.sse.handle(event)
+
+        if text:
+            self.job.add_event(text)
+            db.session.commit()
+
+        return None
+
+
+def parse_twitter_accounts(twitter_account: Optional[str]) -> List[int]:
+    """Get the IDs of accounts whose links should be posted to Twitter."""
+    twitter_account_ids: List[int] = []
+
+    if twitter_account is not None:
+        try:
+            for i in twitter_account.split(' '):
+                twitter_account_ids.append(int(i))
+        except ValueError:
+            pass
+
+    return twitter_account_ids
+
+
+def with_request_context(f: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a function to be run in another thread with a copy of the current
+    request context, including the logged in user, InfluxDB client and the ID
+    of the job being run.
+
+    Each copy may only be called once."""
+    user_id = g.user.id
+    influx = g.get('influx', None)
+    job_id = g.get('job_id', None)
+
+    @copy_current_request_context
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # Database objects can't be shared between threads, load our own copy
+        g.user = User.query.get(user_id)
+        if influx:
+            g.influx = influx
+        if job_id:
+            g.job_id = job_id
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def link_dependencies(
+    account: Account, accounts: List[Account], twitter_account_ids: List[int]
+) -> List[int]:
+    """Get the IDs of accounts that must have a link before uploading to an
+    account. Only Twitter and Mastodon use links, and they can only link to
+    sites before them, so Mastodon may link to Twitter but not the reverse."""
+    if account.site not in (Sites.Twitter, Sites.Mastodon):
+        return []
+
+    return [
+        a.id
+        for a in accounts
+        if a.id in twitter_account_ids and a.site_id < account.site_id
+    ]
+
+
+def site_for(account: Account) -> Type[Site]:
+    return next(site for site in KNOWN_SITES if site.SITE == account.site)
+
+
+class UploadPipeline(object):
+    """UploadPipeline uploads a submission or a group to many accounts at
+    once, reporting what happens to its sinks.
+
+    Accounts are uploaded to in a thread pool, Twitter and Mastodon accounts
+    start once the accounts they link to have finished. If saved is given,
+    accounts are removed from it as they are uploaded to so an interrupted
+    upload can be retried without posting twice. The saved submission or
+    group is deleted once everything was uploaded without errors.
+
+    Each post is recorded with an UploadRecord under key, or the upload_key of
+    the saved submission or group, so posting the same submission to an
+    account again returns the first link."""
+
+    def __init__(
+        self,
+        accounts: List[Account],
+        extra: dict,
+        submission: Optional[Submission] = None,
+        group: Optional[SubmissionGroup] = None,
+        saved: Optional[SavedSubmission] = None,
+        key: Optional[str] = None,
+    ) -> None:
+        self.accounts = sorted(accounts, key=lambda x: x.site_id)
+        self.extra = extra
+        self.submission = submission
+        self.group = group
+        self.saved = saved
+
+        if not key and saved:
+            key = saved.upload_key
+        self.key = key
+
+        self.group_id = group.id if group else None
+        self.twitter_account_ids = parse_twitter_accounts(extra.get('twitter-account'))
+
+        self.uploaded: List[int] = []
+        self.failed: List[int] = []
+        self.cancelled = Event()
+
+        self.renditions = RenditionCache(get_store())
+        if submission:
+            submission.renditions = self.renditions
+            self.render_descriptions(submission)
+
+        # Group items, made once and copied for each account
+        self.items: Dict[int, Submission] = {}
+
+    @property
+    def had_error(self) -> bool:
+        return bool(self.failed)
+
+    def run(
+        self, sinks: List[UploadSink], should_stop: Optional[Callable[[], bool]] = None
+    ) -> Generator[str, None, None]:
+        """Upload to every account, yielding anything the sinks return.
+
+        should_stop is polled while uploading. Once it returns True, accounts
+        that have not started are skipped and running uploads stop before
+        their next stage. Skipped accounts stay on the saved submission."""
+
+        def check_stop() -> bool:
+            assert should_stop is not None
+
+            if should_stop():
+                self.cancelled.set()
+
+            return self.cancelled.is_set()
+
+        def send(event: UploadEvent) -> Iterator[str]:
+            for sink in sinks:
+                text = sink.handle(event)
+                if text:
+                    yield text
+
+        yield from send(UploadEvent('count', len(self.accounts)))
+
+        if self.submission and self.submission.image_bytes:
+            try:
+                # Read once here so every account's copy shares it
+                self.submission.image_info
+            except OSError:
+                # Not an image Pillow understands, sites that need to know
+                # about it will report an error
+                pass
+
+        scheduler = UploadScheduler(current_app.config.get('UPLOAD_WORKERS', 4))
+
+        for account in self.accounts:
+            scheduler.add(
+                account.id,
+                with_request_context(partial(self.upload_account, account.id)),
+                link_dependencies(account, self.accounts, self.twitter_account_ids),
+            )
+
+        by_id = {account.id: account for account in self.accounts}
+
+        for _, event in scheduler.run(
+            check_stop if should_stop else None,
+            current_app.config.get('JOB_POLL_INTERVAL', 0.5),
+        ):
+            self.record(event)
+            yield from send(event)
+
+        for account_id in scheduler.skipped:
+            yield from send(UploadEvent.for_account('cancelled', by_id[account_id]))
+
+        self.finish()
+
+        yield from send(UploadEvent('done', self.had_error))
+
+    def record(self, event: UploadEvent) -> None:
+        """Keep track of results, and remove uploaded accounts from the saved
+        submission as they finish."""
+        if event.account_id is None:
+            return
+
+        if event.failed:
+            if event.account_id not in self.failed:
+                self.failed.append(event.account_id)
+            return
+
+        if event.kind != 'upload' or self.group_id:
+            return
+
+        self.uploaded.append(event.account_id)
+
+        if self.saved:
+            self.saved.set_accounts(
+                [a.id for a in self.accounts if a.id not in self.uploaded]
+            )
+            db.session.commit()
+
+    def finish(self) -> None:
+        if self.had_error or self.cancelled.is_set():
+            return
+
+        if self.saved:
+            db.session.delete(self.saved)
+            db.session.commit()
+
+        if self.group:
+            db.session.delete(self.group.master)
+            for sub in self.group.submissions:
+                db.session.delete(sub)
+            db.session.commit()
+
+            db.session.delete(self.group)
+            db.session.commit()
+
+    @contextmanager
+    def stage(self, name: str, account: Account) -> Iterator[None]:
+        """Time a stage of uploading to an account. Stages before anything is
+        posted are not started once the upload has been cancelled."""
+        if name != 'record' and self.cancelled.is_set():
+            raise UploadCancelled()
+
+        start_time = time.time()
+
+        yield
+
+        send_to_influx(
+            {
+                'measurement': 'upload_stage',
+                'fields': {'duration': time.time() - start_time},
+                'tags': {'stage': name, 'site': account.site.value},
+            }
+        )
+
+    def fail(self, task: Task, account: Account, ex: UploadException) -> None:
+        save_debug_pages()
+
+        if isinstance(ex, BadCredentials):
+            task.emit(UploadEvent.for_account('badcreds', account))
+        elif isinstance(ex, SiteError):
+            task.emit(UploadEvent.for_account('siteerror', account, ex.message))
+        else:
+            code = ex.response.status_code if ex.response is not None else None
+            task.emit(UploadEvent.for_account('httperror', account, code))
+
+    def wait_for_site(
+        self, site: Type[Site], account: Account, task: Task, deferred: int
+    ) -> bool:
+        """Check the site's circuit breaker. Returns if the upload can't start
+        now, either being deferred until the site may have recovered if this is
+        a queued upload, or failed."""
+        retry_in = site.unavailable_for()
+        if not retry_in:
+            return False
+
+        # Only queued uploads can wait, nobody is waiting on a request for them
+        if g.get('job_id') and deferred < current_app.config.get(
+            'BREAKER_DEFERRALS', 5
+        ):
+            task.defer(
+                with_request_context(
+                    partial(self.upload_account, account.id, deferred=deferred + 1)
+                ),
+                retry_in,
+                account.site,
+            )
+        else:
+            self.fail(
+                task,
+                account,
+                SiteError(
+                    '{site} is not responding, try again later.'.format(
+                        site=account.site.name
+                    )
+                ),
+            )
+
+        return True
+
+    def upload_account(self, account_id: int, task: Task, deferred: int = 0) -> None:
+        start_time = time.time()
+
+        account = Account.query.get(account_id)
+        site = site_for(account)
+
+        try:
+            if self.wait_for_site(site, account, task, deferred):
+                return
+
+            with self.stage('decrypt', account):
+                credentials = simplecrypt.decrypt(
+                    session['password'], account.credentials
+                )
+
+            if self.group_id is None:
+                self.upload_submission(self.site(credentials, account), account, task)
+            elif site.supports_group():
+                self.upload_group(self.site(credentials, account), account, task)
+            else:
+                self.upload_group_item(account_id, credentials, 0, task)
+                return
+        except UploadCancelled:
+            task.emit(UploadEvent.for_account('cancelled', account))
+            return
+
+        write_upload_time(start_time, account.site.value)
+
+    def site(self, credentials: bytes, account: Account) -> Site:
+        s = site_for(account)(credentials, account)
+        s.renditions = self.renditions
+
+        return s
+
+    def render_descriptions(self, submission: Submission) -> None:
+        """Render the description for every site being uploaded to at once,
+        before copies are made so they all share it."""
+        submission.descriptions_for_sites(account.site for account in self.accounts)
+
+    def item_submission(self, sub: SavedSubmission) -> Submission:
+        submission = self.items.get(sub.id)
+        if not submission:
+            submission = sub.submission
+            submission.renditions = self.renditions
+            self.render_descriptions(submission)
+
+            submission = self.items.setdefault(sub.id, submission)
+
+        return submission.copy()
+
+    def publish(
+        self, key: Optional[str], account: Account, s: Site, post: Callable[[], str]
+    ) -> str:
+        """Post a submission to an account once per key, returning the link of
+        an earlier post with the same key instead of posting again."""
+        s.posting = False
+
+        if not key:
+            return post()
+
+        timeout = timedelta(seconds=current_app.config.get('JOB_TIMEOUT', 900))
+
+        record = UploadRecord.claim(key, account.id, timeout)
+        if not record:
+            raise SiteError(
+                'This submission is already being uploaded to this account.'
+            )
+
+        if record.link:
+            return record.link
+
+        try:
+            link = post()
+        except Exception:
+            # If the site may have posted it, the claim is kept until it goes
+            # stale instead of risking posting it again
+            if not s.posting:
+                db.session.delete(record)
+                db.session.commit()
+            raise
+
+        record.link = link
+        db.session.commit()
+
+        return link
+
+    def prepare_extra(self, task: Task) -> dict:
+        extra = dict(self.extra)
+
+        if task.links:
+            extra['twitter-links'] = task.links
+
+        return extra
+
+    def validate(
+        self,
+        s: Site,
+        account: Account,
+        submission: Union[Submission, SavedSubmission],
+        task: Task,
+    ) -> None:
+        with self.stage('validate', account):
+            errors = s.validate_submission(submission)
+
+        for error in errors:
+            task.emit(UploadEvent.for_account('validationerror', account, error))
+
+    def upload_submission(self, s: Site, account: Account, task: Task) -> None:
+        assert self.submission is not None
+
+        self.validate(s, account, self.submission, task)
+
+        with self.stage('prepare', account):
+            submission = self.submission.copy()
+            extra = self.prepare_extra(task)
+
+        try:
+            with self.stage('submit', account):
+                link = self.publish(
+                    self.key,
+                    account,
+                    s,
+                    partial(s.submit_artwork, submission, extra=extra),
+                )
+        except (BadCredentials, SiteError, HTTPError) as ex:
+            self.fail(task, account, ex)
+            return
+
+        with self.stage('record', account):
+            task.publish((account.site, link))
+            task.emit(UploadEvent.for_account('upload', account, link))
+
+    def upload_group(self, s: Site, account: Account, task: Task) -> None:
+        assert self.group_id is not None
+
+        group = SubmissionGroup.find(self.group_id)
+        if not group:
+            raise Exception()
+
+        self.validate(s, account, group.master, task)
+
+        with self.stage('prepare', account):
+            extra = self.prepare_extra(task)
+
+        try:
+            with self.stage('submit', account):
+                link = self.publish(
+                    group.upload_key,
+                    account,
+                    s,
+                    partial(s.upload_group, group, extra),
+                )
+        except (BadCredentials, SiteError, HTTPError) as ex:
+            self.fail(task, account, ex)
+            return
+
+        with self.stage('record', account):
+            task.emit(UploadEvent.for_account('upload', account, link))
+
+            if account.id in self.twitter_account_ids:
+                task.publish((account.site, link))
+
+        task.emit(UploadEvent.for_account('groupdone', account))
+
+    def upload_group_item(
+        self, account_id: int, credentials: bytes, idx: int, task: Task
+    ) -> None:
+        """Upload one item of a group to an account on a site without group
+        support. The next item is deferred until the site's cooldown has
+        passed, so other accounts keep uploading in the meantime."""
+        assert self.group_id is not None
+
+        group = SubmissionGroup.find(self.group_id)
+        if not group:
+            raise Exception()
+
+        account = Account.query.get(account_id)
+        site = site_for(account)
+        s = self.site(credentials, account)
+
+        if idx > 0:
+            task.emit(UploadEvent.for_account('delay', account, 0))
+
+        submissions = group.submissions
+        sub = submissions[idx]
+
+        try:
+            self.validate(s, account, sub, task)
+
+            with self.stage('prepare', account):
+                extra = self.prepare_extra(task)
+
+            with self.stage('submit', account):
+                link = self.publish(
+                    sub.upload_key,
+                    account,
+                    s,
+                    partial(s.submit_artwork, self.item_submission(sub), extra),
+                )
+        except UploadCancelled:
+            task.emit(UploadEvent.for_account('cancelled', account))
+            return
+        except (BadCredentials, SiteError, HTTPError) as ex:
+            self.fail(task, account, ex)
+        else:
+            with self.stage('record', account):
+                task.emit(UploadEvent.for_account('upload', account, link))
+
+                if account.id in self.twitter_account_ids:
+                    if self.extra.get('twitter-image') == str(idx + 1):
+                        task.publish((account.site, link))
+
+        if idx + 1 < len(submissions):
+            delay = task.defer(
+                with_request_context(
+                    partial(self.upload_group_item, account_id, credentials, idx + 1)
+                ),
+                site.group_delay(),
+                account.site,
+            )
+
+            task.emit(UploadEvent.for_account('delay', account, round(delay, 1)))
+            return
+
+        task.emit(UploadEvent.for_account('groupdone', account))
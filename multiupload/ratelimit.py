@@ -0,0 +1,143 @@
+"""Token bucket rate limits for requests to sites.
+
+Buckets are stored in a SQLite database, so every thread and process on the
+machine shares the same budget for each site.
+"""
+
+from datetime import timedelta
+import os
+import sqlite3
+import tempfile
+from threading import Lock
+import time
+from typing import Any, Dict
+
+from flask import current_app
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+from multiupload.constant import Sites
+from multiupload.utils import send_to_influx
+
+
+class RateLimiter(object):
+    """RateLimiter hands out tokens from buckets stored in a SQLite database.
+
+    A bucket refills at rate tokens per second and holds up to burst tokens.
+    Callers without a token reserve the next one instead of failing, so they
+    are served in the order they asked."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def reserve(self, key: str, rate: float, burst: int) -> float:
+        """Take a token from a bucket, returning how many seconds the caller
+        must wait before using it."""
+        conn = self._connect()
+        try:
+            # Lock the database for writing before reading the bucket
+            conn.execute('BEGIN IMMEDIATE')
+
+            now = time.time()
+
+            row = conn.execute(
+                'SELECT tokens, updated FROM bucket WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row:
+                tokens = min(burst, row[0] + (now - row[1]) * rate)
+            else:
+                tokens = burst
+
+            # Tokens go negative while callers are queued for them
+            tokens -= 1
+
+            conn.execute(
+                'INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now),
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+        if tokens >= 0:
+            return 0
+
+        return -tokens / rate
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """Wait until a token is available, returning the seconds waited."""
+        wait = self.reserve(key, rate, burst)
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Get the RateLimiter for the database in RATE_LIMIT_DB."""
+    path = current_app.config.get(
+        'RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'multiupload-limits.db')
+    )
+
+    with _limiters_lock:
+        limiter = _limiters.get(path)
+        if not limiter:
+            limiter = _limiters[path] = RateLimiter(path)
+
+    return limiter
+
+
+class RateLimitAdapter(HTTPAdapter):
+    """RateLimitAdapter waits for a token from the site's bucket before
+    sending each request."""
+
+    def __init__(
+        self, limiter: RateLimiter, site: Sites, rate: float, burst: int
+    ) -> None:
+        super().__init__()
+
+        self.limiter = limiter
+        self.site = site
+        self.rate = rate
+        self.burst = burst
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:  # type: ignore
+        if self.rate > 0:
+            waited = self.limiter.acquire(self.site.name, self.rate, self.burst)
+
+            if waited:
+                send_to_influx(
+                    {
+                        'measurement': 'rate_limit_wait',
+                        'fields': {'duration': waited},
+                        'tags': {'site': self.site.value},
+                    }
+                )
+
+        start_time = time.time()
+
+        resp = super().send(request, **kwargs)
+
+        # Sessions replace this with the total time, but it lets anything
+        # reading responses at this level know how long the site took
+        resp.elapsed = timedelta(seconds=time.time() - start_time)
+
+        return resp
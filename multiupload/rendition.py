@@ -0,0 +1,88 @@
+"""Resized copies of images, made once per upload.
+
+A RenditionCache is shared by everything in an UploadPipeline, so when
+several sites need the image at the same size it is only decoded, resized and
+encoded once. Renditions are also kept in a DerivativeStore when one is
+given, so later uploads and retries of the same image can skip resizing.
+"""
+
+from functools import partial
+from hashlib import sha256
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from multiupload.derivatives import DerivativeStore
+from multiupload.imaging import (
+    EncodingProfile,
+    ImageInput,
+    fit_profile,
+    image_data,
+    resize,
+)
+
+# Source hash and the transform making the rendition from it
+RenditionKey = Tuple[str, str]
+
+
+class RenditionCache(object):
+    """RenditionCache keeps each rendition made of an image, so it is only
+    made once even when requested from many threads at the same time."""
+
+    def __init__(self, store: Optional[DerivativeStore] = None) -> None:
+        self.store = store
+
+        self.renditions: Dict[RenditionKey, bytes] = {}
+        self.locks: Dict[RenditionKey, Lock] = {}
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, source: ImageInput, transform: str, make: Callable[[], bytes]
+    ) -> bytes:
+        """Get the rendition of source made by transform, calling make to make
+        it if it was not already made."""
+        key = (sha256(image_data(source)).hexdigest(), transform)
+
+        with self.lock:
+            lock = self.locks.setdefault(key, Lock())
+
+        # Other threads wanting the same rendition wait for this one to make it
+        with lock:
+            if key in self.renditions:
+                self.hits += 1
+                return self.renditions[key]
+
+            self.misses += 1
+
+            data = self.store.get(*key) if self.store else None
+            if data is None:
+                data = make()
+
+                if self.store:
+                    self.store.put(*key, data)
+
+            self.renditions[key] = data
+            return data
+
+    def resize(
+        self,
+        source: ImageInput,
+        height: int,
+        width: int,
+        format: Optional[str] = None,
+        quality: Optional[int] = None,
+    ) -> bytes:
+        """Get the image resized to fit in height and width."""
+        return self.get(
+            source,
+            '{0}x{1}-{2}-{3}'.format(height, width, format, quality),
+            partial(resize, source, height, width, format, quality),
+        )
+
+    def fit(self, source: ImageInput, profile: EncodingProfile) -> bytes:
+        """Get the image encoded to fit in profile."""
+        return self.get(
+            source, profile.transform, partial(fit_profile, source, profile)
+        )
@@ -0,0 +1,154 @@
+"""Retries for requests to sites that failed in a way that may soon pass.
+
+Only requests that are safe to repeat are retried. GET and HEAD requests
+always are, POST requests only inside an idempotent block, such as logging in
+or fetching a token. Requests that publish something are never retried.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import time
+from typing import Any, Iterator, Optional
+
+from raven import breadcrumbs
+from requests import PreparedRequest, Response, Session
+from requests.exceptions import ConnectionError, Timeout
+
+from multiupload.breaker import get_breaker
+from multiupload.constant import Sites
+from multiupload.ratelimit import RateLimitAdapter, RateLimiter
+from multiupload.utils import write_site_response
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+def retry_after(resp: Response) -> Optional[float]:
+    """Get the seconds to wait from a response's Retry-After header, which
+    may either be a number of seconds or a date."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if not date.tzinfo:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+@contextmanager
+def idempotent(sess: Session) -> Iterator[Session]:
+    """Allow retrying POST requests made with the session inside the block.
+
+    Only use this for steps that are safe to repeat, like logging in or
+    fetching tokens."""
+    adapters = [a for a in sess.adapters.values() if isinstance(a, RetryAdapter)]
+
+    for adapter in adapters:
+        adapter.idempotent = True
+
+    try:
+        yield sess
+    finally:
+        for adapter in adapters:
+            adapter.idempotent = False
+
+
+class RetryAdapter(RateLimitAdapter):
+    """RetryAdapter retries idempotent requests on connection errors and on
+    responses saying the site is overloaded or temporarily down.
+
+    Attempts are spaced with exponential backoff and jitter, or by the
+    response's Retry-After header if it has one. Each retried response is
+    reported with write_site_response, and connection errors are recorded as
+    failures by the site's circuit breaker."""
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        site: Sites,
+        rate: float,
+        burst: int,
+        retries: int = 3,
+        backoff: float = 1,
+        max_delay: float = 30,
+    ) -> None:
+        super().__init__(limiter, site, rate, burst)
+
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+
+        self.idempotent = False
+
+    def backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff * 2 ** attempt, self.max_delay)
+
+        return random.uniform(delay / 2, delay)
+
+    def send_once(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        try:
+            return super().send(request, **kwargs)
+        except (ConnectionError, Timeout):
+            # Nothing reaches write_site_response, record it here
+            get_breaker().record(self.site.name, False)
+            raise
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:  # type: ignore
+        if not self.idempotent and request.method not in IDEMPOTENT_METHODS:
+            return self.send_once(request, **kwargs)
+
+        attempt = 0
+
+        while True:
+            try:
+                resp = self.send_once(request, **kwargs)
+            except (ConnectionError, Timeout) as ex:
+                if attempt >= self.retries:
+                    raise
+
+                delay = self.backoff_delay(attempt)
+
+                breadcrumbs.record(
+                    message=f'Retrying request to {request.url} after {ex!r}',
+                    category='furryapp',
+                    level='info',
+                )
+            else:
+                if resp.status_code not in RETRY_STATUS_CODES:
+                    return resp
+
+                if attempt >= self.retries:
+                    return resp
+
+                retry_in = retry_after(resp)
+                if retry_in is None:
+                    delay = self.backoff_delay(attempt)
+                elif retry_in > self.max_delay:
+                    # Site asked for more time than is worth waiting for
+                    return resp
+                else:
+                    delay = retry_in
+
+                write_site_response(self.site.value, resp, retry=True)
+                resp.close()
+
+            # Streamed bodies were read while sending, send them from the start
+            seek = getattr(request.body, 'seek', None)
+            if seek:
+                seek(0)
+
+            time.sleep(delay)
+            attempt += 1
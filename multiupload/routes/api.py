@@ -2,11 +2,10 @@ import json
 from typing import Any, List
 
 from flask import Blueprint, Response, g, jsonify, request, session
-import requests
 from simplecrypt import decrypt
 
 from multiupload.constant import HEADERS, Sites
-from multiupload.description import parse_description
+from multiupload.description import get_description_cache
 from multiupload.models import (
     Account,
     DeviantArtCategory,
@@ -99,22 +98,20 @@ def description() -> Any:
     if not accts or not desc:
         return jsonify({'error': 'missing data'})
 
-    descriptions = []
-    done: List[int] = []
+    sites: List[Sites] = []
 
     for site in accts.split(','):
         s = Sites(int(site))
 
         if (
-            s.value in done or s == Sites.Twitter or s == Sites.Mastodon
+            s in sites or s == Sites.Twitter or s == Sites.Mastodon
         ):  # each site only needs to be done once, twitter doesn't get a preview
             continue
 
-        descriptions.append(
-            {'site': s.name, 'description': parse_description(desc, s.value)}
-        )
+        sites.append(s)
 
-        done.append(s.value)
+    rendered = get_description_cache().render_all(desc, (s.value for s in sites))
+    descriptions = [{'site': s.name, 'description': rendered[s.value]} for s in sites]
 
     return jsonify({'descriptions': descriptions})
 
@@ -125,31 +122,29 @@ def preview() -> Any:
     accountlist: List[str] = request.form.getlist('account')
     orig_description: str = request.form.get('description', '')
 
-    descriptions = []
-    sites_done: List[int] = []
-
-    for site in accountlist:
+    account_ids: List[int] = []
+    for value in accountlist:
         try:
-            account = Account.find(int(site))
+            account_ids.append(int(value))
         except ValueError:
             continue
 
-        if (
-            not account
-            or account.site.value in sites_done
-            or account.site == Sites.Twitter
-            or account.site == Sites.Mastodon
-        ):
+    account_sites = Account.find_sites(account_ids)
+
+    sites: List[Sites] = []
+
+    for account_id in account_ids:
+        site = account_sites.get(account_id)
+
+        if not site or site in sites or site == Sites.Twitter or site == Sites.Mastodon:
             continue
 
-        descriptions.append(
-            {
-                'site': account.site.name,
-                'description': parse_description(orig_description, account.site.value),
-            }
-        )
+        sites.append(site)
 
-        sites_done.append(account.site.value)
+    rendered = get_description_cache().render_all(
+        orig_description, (s.value for s in sites)
+    )
+    descriptions = [{'site': s.name, 'description': rendered[s.value]} for s in sites]
 
     return jsonify({'descriptions': descriptions})
 
@@ -176,7 +171,7 @@ def get_deviantart_category() -> Any:
     account.update_credentials(r['refresh_token'])
     db.session.commit()
 
-    sub = requests.get(
+    sub = da.sess.get(
         'https://www.deviantart.com/api/v1/oauth2/stash/publish/categorytree',
         headers=HEADERS,
         params={'access_token': r['access_token'], 'catpath': path},
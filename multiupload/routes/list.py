@@ -14,7 +14,14 @@ from flask import (
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
-from multiupload.models import SavedSubmission, SubmissionGroup, db
+from multiupload.batch import batch_progress
+from multiupload.models import (
+    SavedSubmission,
+    SubmissionGroup,
+    UploadBatch,
+    UploadJob,
+    db,
+)
 from multiupload.submission import Rating
 from multiupload.utils import login_required, random_string, safe_ext, save_multi_dict
 
@@ -27,10 +34,27 @@ def index() -> Any:
     groups: List[SubmissionGroup] = SubmissionGroup.get_groups()
     ungrouped: List[SavedSubmission] = SubmissionGroup.get_ungrouped_submissions()
 
-    return render_template(
-        'review/list.html', user=g.user, groups=groups, ungrouped=ungrouped
+    scheduled = {}
+    batches = []
+
+    if current_app.config.get('UPLOAD_QUEUE'):
+        scheduled = UploadJob.scheduled()
+        batches = [batch_progress(batch) for batch in UploadBatch.get_active()]
+
+    page = render_template(
+        'review/list.html',
+        user=g.user,
+        groups=groups,
+        ungrouped=ungrouped,
+        scheduled=scheduled,
+        batches=batches,
     )
 
+    # Keep image metadata read while rendering for submissions that had none
+    db.session.commit()
+
+    return page
+
 
 @app.route('/remove', methods=['POST'])
 @login_required
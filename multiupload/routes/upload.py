@@ -1,6 +1,6 @@
 from csv import DictReader
+from datetime import datetime
 from io import StringIO
-import json
 import os
 from os.path import join
 import shutil
@@ -17,27 +17,33 @@ from flask import (
     current_app,
     flash,
     g,
+    jsonify,
     redirect,
     render_template,
     request,
+    safe_join,
     send_from_directory,
-    session,
     stream_with_context,
     url_for,
 )
-from requests import HTTPError
-import simplecrypt
 from werkzeug.utils import secure_filename
 
+from multiupload import thumbnails
+from multiupload.batch import batch_progress, create_batch
+from multiupload.breaker import BreakerState
 from multiupload.constant import Sites
+from multiupload.derivatives import get_store
 from multiupload.models import (
     Account,
+    JobStatus,
     SavedSubmission,
     SavedTemplate,
     SubmissionGroup,
+    UploadJob,
+    UploadJobEvent,
     db,
 )
-from multiupload.sites import BadCredentials, SiteError
+from multiupload.pipeline import FlashSink, SSESink, UploadEvent, UploadPipeline
 from multiupload.sites.known import KNOWN_SITES, known_list
 from multiupload.submission import Rating, Submission
 from multiupload.utils import (
@@ -45,13 +51,14 @@ from multiupload.utils import (
     parse_resize,
     random_string,
     safe_ext,
-    save_debug_pages,
     save_multi_dict,
     write_upload_time,
 )
 
 app = Blueprint('upload', __name__)
 
+THUMBNAIL_MAX_AGE = 60 * 60 * 24 * 365
+
 
 @app.route('/art', methods=['GET'])
 @login_required
@@ -66,138 +73,215 @@ def create_art() -> Any:
     templates = SavedTemplate.query.filter_by(user_id=g.user.id).all()
 
     return render_template(
-        'review/review.html', accounts=items, sub=SavedSubmission(), templates=templates
+        'review/review.html',
+        accounts=items,
+        sub=SavedSubmission(),
+        templates=templates,
+        upload_key=random_string(16),
     )
 
 
-def submit_art(
-    submission: Submission,
-    account: Account,
-    saved: Optional[SavedSubmission] = None,
-    twitter_links: Optional[List[Tuple[Sites, str]]] = None,
-) -> Optional[dict]:
-    """Upload an art submission to an account.
-    :param submission: the Submission object to upload
-    :param account: the Account to upload to
-    :param saved: if there is an associated SavedSubmission, that
-    :param twitter_links: links to use for Twitter
-    :return: dict containing a link and name to display
-    """
-    start_time = time.time()
-    decrypted = simplecrypt.decrypt(session['password'], account.credentials)
-
-    for site in KNOWN_SITES:
-        if site.SITE == account.site:
-            s = site(decrypted, account)
-
-            errors = s.validate_submission(submission)
-            if errors:
-                for error in errors:
-                    flash(error)
-                    continue
-
-            # If this was not empty, it should have been caught by now.
-            assert submission.image_bytes is not None
-            submission.image_bytes.seek(0)
-
-            extra = {}
-
-            if saved:
-                try:
-                    extra = saved.data
-                except:
-                    pass
-
-            if twitter_links:
-                extra['twitter-links'] = twitter_links
-
-            link = s.submit_artwork(submission, extra=extra)
-
-            write_upload_time(start_time, account.site.value)
-
-            return {
-                'link': link,
-                'name': '{site} - {account}'.format(
-                    site=site.SITE.name, account=account.username
-                ),
-            }
-
-    return None
-
-
-def upload_and_send(
-    submission: Submission, accounts: List[Account], saved: SavedSubmission
-) -> Generator[str, None, None]:
-    twitter_account = saved.data.get('twitter-account')
-    twitter_account_ids = []
-    if twitter_account is not None:
-        try:
-            for i in twitter_account.split(' '):
-                twitter_account_ids.append(int(i))
-        except ValueError:
-            pass
+def saved_pipeline(saved_id: int) -> Optional[UploadPipeline]:
+    """Create the pipeline uploading a SavedSubmission to its selected accounts."""
+    saved = SavedSubmission.find(saved_id)
+    if not saved:
+        return None
 
-    twitter_links: List[Tuple[Sites, str]] = []
-    upload_accounts: List[Account] = []
-    upload_error = False
+    submission = Submission(
+        saved.title, saved.description, saved.tags, saved.rating.value, saved
+    )
 
-    yield 'event: count\ndata: {count}\n\n'.format(count=len(accounts))
+    return UploadPipeline(
+        saved.accounts, saved.data, submission=submission, saved=saved
+    )
 
-    for account in accounts:
-        try:
-            result = submit_art(submission, account, saved, twitter_links)
-            yield 'event: upload\ndata: {res}\n\n'.format(res=json.dumps(result))
 
-            # Must be valid as we did not throw an Exception
-            assert result is not None
+def stream_pipeline(pipeline: Optional[UploadPipeline]) -> Generator[str, None, None]:
+    """Send the events of a pipeline as it runs."""
+    sink = SSESink()
 
-            if account.id in twitter_account_ids:
-                twitter_links.append((account.site, result['link']))
+    if not pipeline:
+        yield cast(str, sink.handle(UploadEvent('done')))
+        return
 
-            upload_accounts.append(account)
-        except BadCredentials:
-            save_debug_pages()
-            yield 'event: badcreds\ndata: {info}\n\n'.format(
-                info=json.dumps(
-                    {'site': account.site.name, 'account': account.username}
-                )
-            )
-            upload_error = True
-        except SiteError as ex:
-            save_debug_pages()
-            yield 'event: siteerror\ndata: {msg}\n\n'.format(
-                msg=json.dumps(
-                    {
-                        'msg': ex.message,
-                        'site': account.site.name,
-                        'account': account.username,
-                    }
-                )
-            )
-            upload_error = True
-        except HTTPError as ex:
-            save_debug_pages()
-            yield 'event: httperror\ndata: {info}\n\n'.format(
-                info=json.dumps(
-                    {
-                        'site': account.site.name,
-                        'account': account.username,
-                        'code': ex.response.status_code,
-                    }
-                )
-            )
-            upload_error = True
-
-    if upload_error:
-        needs_upload = [
-            account.id for account in accounts if account.id not in upload_accounts
-        ]
-        saved.set_accounts(needs_upload)  # remove accounts already uploaded to
+    yield from pipeline.run([sink])
+
+
+def tail_job(job_id: int, last_event_id: int = 0) -> Generator[str, None, None]:
+    """Send the events of an UploadJob as they are recorded, starting after the
+    last event the client has seen."""
+    poll_interval = current_app.config.get('JOB_POLL_INTERVAL', 0.5)
+
+    # Lets the client know it is safe to reconnect
+    yield 'event: job\ndata: {0}\n\n'.format(job_id)
+
+    while True:
+        # End the transaction so new events from the worker are visible
+        db.session.rollback()
+
+        job = UploadJob.find(job_id)
+        if not job:
+            return
+
+        finished = job.finished
+
+        for event in job.events_after(last_event_id):
+            yield 'id: {id}\n{text}'.format(id=event.id, text=event.text)
+            last_event_id = event.id
+
+        if finished:
+            return
+
+        time.sleep(poll_interval)
+
+
+def stream_job(kind: str, target_id: int) -> Any:
+    """Start an UploadJob, or reattach to the one already running for the same
+    target, and stream its events."""
+    job: Optional[UploadJob] = None
+    last_event_id = 0
+
+    # Browsers send the ID of the last event they got when reconnecting
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        pass
+
+    if last_event_id:
+        event = UploadJobEvent.query.get(last_event_id)
+        if event:
+            job = UploadJob.find(event.job_id)
+
+    if not job:
+        job = UploadJob.find_active(kind, target_id)
+
+        # Submitting something that was scheduled starts it now instead
+        if job and job.scheduled_at:
+            job.scheduled_at = None
+            db.session.commit()
+
+    if not job:
+        if not target_id:
+            return abort(404)
+
+        job = UploadJob(g.user, kind, target_id)
+        db.session.add(job)
+        db.session.commit()
+
+    return Response(
+        stream_with_context(tail_job(job.id, last_event_id)),
+        mimetype='text/event-stream',
+    )
+
+
+@app.route('/schedule', methods=['POST'])
+@login_required
+def schedule() -> Any:
+    """Schedule a saved submission or group to be uploaded by the worker at a
+    later time, or change when it is scheduled."""
+    kind = request.form.get('kind')
+    scheduled_at = request.form.get('scheduled_at', '')
+
+    if not current_app.config.get('UPLOAD_QUEUE'):
+        flash('Scheduling uploads is not enabled.')
+        return redirect(url_for('list.index'))
+
+    try:
+        target_id = int(request.form['id'])
+        when = datetime.strptime(scheduled_at, '%Y-%m-%dT%H:%M')
+    except (KeyError, ValueError):
+        flash('Invalid time to schedule at.')
+        return redirect(url_for('list.index'))
+
+    if kind == 'art':
+        sub = SavedSubmission.find(target_id)
+        ready = sub is not None and sub.has_all()
+    elif kind == 'group':
+        group = SubmissionGroup.find(target_id)
+        ready = group is not None and group.grouped and group.submittable
     else:
-        db.session.delete(saved)
+        return abort(400)
+
+    if not ready:
+        flash('Submission is not ready to be uploaded.')
+        return redirect(url_for('list.index'))
+
+    if when <= datetime.utcnow():
+        flash('Scheduled time must be in the future.')
+        return redirect(url_for('list.index'))
+
+    job = UploadJob.find_active(kind, target_id)
+    if job and job.status != JobStatus.pending:
+        flash('Upload has already started.')
+        return redirect(url_for('list.index'))
+
+    if job:
+        job.scheduled_at = when
+    else:
+        db.session.add(UploadJob(g.user, kind, target_id, when))
+
+    db.session.commit()
+
+    flash('Scheduled upload for {0} UTC.'.format(when.strftime('%Y-%m-%d %H:%M')))
+    return redirect(url_for('list.index'))
+
+
+@app.route('/job/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id: int) -> Any:
+    """Cancel a queued or running job. Accounts it has not uploaded to yet stay
+    selected on the saved submission."""
+    job = UploadJob.find(job_id)
+    if not job:
+        return abort(404)
+
+    if not job.finished:
+        job.cancel()
         db.session.commit()
 
-    yield 'event: done\ndata: completed\n\n'
+    return jsonify({'status': job.status.value, 'cancelled': job.cancel_requested})
+
+
+@app.route('/batch', methods=['POST'])
+@login_required
+def batch() -> Any:
+    """Schedule everything pending review to be uploaded by the worker."""
+    if not current_app.config.get('UPLOAD_QUEUE'):
+        flash('Scheduling uploads is not enabled.')
+        return redirect(url_for('list.index'))
+
+    created = create_batch()
+    if not created:
+        flash('Nothing is ready to be uploaded.')
+        return redirect(url_for('list.index'))
+
+    progress = batch_progress(created)
+
+    flash(
+        'Scheduled {count} uploads, expected to finish around {eta} UTC.'.format(
+            count=progress.total,
+            eta=progress.eta.strftime('%Y-%m-%d %H:%M') if progress.eta else 'now',
+        )
+    )
+    return redirect(url_for('list.index'))
+
+
+@app.route('/job/<int:job_id>', methods=['GET'])
+@login_required
+def job_events(job_id: int) -> Any:
+    job = UploadJob.find(job_id)
+    if not job:
+        return abort(404)
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+
+    return Response(
+        stream_with_context(tail_job(job.id, last_event_id)),
+        mimetype='text/event-stream',
+    )
 
 
 @app.route('/art/saved', methods=['GET'])
@@ -209,31 +293,32 @@ def create_art_post_saved() -> Any:
     except ValueError:
         saved = None
 
+    queued = current_app.config.get('UPLOAD_QUEUE')
+
+    # Reattaching to a queued upload, which may have already removed the item
+    if queued and request.headers.get('Last-Event-ID'):
+        return stream_job('art', saved.id if saved else 0)
+
     if not saved:
         flash('Unknown item.')
         return redirect(url_for('list.index'))
 
-    submission = Submission(
-        saved.title, saved.description, saved.tags, saved.rating.value, saved
-    )
-
     for account in Account.all():
         account.used_last = 0
 
-    accounts: List[Account] = []
     for saved_account in saved.accounts:
         if not saved_account or saved_account.user_id != g.user.id:
             flash('Account does not exist or does not belong to current user.')
             return redirect(url_for('upload.create_art'))
 
         saved_account.used_last = 1
-        accounts.append(saved_account)
     db.session.commit()  # save currently used accounts
 
-    accounts = sorted(accounts, key=lambda x: x.site_id)
+    if queued:
+        return stream_job('art', saved.id)
 
     return Response(
-        stream_with_context(upload_and_send(submission, accounts, saved)),
+        stream_with_context(stream_pipeline(saved_pipeline(saved.id))),
         mimetype='text/event-stream',
     )
 
@@ -348,64 +433,26 @@ def create_art_post() -> Any:
 
             submission.resize_image(height, width, replace=True)
 
-    accounts = sorted(accounts, key=lambda x: x.site_id)
+    # Set when the form was shown, so submitting it again doesn't post twice
+    upload_key = request.form.get('upload_key')
 
-    twitter_account = request.form.get('twitter-account')
-    twitter_account_ids = []
-    if twitter_account is not None:
-        try:
-            for i in twitter_account.split(' '):
-                twitter_account_ids.append(int(i))
-        except ValueError:
-            pass
+    pipeline = UploadPipeline(
+        accounts,
+        saved.data,
+        submission=submission,
+        saved=saved,
+        key='form-{0}'.format(upload_key[:32]) if upload_key else None,
+    )
 
-    upload_error = False
+    sink = FlashSink()
+    for _ in pipeline.run([sink]):
+        pass
 
-    uploads: List[dict] = []
-    uploaded_accounts: List[Account] = []
-    twitter_links: List[Tuple[Sites, str]] = []
-    for account in accounts:
-        try:
-            result = submit_art(submission, account, saved, twitter_links)
-            assert result is not None  # Would have thrown exception otherwise
-            uploads.append(result)
-            uploaded_accounts.append(account)
-
-            if account.id in twitter_account_ids:
-                twitter_links.append((account.site, result['link']))
-        except BadCredentials:
-            save_debug_pages()
-            flash(
-                'Unable to upload on {site} to account {account}, you may need to log in again.'.format(
-                    site=account.site.name, account=account.username
-                )
-            )
-            upload_error = True
-        except SiteError as ex:
-            save_debug_pages()
-            flash(
-                'Unable to upload on {site} to account {account}: {msg}'.format(
-                    site=account.site.name, account=account.username, msg=ex.message
-                )
-            )
-            upload_error = True
-        except HTTPError:
-            save_debug_pages()
-            flash(
-                'Unable to upload on {site} to account {account} due to a site issue.'.format(
-                    site=account.site.name, account=account.username
-                )
-            )
-            upload_error = True
-
-    if upload_error:
+    if pipeline.had_error:
         flash(
             'As an error occured, the submission has not been removed from the pending review list.'
         )
 
-        needs_upload = [a.id for a in uploaded_accounts if a not in uploaded_accounts]
-        saved.set_accounts(needs_upload)  # remove accounts already uploaded to
-
         if upload:
             ext = safe_ext(upload.filename)
             if ext:
@@ -418,14 +465,11 @@ def create_art_post() -> Any:
                 saved.image_filename = name
                 saved.image_mimetype = upload.mimetype
 
-    else:
-        db.session.delete(saved)
-
-    db.session.commit()
+        db.session.commit()
 
     write_upload_time(total_time, measurement='upload_time_total')
 
-    return render_template('after_upload.html', uploads=uploads, user=g.user)
+    return render_template('after_upload.html', uploads=sink.uploads, user=g.user)
 
 
 def parse_csv(
@@ -618,7 +662,10 @@ def review(sub_id: int) -> Any:
 
     if sub:
         return render_template(
-            'review/review.html', sub=sub, accounts=sub.all_selected_accounts(g.user)
+            'review/review.html',
+            sub=sub,
+            accounts=sub.all_selected_accounts(g.user),
+            upload_key=random_string(16),
         )
 
     return redirect(url_for('list.index'))
@@ -629,6 +676,37 @@ def image(filename: str) -> Any:
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
 
+@app.route('/thumbnail/<int:size>/<path:filename>')
+def thumbnail(size: int, filename: str) -> Any:
+    if size not in thumbnails.SIZES:
+        abort(404)
+
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(path):
+        abort(404)
+
+    format = 'WEBP' if request.accept_mimetypes['image/webp'] else 'JPEG'
+    etag = thumbnails.etag(path, size, format)
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        try:
+            data = thumbnails.thumbnail(path, size, format, get_store())
+        except OSError:
+            abort(404)  # Not an image that can be decoded
+
+        resp = Response(data, mimetype='image/' + format.lower())
+
+    # Stored images are never replaced, so thumbnails don't need to be checked
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = THUMBNAIL_MAX_AGE
+    resp.vary.add('Accept')
+
+    return resp
+
+
 @app.app_template_filter('has_text')
 def has_text(s: bool) -> str:
     return '✗' if not s else '✓'
@@ -644,6 +722,15 @@ def global_known_sites() -> List[Tuple[int, str]]:
     return known_list()
 
 
+@app.app_template_global('site_breaker')
+def global_site_breaker(site: Sites) -> str:
+    for known in KNOWN_SITES:
+        if known.SITE == site:
+            return known.breaker_state().value
+
+    return BreakerState.closed.value
+
+
 @app.route('/group/create', methods=['GET'])
 @login_required
 def create_group() -> Any:
@@ -758,198 +845,41 @@ def update_master_post() -> Any:
     return redirect(url_for('list.index'))
 
 
-def perform_group_upload(group_id: int) -> Generator[str, None, None]:
+def group_pipeline(group_id: int) -> Optional[UploadPipeline]:
+    """Create the pipeline uploading a SubmissionGroup to its selected accounts."""
     group = SubmissionGroup.find(group_id)
     if not group:
-        raise Exception()
-    master = group.master
-
-    had_error = False
-
-    twitter_account = master.data.get('twitter-account')
-    twitter_account_ids = []
-    twitter_links: List[Tuple[Any, str]] = []
-    if twitter_account is not None:
-        try:
-            for i in twitter_account.split(' '):
-                twitter_account_ids.append(int(i))
-        except ValueError:
-            pass
-
-    extra = master.data
+        return None
 
+    master = group.master
     assert master.accounts is not None
-    accounts: List[Account] = sorted(master.accounts, key=lambda x: x.site_id)
-
-    yield 'event: count\ndata: {0}\n\n'.format(len(accounts))
 
-    for account in accounts:
-        decrypted = simplecrypt.decrypt(session['password'], account.credentials)
+    return UploadPipeline(master.accounts, master.data, group=group)
 
-        extra['twitter-links'] = twitter_links
 
-        for site in KNOWN_SITES:
-            if site.SITE == account.site:
-                s = site(decrypted, account)
-
-                if s.supports_group():
-                    errors = s.validate_submission(master)
-                    if errors:
-                        for error in errors:
-                            yield 'event: validationerror\ndata: {0}\n\n'.format(error)
-                            continue
-
-                    try:
-                        link = s.upload_group(group, extra)
-                    except BadCredentials:
-                        save_debug_pages()
-                        yield 'event: badcreds\ndata: {0}\n\n'.format(
-                            json.dumps(
-                                {'site': account.site.name, 'account': account.username}
-                            )
-                        )
-                        had_error = True
-                        continue
-                    except SiteError as ex:
-                        save_debug_pages()
-                        yield 'event: siteerror\ndata: {msg}\n\n'.format(
-                            msg=json.dumps(
-                                {
-                                    'msg': ex.message,
-                                    'site': account.site.name,
-                                    'account': account.username,
-                                }
-                            )
-                        )
-                        had_error = True
-                        continue
-                    except HTTPError as ex:
-                        save_debug_pages()
-                        yield 'event: httperror\ndata: {info}\n\n'.format(
-                            info=json.dumps(
-                                {
-                                    'site': account.site.name,
-                                    'account': account.username,
-                                    'code': ex.response.status_code,
-                                }
-                            )
-                        )
-                        had_error = True
-                        continue
-
-                    yield 'event: upload\ndata: {0}\n\n'.format(
-                        json.dumps(
-                            {
-                                'link': link,
-                                'name': '{site} - {account}'.format(
-                                    site=site.SITE.name, account=account.username
-                                ),
-                            }
-                        )
-                    )
-
-                    if account.id in twitter_account_ids:
-                        twitter_links.append((account.site, link))
-                else:
-                    submissions = group.submissions
-                    sub_count = len(submissions)
-
-                    for idx, sub in enumerate(submissions):
-                        errors = s.validate_submission(sub)
-                        if errors:
-                            for error in errors:
-                                yield 'event: validationerror\ndata: {0}\n\n'.format(
-                                    json.dumps(
-                                        {
-                                            'msg': error,
-                                            'site': account.site.name,
-                                            'account': account.username,
-                                        }
-                                    )
-                                )
-                                continue
-
-                        try:
-                            link = s.submit_artwork(sub.submission, extra)
-                        except BadCredentials:
-                            save_debug_pages()
-                            yield 'event: badcreds\ndata: {0}\n\n'.format(
-                                json.dumps(
-                                    {
-                                        'site': account.site.name,
-                                        'account': account.username,
-                                    }
-                                )
-                            )
-                            had_error = True
-                            continue
-                        except SiteError as ex:
-                            save_debug_pages()
-                            yield 'event: siteerror\ndata: {msg}\n\n'.format(
-                                msg=json.dumps(
-                                    {
-                                        'msg': ex.message,
-                                        'site': account.site.name,
-                                        'account': account.username,
-                                    }
-                                )
-                            )
-                            had_error = True
-                            continue
-                        except HTTPError as ex:
-                            save_debug_pages()
-                            yield 'event: httperror\ndata: {info}\n\n'.format(
-                                info=json.dumps(
-                                    {
-                                        'site': account.site.name,
-                                        'account': account.username,
-                                        'code': ex.response.status_code,
-                                    }
-                                )
-                            )
-                            had_error = True
-                            continue
-
-                        yield 'event: upload\ndata: {0}\n\n'.format(
-                            json.dumps(
-                                {
-                                    'link': link,
-                                    'name': '{site} - {account}'.format(
-                                        site=site.SITE.name, account=account.username
-                                    ),
-                                }
-                            )
-                        )
-
-                        if account.id in twitter_account_ids:
-                            if extra.get('twitter-image') == str(idx + 1):
-                                twitter_links.append((account.site, link))
-
-                        if 1 < sub_count != idx + 1:
-                            yield 'event: delay\ndata: start\n\n'
-                            time.sleep(20)
-                            yield 'event: delay\ndata: end\n\n'
-
-                yield 'event: groupdone\ndata: done\n\n'
+@app.route('/group/post')
+@login_required
+def group_upload() -> Any:
+    try:
+        group = SubmissionGroup.find(int(request.args['id']))
+    except ValueError:
+        group = None
 
-    if not had_error:
-        db.session.delete(master)
-        for sub in group.submissions:
-            db.session.delete(sub)
-        db.session.commit()
+    queued = current_app.config.get('UPLOAD_QUEUE')
 
-        db.session.delete(group)
-        db.session.commit()
+    # Reattaching to a queued upload, which may have already removed the group
+    if queued and request.headers.get('Last-Event-ID'):
+        return stream_job('group', group.id if group else 0)
 
-    yield 'event: done\ndata: done\n\n'
+    if not group:
+        return abort(404)
 
+    group_id = group.id
 
-@app.route('/group/post')
-@login_required
-def group_upload() -> Any:
-    group_id = request.args['id']
+    if queued:
+        return stream_job('group', group_id)
 
     return Response(
-        stream_with_context(perform_group_upload(group_id)),
+        stream_with_context(stream_pipeline(group_pipeline(group_id))),
         mimetype='text/event-stream',
     )
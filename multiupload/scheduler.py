@@ -0,0 +1,253 @@
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+from itertools import count
+from queue import Empty, Queue
+from threading import Lock
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+
+class Task(object):
+    """Task is a unit of work run by the UploadScheduler.
+
+    It is passed to the task function to get links from the tasks it depends
+    on, publish its own link, and emit values to the scheduler's caller."""
+
+    def __init__(
+        self,
+        scheduler: 'UploadScheduler',
+        key: Hashable,
+        fn: Callable[['Task'], Any],
+        depends_on: Iterable[Hashable],
+    ) -> None:
+        self.scheduler = scheduler
+        self.key = key
+        self.fn = fn
+        self.depends_on = list(depends_on)
+        self.links: List[Any] = []
+
+        self._deferred = 0
+
+    def publish(self, link: Any) -> None:
+        """Make a link available to tasks depending on this one. Dependents
+        are started once all of their dependencies have published a link or
+        finished."""
+        self.scheduler.events.put(('publish', self.key, link))
+
+    def emit(self, value: Any) -> None:
+        """Send a value back to the scheduler's caller."""
+        self.scheduler.events.put(('emit', self.key, value))
+
+    def defer(
+        self,
+        fn: Callable[['Task'], Any],
+        delay: float,
+        cooldown: Optional[Hashable] = None,
+    ) -> float:
+        """Continue this task by running fn after delay seconds, without
+        holding a thread while waiting. The task is not finished until fn has
+        run.
+
+        Tasks deferred with the same cooldown key, such as a site, wait for the
+        latest of their delays. Returns the number of seconds until fn runs."""
+        return self.scheduler._defer(self, fn, delay, cooldown)
+
+
+class UploadScheduler(object):
+    """UploadScheduler runs tasks in a thread pool, starting each one as soon
+    as the tasks it depends on are ready.
+
+    A task that fails without publishing a link still releases its dependents,
+    they will only get the links that were published."""
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+        self.tasks: Dict[Hashable, Task] = {}
+        self.results: Dict[Hashable, Any] = {}
+        self.events: 'Queue[Tuple[str, Hashable, Any]]' = Queue()
+
+        # Tasks that never started or finished because the run was stopped
+        self.skipped: Set[Hashable] = set()
+        self.stopped = False
+
+        self._links: Dict[Hashable, Any] = {}
+        self._waiting: Dict[Hashable, Set[Hashable]] = {}
+        self._running = 0
+
+        self._lock = Lock()
+        self._cooldowns: Dict[Hashable, float] = {}
+        self._deferred: List[Tuple[float, int, Task, Callable[[Task], Any]]] = []
+        self._order = count()
+
+    def add(
+        self,
+        key: Hashable,
+        fn: Callable[[Task], Any],
+        depends_on: Optional[Iterable[Hashable]] = None,
+    ) -> Task:
+        """Add a task. Dependencies on unknown keys are ignored."""
+        task = Task(self, key, fn, depends_on or [])
+        self.tasks[key] = task
+
+        return task
+
+    def run(
+        self, should_stop: Optional[Callable[[], bool]] = None, poll_interval: float = 1
+    ) -> Generator[Tuple[Hashable, Any], None, None]:
+        """Run all tasks, yielding the key and value of everything emitted as
+        it happens. Task return values are stored in results.
+
+        If should_stop is given, it is called every poll_interval seconds. Once
+        it returns True no more tasks or deferred continuations are started,
+        and the run ends when the running tasks have finished."""
+        for task in self.tasks.values():
+            self._waiting[task.key] = {
+                key for key in task.depends_on if key in self.tasks and key != task.key
+            }
+
+        next_poll = time.monotonic() + poll_interval
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self._start_ready(executor)
+
+            while self._running or self._waiting or self._deferred:
+                timeout = self._next_due()
+                if should_stop and not self.stopped:
+                    timeout = min(
+                        poll_interval if timeout is None else timeout, poll_interval
+                    )
+
+                try:
+                    kind, key, value = self.events.get(timeout=timeout)
+                except Empty:
+                    kind = None
+
+                if should_stop and not self.stopped and time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + poll_interval
+
+                    if should_stop():
+                        self._stop()
+
+                if kind is None:
+                    self._start_deferred(executor)
+                    continue
+
+                if kind == 'emit':
+                    yield key, value
+                    continue
+
+                if kind == 'publish':
+                    self._links[key] = value
+                elif kind == 'defer':
+                    if self.stopped:
+                        self.skipped.add(key)
+                        continue
+
+                    heapq.heappush(self._deferred, value)
+                    self.tasks[key]._deferred += 1
+                    continue
+                elif kind == 'error':
+                    raise value
+                elif kind == 'done':
+                    self._running -= 1
+
+                    # Task was continued with defer, it is not finished yet
+                    if self.tasks[key]._deferred:
+                        self._start_deferred(executor)
+                        continue
+
+                    self.results[key] = value
+
+                self._release(key)
+                self._start_ready(executor)
+                self._start_deferred(executor)
+
+    def _stop(self) -> None:
+        self.stopped = True
+
+        self.skipped.update(self._waiting.keys())
+        self._waiting.clear()
+
+        for _, _, task, _ in self._deferred:
+            task._deferred -= 1
+            self.skipped.add(task.key)
+        self._deferred.clear()
+
+    def _defer(
+        self,
+        task: Task,
+        fn: Callable[[Task], Any],
+        delay: float,
+        cooldown: Optional[Hashable],
+    ) -> float:
+        now = time.monotonic()
+
+        with self._lock:
+            due = now + delay
+
+            if cooldown is not None:
+                due = max(due, self._cooldowns.get(cooldown, 0))
+                self._cooldowns[cooldown] = due
+
+        self.events.put(('defer', task.key, (due, next(self._order), task, fn)))
+
+        return due - now
+
+    def _next_due(self) -> Optional[float]:
+        if not self._deferred:
+            return None
+
+        return max(self._deferred[0][0] - time.monotonic(), 0)
+
+    def _start_deferred(self, executor: ThreadPoolExecutor) -> None:
+        now = time.monotonic()
+
+        while self._deferred and self._deferred[0][0] <= now:
+            _, _, task, fn = heapq.heappop(self._deferred)
+            task._deferred -= 1
+
+            self._running += 1
+            executor.submit(self._run_task, task, fn)
+
+    def _release(self, key: Hashable) -> None:
+        for waiting_on in self._waiting.values():
+            waiting_on.discard(key)
+
+    def _start_ready(self, executor: ThreadPoolExecutor) -> None:
+        ready = [key for key, waiting_on in self._waiting.items() if not waiting_on]
+
+        # Nothing can make progress, dependencies must be circular. Deferred
+        # tasks will still finish, so they are waited for first.
+        if not ready and not self._running and not self._deferred:
+            ready = list(self._waiting.keys())
+
+        for key in ready:
+            del self._waiting[key]
+
+            task = self.tasks[key]
+            task.links = [
+                self._links[dep] for dep in task.depends_on if dep in self._links
+            ]
+
+            self._running += 1
+            executor.submit(self._run_task, task, task.fn)
+
+    def _run_task(self, task: Task, fn: Callable[[Task], Any]) -> None:
+        try:
+            result = fn(task)
+        except Exception as ex:
+            self.events.put(('error', task.key, ex))
+            return
+
+        self.events.put(('done', task.key, result))
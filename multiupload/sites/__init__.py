@@ -1,17 +1,31 @@
 from abc import ABCMeta
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from io import BytesIO
 from os.path import join
-from typing import Any, Dict, Generator, List, Optional, Union
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
 
-from PIL import Image
+import cfscrape
 from flask import current_app
+import requests
 from werkzeug import Response
 from werkzeug.datastructures import ImmutableMultiDict
 
-from multiupload.constant import Sites
+from multiupload.breaker import BreakerState, get_breaker
+from multiupload.constant import HEADERS, Sites
+from multiupload.derivatives import get_store
+from multiupload.description import Markup, MentionFormats
+from multiupload.imaging import (
+    EncodingProfile,
+    ImageSource,
+    ImageStream,
+    ImageTooLarge,
+)
 from multiupload.models import Account, SavedSubmission, SubmissionGroup
-from multiupload.submission import Rating, Submission
+from multiupload.ratelimit import get_limiter
+from multiupload.rendition import RenditionCache
+from multiupload.retry import RetryAdapter
+from multiupload.submission import Rating, Submission, fit_image
+from multiupload.utils import write_site_response
 
 
 SomeSubmission = Union[Submission, SavedSubmission]
@@ -48,15 +62,42 @@ class CollectedImage:
     filename: str
     original_filename: str
     mimetype: str
-    data: BytesIO
+    data: ImageStream
 
 
 class Site(metaclass=ABCMeta):
     SITE: Sites
 
+    # Seconds to wait between items of a group on sites without group support
+    GROUP_DELAY: float = 20
+
+    # Requests per second to the site shared by all workers, and how many
+    # requests may be sent at once after being idle
+    RATE_LIMIT: Tuple[float, int] = (2, 5)
+
+    # Page requested to check if the site has recovered after failing, if
+    # unset the next upload is used to check instead
+    PROBE_URL: Optional[str] = None
+
+    # Largest images and formats the site accepts, images that don't fit are
+    # re-encoded before uploading
+    PROFILE: Optional[EncodingProfile] = None
+
+    # How descriptions on the site mention users on each site, and how
+    # Markdown is converted if the site doesn't support it
+    MENTIONS: Dict[Sites, MentionFormats] = {}
+    MARKUP: Optional[Markup] = None
+
     credentials: Credentials
     account: Optional[Account]
 
+    # Set when uploading so resized images are shared with other sites
+    renditions: Optional[RenditionCache] = None
+
+    # Set just before sending the request that posts a submission, if the
+    # upload fails after that the submission may have been posted anyway
+    posting: bool = False
+
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
     ) -> None:
@@ -132,6 +173,119 @@ class Site(metaclass=ABCMeta):
         """
         return False
 
+    @classmethod
+    def group_delay(cls) -> float:
+        """Seconds to wait between uploading items of a group when the site
+        does not support groups.
+
+        Defaults to GROUP_DELAY, GROUP_DELAYS in the config may override it
+        by site name."""
+        return current_app.config.get('GROUP_DELAYS', {}).get(
+            cls.SITE.name, cls.GROUP_DELAY
+        )
+
+    @classmethod
+    def rate_limit(cls) -> Tuple[float, int]:
+        """The site's rate and burst of requests.
+
+        Defaults to RATE_LIMIT, RATE_LIMITS in the config may override it by
+        site name. A rate of 0 disables limiting."""
+        rate, burst = current_app.config.get('RATE_LIMITS', {}).get(
+            cls.SITE.name, cls.RATE_LIMIT
+        )
+
+        return rate, burst
+
+    @classmethod
+    def profile(cls, **changes: Any) -> Optional[EncodingProfile]:
+        """What images the site accepts, with any changes given.
+
+        Defaults to PROFILE, IMAGE_LIMITS in the config may override its
+        max_bytes by site name."""
+        if not cls.PROFILE:
+            return None
+
+        max_bytes = current_app.config.get('IMAGE_LIMITS', {}).get(
+            cls.SITE.name, cls.PROFILE.max_bytes
+        )
+
+        return replace(cls.PROFILE, max_bytes=max_bytes, **changes)
+
+    def fit_image(
+        self, submission: Submission, profile: Optional[EncodingProfile] = None
+    ) -> Tuple[str, ImageStream]:
+        """Get the image of a submission to upload, fit in the site's profile
+        unless another is given."""
+        try:
+            return submission.fit_image(profile or self.profile())
+        except ImageTooLarge:
+            raise self.image_too_large()
+
+    def image_too_large(self) -> SiteError:
+        return SiteError(
+            'Image is too large to upload to {0}, even after shrinking it.'.format(
+                self.SITE.name
+            )
+        )
+
+    @classmethod
+    def create_session(cls, cloudflare: bool = True) -> requests.Session:
+        """Create a session for making requests to the site. Every request
+        waits for the site's rate limit before being sent, idempotent requests
+        are retried if the site is temporarily unavailable.
+
+        If cloudflare is True, the session is able to solve Cloudflare's
+        challenge pages."""
+        sess = cfscrape.create_scraper() if cloudflare else requests.Session()
+
+        adapter = RetryAdapter(
+            get_limiter(),
+            cls.SITE,
+            *cls.rate_limit(),
+            retries=current_app.config.get('SITE_RETRIES', 3),
+            backoff=current_app.config.get('SITE_RETRY_BACKOFF', 1),
+        )
+        sess.mount('http://', adapter)
+        sess.mount('https://', adapter)
+
+        return sess
+
+    @classmethod
+    def breaker_state(cls) -> BreakerState:
+        """State of the site's circuit breaker, without probing it."""
+        return get_breaker().state(cls.SITE.name)
+
+    @classmethod
+    def unavailable_for(cls) -> float:
+        """Check the site's circuit breaker before starting an upload.
+
+        Returns the seconds until the site should be tried again, or 0 if it
+        is available. While the breaker is half-open, one caller probes the
+        site and everyone else waits for the result."""
+        breaker = get_breaker()
+        key = cls.SITE.name
+
+        state = breaker.state(key)
+        if state == BreakerState.closed:
+            return 0
+
+        if state == BreakerState.half_open and breaker.claim_probe(key):
+            if not cls.PROBE_URL:
+                return 0
+
+            try:
+                req = cls.create_session().get(cls.PROBE_URL, headers=HEADERS)
+            except requests.RequestException:
+                pass
+            else:
+                write_site_response(cls.SITE.value, req)
+
+            if breaker.state(key) == BreakerState.closed:
+                return 0
+
+        # Check again once another caller's probe had time to finish
+        return breaker.retry_in(key) or breaker.cooldown
+
     @staticmethod
     def supports_folder() -> bool:
         """If the site supports folders.
@@ -141,37 +295,51 @@ class Site(metaclass=ABCMeta):
         """
         return False
 
-    @staticmethod
     def collect_images(
+        self,
         submissions: List[SavedSubmission],
         max_size: Optional[int] = None,
         format: str = None,
+        profile: Optional[EncodingProfile] = None,
     ) -> Generator[CollectedImage, None, None]:
         """Collect all images from a list of saved submissions.
 
         Used for uploading groups which store images in multiple submissions
-        internally, which get aggregated into a single post."""
+        internally, which get aggregated into a single post. Images are fit in
+        profile if given. Resized images come from renditions or the derivative
+        store."""
+        renditions = self.renditions or RenditionCache(get_store())
+
         for sub in submissions:
-            with open(
-                join(current_app.config['UPLOAD_FOLDER'], sub.image_filename), 'rb'
-            ) as f:
-                image_bytes = BytesIO(f.read())
+            source = ImageSource(
+                join(current_app.config['UPLOAD_FOLDER'], sub.image_filename)
+            )
+
+            original_filename = sub.original_filename
+            image_bytes: ImageStream = source.open()
 
             if max_size:
-                image = Image.open(image_bytes)
-                if not image.mode.startswith('RGB'):
-                    image = image.convert('RGBA')
-                image.thumbnail((max_size, max_size), Image.ANTIALIAS)
-                image_bytes = BytesIO()
-                if format:
-                    image.save(image_bytes, format)
-                else:
-                    image.save(image_bytes, image.format)
-                image_bytes.seek(0)
+                data = renditions.resize(source, max_size, max_size, format)
+                image_bytes = BytesIO(data)
+            elif profile and sub.image_info:
+                try:
+                    fitted = fit_image(
+                        original_filename,
+                        sub.image_info,
+                        source,
+                        profile,
+                        renditions,
+                    )
+                except ImageTooLarge:
+                    raise self.image_too_large()
+
+                if fitted:
+                    original_filename, data = fitted
+                    image_bytes = BytesIO(data)
 
             yield CollectedImage(
                 filename=sub.image_filename,
-                original_filename=sub.original_filename,
+                original_filename=original_filename,
                 mimetype=sub.image_mimetype,
                 data=image_bytes,
             )
@@ -7,7 +7,10 @@ import requests
 from werkzeug import Response
 
 from multiupload.constant import HEADERS, Sites
+from multiupload.description import HTML
 from multiupload.models import Account, AccountData, db
+from multiupload.multipart import MultipartBody
+from multiupload.retry import idempotent
 from multiupload.sites import (
     AccountExists,
     BadCredentials,
@@ -33,12 +36,18 @@ class DeviantArtAPI(object):
     scope = None
 
     def __init__(
-        self, client_id: str, client_secret: str, redirect: str, scope: str
+        self,
+        client_id: str,
+        client_secret: str,
+        redirect: str,
+        scope: str,
+        sess: Optional[requests.Session] = None,
     ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect = redirect
         self.scope = scope
+        self.sess = sess or requests.Session()
 
     def auth_url(self, state: str = '') -> str:
         return (
@@ -56,7 +65,7 @@ class DeviantArtAPI(object):
         )
 
     def access_token(self, code: str) -> Dict[str, Any]:
-        return requests.post(
+        return self.sess.post(
             TOKEN_ENDPOINT,
             data={
                 'client_id': self.client_id,
@@ -68,25 +77,48 @@ class DeviantArtAPI(object):
         ).json()
 
     def refresh_token(self, refresh: str) -> Dict[str, Any]:
-        return requests.post(
-            TOKEN_ENDPOINT,
-            data={
-                'client_id': self.client_id,
-                'client_secret': self.client_secret,
-                'grant_type': 'refresh_token',
-                'refresh_token': refresh,
-            },
-        ).json()
+        with idempotent(self.sess):
+            return self.sess.post(
+                TOKEN_ENDPOINT,
+                data={
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                    'grant_type': 'refresh_token',
+                    'refresh_token': refresh,
+                },
+            ).json()
 
-    @staticmethod
-    def validate_token(token: str) -> Dict[str, Any]:
-        return requests.post(PLACEBO_CALL, data={'access_token': token}).json()
+    def validate_token(self, token: str) -> Dict[str, Any]:
+        with idempotent(self.sess):
+            return self.sess.post(PLACEBO_CALL, data={'access_token': token}).json()
 
 
 class DeviantArt(Site):
     """DeviantArt."""
 
     SITE = Sites.DeviantArt
+    PROBE_URL = 'https://www.deviantart.com/'
+
+    MENTIONS = {
+        Sites.DeviantArt: {
+            0: ':dev{username}:',
+            1: ':icon{username}:',
+            2: ':icon{username}:',
+        },
+        Sites.FurAffinity: (
+            '<a href="https://www.furaffinity.net/user/{username}">{username}</a>'
+        ),
+        Sites.Weasyl: '<a href="https://www.weasyl.com/~{username}">{username}</a>',
+        Sites.FurryNetwork: (
+            '<a href="https://beta.furrynetwork.com/{username}">{username}</a>'
+        ),
+        Sites.Inkbunny: '<a href="https://inkbunny.net/{username}">{username}</a>',
+        Sites.SoFurry: '<a href="https://{sofurry}.sofurry.com/">{username}</a>',
+        Sites.Tumblr: '<a href="https://{lower}.tumblr.com/">{username}</a>',
+        Sites.Twitter: '<a href="https://twitter.com/{username}">{username}</a>',
+        Sites.Mastodon: '<a href="{mastodon}">{username}</a>',
+    }
+    MARKUP = HTML
 
     def pre_add_account(self) -> Response:
         da = self.get_da()
@@ -105,7 +137,7 @@ class DeviantArt(Site):
         if r['status'] == 'success':
             session['da_refresh'] = r['refresh_token']
 
-            user = requests.post(
+            user = da.sess.post(
                 'https://www.deviantart.com/api/v1/oauth2/user/whoami',
                 headers=HEADERS,
                 data={'access_token': r['access_token']},
@@ -120,7 +152,7 @@ class DeviantArt(Site):
 
         r = da.refresh_token(session['da_refresh'])
 
-        user = requests.post(
+        user = da.sess.post(
             'https://www.deviantart.com/api/v1/oauth2/user/whoami',
             headers=HEADERS,
             data={'access_token': r['access_token']},
@@ -174,9 +206,7 @@ class DeviantArt(Site):
         for idx, tag in enumerate(submission.tags):
             tags['tags[{idx}]'.format(idx=idx)] = tag
 
-        sub = requests.post(
-            'https://www.deviantart.com/api/v1/oauth2/stash/submit',
-            headers=HEADERS,
+        body = MultipartBody(
             data={
                 'access_token': r['access_token'],
                 'title': submission.title,
@@ -184,6 +214,12 @@ class DeviantArt(Site):
                 **tags,
             },
             files={'image': submission.get_image()},
+        )
+
+        sub = da.sess.post(
+            'https://www.deviantart.com/api/v1/oauth2/stash/submit',
+            headers=body.headers(HEADERS),
+            data=body,
         ).json()
 
         if sub['status'] != 'success':
@@ -232,7 +268,8 @@ class DeviantArt(Site):
             data['mature_level'] = mature_level
             data['mature_classification'] = request.form.getlist('da-content')
 
-        pub = requests.post(
+        self.posting = True
+        pub = da.sess.post(
             'https://www.deviantart.com/api/v1/oauth2/stash/publish',
             headers=HEADERS,
             data=data,
@@ -271,7 +308,7 @@ class DeviantArt(Site):
                 data['next_offset'] = all_folders[-1].get('folderid')
 
             try:
-                folders = requests.get(
+                folders = da.sess.get(
                     'https://www.deviantart.com/api/v1/oauth2/gallery/folders',
                     headers=HEADERS,
                     params=data,
@@ -301,13 +338,14 @@ class DeviantArt(Site):
 
         return all_folders
 
-    @staticmethod
-    def get_da() -> DeviantArtAPI:
+    @classmethod
+    def get_da(cls) -> DeviantArtAPI:
         return DeviantArtAPI(
             current_app.config['DEVIANTART_KEY'],
             current_app.config['DEVIANTART_SECRET'],
             current_app.config['DEVIANTART_CALLBACK'],
             current_app.config['DEVIANTART_SCOPES'],
+            cls.create_session(cloudflare=False),
         )
 
     @staticmethod
@@ -1,4 +1,5 @@
 import base64
+from dataclasses import replace
 import json
 import os
 import re
@@ -6,12 +7,15 @@ import time
 from typing import Any, Dict, List, Optional
 
 from bs4 import BeautifulSoup
-import cfscrape
 from flask import current_app, flash, g, session
 from requests import HTTPError
 
 from multiupload.constant import HEADERS, Sites
+from multiupload.description import BBCODE
+from multiupload.imaging import EncodingProfile
 from multiupload.models import Account, AccountData, db
+from multiupload.multipart import MultipartBody
+from multiupload.retry import idempotent
 from multiupload.sites import (
     AccountExists,
     BadCredentials,
@@ -33,6 +37,31 @@ class FurAffinity(Site):
     """FurAffinity."""
 
     SITE = Sites.FurAffinity
+    PROBE_URL = 'https://www.furaffinity.net/'
+
+    # Cloudflare in front of FurAffinity is quick to challenge bursts
+    RATE_LIMIT = (1, 3)
+
+    PROFILE = EncodingProfile(max_bytes=10 * 1024 * 1024)
+
+    MENTIONS = {
+        Sites.FurAffinity: {
+            0: ':link{username}:',
+            1: ':{username}icon:',
+            2: ':icon{username}:',
+        },
+        Sites.Weasyl: '[url=https://www.weasyl.com/~{username}]{username}[/url]',
+        Sites.FurryNetwork: (
+            '[url=https://beta.furrynetwork.com/{username}]{username}[/url]'
+        ),
+        Sites.Inkbunny: '[url=https://inkbunny.net/{username}]{username}[/url]',
+        Sites.SoFurry: '[url=https://{sofurry}.sofurry.com/]{username}[/url]',
+        Sites.Twitter: '[url=https://twitter.com/{username}]{username}[/url]',
+        Sites.Mastodon: '[url={mastodon}]{username}[/url]',
+        Sites.Tumblr: '[url=https://{username}.tumblr.com/]{username}[/url]',
+        Sites.DeviantArt: '[url=https://{lower}.deviantart.com/]{username}[/url]',
+    }
+    MARKUP = replace(BBCODE, rule='\n[hr]')
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -42,7 +71,7 @@ class FurAffinity(Site):
             self.credentials = json.loads(credentials)
 
     def pre_add_account(self) -> dict:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         req = sess.get(
             'https://www.furaffinity.net/login/?mode=imagecaptcha', headers=HEADERS
@@ -62,7 +91,7 @@ class FurAffinity(Site):
         return {'captcha': base64.b64encode(captcha.content).decode('utf-8')}
 
     def add_account(self, data: Optional[dict]) -> List[Account]:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
         sess.cookies['b'] = session['fa_cookie_b']
 
         assert data is not None
@@ -115,7 +144,7 @@ class FurAffinity(Site):
         }
 
     def submit_artwork(self, submission: Submission, extra: Any = None) -> str:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         assert isinstance(self.credentials, dict)
         for (cookie_name, cookie_value) in self.credentials.items():
@@ -134,11 +163,12 @@ class FurAffinity(Site):
         write_site_response(self.SITE.value, req)
         req.raise_for_status()
 
-        req = sess.post(
-            'https://www.furaffinity.net/submit/',
-            data={'part': '2', 'submission_type': 'submission'},
-            headers=HEADERS,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://www.furaffinity.net/submit/',
+                data={'part': '2', 'submission_type': 'submission'},
+                headers=HEADERS,
+            )
         record_page(req)
         write_site_response(self.SITE.value, req)
         req.raise_for_status()
@@ -152,13 +182,17 @@ class FurAffinity(Site):
         if needs_resize:
             image = submission.resize_image(1280, 1280)
         else:
-            image = submission.get_image()
+            image = self.fit_image(submission)
 
-        req = sess.post(
-            'https://www.furaffinity.net/submit/',
+        body = MultipartBody(
             data={'part': '3', 'submission_type': 'submission', 'key': key},
             files={'submission': image},
-            headers=HEADERS,
+        )
+
+        req = sess.post(
+            'https://www.furaffinity.net/submit/',
+            data=body,
+            headers=body.headers(HEADERS),
         )
         record_page(req)
         write_site_response(self.SITE.value, req)
@@ -210,6 +244,7 @@ class FurAffinity(Site):
         if folder and folder != 'None':
             data['folder_ids[]'] = folder
 
+        self.posting = True
         req = sess.post(
             'https://www.furaffinity.net/submit/',
             data=data,
@@ -235,12 +270,16 @@ class FurAffinity(Site):
                 raise SiteError('Unable to find FurAffinity ID from URL')
             match = search.group(1)
 
+            body = MultipartBody(
+                data={'update': 'yes', 'rebuild-thumbnail': '1'},
+                files={'newsubmission': self.fit_image(submission)},
+            )
+
             req = sess.post(
                 'https://www.furaffinity.net/controls/submissions/changesubmission/%s/'
                 % match,
-                data={'update': 'yes', 'rebuild-thumbnail': '1'},
-                files={'newsubmission': submission.get_image()},
-                headers=HEADERS,
+                data=body,
+                headers=body.headers(HEADERS),
             )
             record_page(req)
             write_site_response(self.SITE.value, req)
@@ -272,7 +311,7 @@ class FurAffinity(Site):
         if prev_folders and not update:
             return prev_folders.json
 
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         req = sess.get(
             'https://www.furaffinity.net/controls/folders/submissions/',
@@ -2,12 +2,13 @@ import json
 import re
 from typing import Any, Dict, List, Optional
 
-import cfscrape
 from flask import flash, g, session
 import simplecrypt
 
 from multiupload.constant import HEADERS, Sites
+from multiupload.description import MARKDOWN_MENTIONS
 from multiupload.models import Account, AccountData, db
+from multiupload.retry import idempotent
 from multiupload.sites import (
     BadCredentials,
     BadData,
@@ -24,6 +25,12 @@ class FurryNetwork(Site):
     """FurryNetwork."""
 
     SITE = Sites.FurryNetwork
+    PROBE_URL = 'https://beta.furrynetwork.com/'
+
+    MENTIONS = {
+        **MARKDOWN_MENTIONS,
+        Sites.FurryNetwork: '[{username}](https://beta.furrynetwork.com/{username}/)',
+    }
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -36,21 +43,22 @@ class FurryNetwork(Site):
         return {'username': form.get('email', ''), 'password': form.get('password', '')}
 
     def add_account(self, data: Optional[dict]) -> List[Account]:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         assert data is not None
 
-        req = sess.post(
-            'https://beta.furrynetwork.com/api/oauth/token',
-            data={
-                'username': data['username'],
-                'password': data['password'],
-                'grant_type': 'password',
-                'client_id': '123',
-                'client_secret': '',
-            },
-            headers=HEADERS,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://beta.furrynetwork.com/api/oauth/token',
+                data={
+                    'username': data['username'],
+                    'password': data['password'],
+                    'grant_type': 'password',
+                    'client_id': '123',
+                    'client_secret': '',
+                },
+                headers=HEADERS,
+            )
         write_site_response(self.SITE.value, req)
 
         j = req.json()
@@ -119,7 +127,7 @@ class FurryNetwork(Site):
         return accounts
 
     def submit_artwork(self, submission: Submission, extra: Any = None) -> str:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         clear_recorded_pages()
 
@@ -128,15 +136,16 @@ class FurryNetwork(Site):
 
         character_id = self.credentials['character_id']
 
-        req = sess.post(
-            'https://beta.furrynetwork.com/api/oauth/token',
-            data={
-                'grant_type': 'refresh_token',
-                'client_id': '123',
-                'refresh_token': self.credentials['refresh'],
-            },
-            headers=HEADERS,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://beta.furrynetwork.com/api/oauth/token',
+                data={
+                    'grant_type': 'refresh_token',
+                    'client_id': '123',
+                    'refresh_token': self.credentials['refresh'],
+                },
+                headers=HEADERS,
+            )
         record_page(req)
         write_site_response(self.SITE.value, req)
         req.raise_for_status()
@@ -229,6 +238,7 @@ class FurryNetwork(Site):
         if not submission.rating:
             raise BadData()
 
+        self.posting = True
         req = sess.patch(
             'https://beta.furrynetwork.com/api/artwork/{id}'.format(id=post_id),
             data=json.dumps(
@@ -281,22 +291,23 @@ class FurryNetwork(Site):
         if prev_folders and not update:
             return prev_folders.json
 
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         if not self.credentials or not isinstance(self.credentials, dict):
             raise MissingCredentials()
 
         character_id = self.credentials['character_id']
 
-        req = sess.post(
-            'https://beta.furrynetwork.com/api/oauth/token',
-            data={
-                'grant_type': 'refresh_token',
-                'client_id': '123',
-                'refresh_token': self.credentials['refresh'],
-            },
-            headers=HEADERS,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://beta.furrynetwork.com/api/oauth/token',
+                data={
+                    'grant_type': 'refresh_token',
+                    'client_id': '123',
+                    'refresh_token': self.credentials['refresh'],
+                },
+                headers=HEADERS,
+            )
         req.raise_for_status()
 
         j = req.json()
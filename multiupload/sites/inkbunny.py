@@ -1,11 +1,13 @@
 import json
 from typing import Any, List, Optional
 
-import cfscrape
 from flask import session
 
 from multiupload.constant import HEADERS, Sites
+from multiupload.description import BBCODE
 from multiupload.models import Account, SubmissionGroup, db
+from multiupload.multipart import MultipartBody
+from multiupload.retry import idempotent
 from multiupload.sites import BadCredentials, Site, SiteError
 from multiupload.submission import Rating, Submission
 from multiupload.utils import clear_recorded_pages, record_page, write_site_response
@@ -15,6 +17,26 @@ class Inkbunny(Site):
     """Inkbunny."""
 
     SITE = Sites.Inkbunny
+    PROBE_URL = 'https://inkbunny.net/'
+
+    MENTIONS = {
+        Sites.Inkbunny: {
+            0: '[name]{username}[/name]',
+            1: '[icon]{username}[/icon]',
+            2: '[iconname]{username}[/iconname]',
+        },
+        Sites.FurAffinity: '[fa]{username}[/fa]',
+        Sites.Weasyl: '[w]{username}[/w]',
+        Sites.FurryNetwork: (
+            '[url=https://beta.furrynetwork.com/{username}/]{username}[/url]'
+        ),
+        Sites.SoFurry: '[sf]{username}[/sf]',
+        Sites.Twitter: '[url=https://twitter.com/{username}]{username}[/url]',
+        Sites.Mastodon: '[url={mastodon}]{username}[/url]',
+        Sites.Tumblr: '[url=https://{username}.tumblr.com/]{username}[/url]',
+        Sites.DeviantArt: '[da]{username}[/da]',
+    }
+    MARKUP = BBCODE
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -30,15 +52,16 @@ class Inkbunny(Site):
         }
 
     def add_account(self, data: Optional[dict]) -> List[Account]:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         assert data is not None
 
-        req = sess.post(
-            'https://inkbunny.net/api_login.php',
-            params={'username': data['username'], 'password': data['password']},
-            headers=HEADERS,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://inkbunny.net/api_login.php',
+                params={'username': data['username'], 'password': data['password']},
+                headers=HEADERS,
+            )
         write_site_response(self.SITE.value, req)
         req.raise_for_status()
 
@@ -60,13 +83,16 @@ class Inkbunny(Site):
         return [account]
 
     def submit_artwork(self, submission: Submission, extra: Any = None) -> str:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         clear_recorded_pages()
 
-        req = sess.post(
-            'https://inkbunny.net/api_login.php', data=self.credentials, headers=HEADERS
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://inkbunny.net/api_login.php',
+                data=self.credentials,
+                headers=HEADERS,
+            )
         record_page(req)
         req.raise_for_status()
 
@@ -75,11 +101,14 @@ class Inkbunny(Site):
         if 'error_message' in j:
             raise SiteError(j['error_message'])
 
+        body = MultipartBody(
+            data={'sid': j['sid']}, files={'uploadedfile[]': submission.get_image()}
+        )
+
         req = sess.post(
             'https://inkbunny.net/api_upload.php',
-            data={'sid': j['sid']},
-            files={'uploadedfile[]': submission.get_image()},
-            headers=HEADERS,
+            data=body,
+            headers=body.headers(HEADERS),
         )
         record_page(req)
         write_site_response(self.SITE.value, req)
@@ -104,6 +133,7 @@ class Inkbunny(Site):
         elif submission.rating == Rating.explicit:
             data['tag[4]'] = 'yes'
 
+        self.posting = True
         req = sess.post(
             'https://inkbunny.net/api_editsubmission.php', data=data, headers=HEADERS
         )
@@ -121,13 +151,16 @@ class Inkbunny(Site):
         )
 
     def upload_group(self, group: SubmissionGroup, extra: Any = None) -> str:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         clear_recorded_pages()
 
-        req = sess.post(
-            'https://inkbunny.net/api_login.php', data=self.credentials, headers=HEADERS
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://inkbunny.net/api_login.php',
+                data=self.credentials,
+                headers=HEADERS,
+            )
         req.raise_for_status()
 
         j = req.json()
@@ -144,11 +177,12 @@ class Inkbunny(Site):
             for image in self.collect_images(submissions)
         ]
 
+        body = MultipartBody(data={'sid': j['sid']}, files=images)
+
         req = sess.post(
             'https://inkbunny.net/api_upload.php',
-            data={'sid': j['sid']},
-            files=images,
-            headers=HEADERS,
+            data=body,
+            headers=body.headers(HEADERS),
         )
         record_page(req)
         write_site_response(self.SITE.value, req)
@@ -173,6 +207,7 @@ class Inkbunny(Site):
         elif master.rating == Rating.explicit:
             data['tag[4]'] = 'yes'
 
+        self.posting = True
         req = sess.post(
             'https://inkbunny.net/api_editsubmission.php', data=data, headers=HEADERS
         )
@@ -7,6 +7,7 @@ from mastodon import Mastodon as MastodonAPI
 from werkzeug import Response
 
 from multiupload.constant import Sites
+from multiupload.imaging import EncodingProfile
 from multiupload.models import Account, MastodonApp, db
 from multiupload.sites import BadData, MissingCredentials, Site
 from multiupload.sites.twitter import SHORT_NAMES
@@ -15,6 +16,7 @@ from multiupload.submission import Rating, Submission
 
 class Mastodon(Site):
     SITE = Sites.Mastodon
+    PROFILE = EncodingProfile(max_bytes=8 * 1024 * 1024)
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -165,6 +167,7 @@ class Mastodon(Site):
             image_desc = None
 
         if submission.rating == Rating.explicit and (noimage and noimage.val == 'yes'):
+            self.posting = True
             status = api.status_post(
                 status=status,
                 sensitive=is_sensitive,
@@ -172,11 +175,15 @@ class Mastodon(Site):
                 spoiler_text=content_warning,
             )
         else:
+            _, image = self.fit_image(submission)
+
             media = api.media_post(
-                submission.image_bytes,
+                image,
                 mime_type=submission.image_mimetype,
                 description=image_desc,
             )
+
+            self.posting = True
             status = api.status_post(
                 status=status,
                 sensitive=is_sensitive,
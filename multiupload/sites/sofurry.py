@@ -1,12 +1,15 @@
+from dataclasses import replace
 import json
 from typing import Any, List, Optional
 
 from bs4 import BeautifulSoup
-import cfscrape
 from flask import session
 
 from multiupload.constant import HEADERS, Sites
+from multiupload.description import BBCODE
 from multiupload.models import Account, db
+from multiupload.multipart import MultipartBody
+from multiupload.retry import idempotent
 from multiupload.sites import (
     BadCredentials,
     BadData,
@@ -21,6 +24,26 @@ from multiupload.utils import clear_recorded_pages, record_page, write_site_resp
 
 class SoFurry(Site):
     SITE = Sites.SoFurry
+    PROBE_URL = 'https://www.sofurry.com/'
+
+    MENTIONS = {
+        Sites.SoFurry: {
+            0: '[url=https://{sofurry}.sofurry.com/]{username}[/url]',
+            1: ':{username}icon:',
+            2: ':icon{username}:',
+        },
+        Sites.FurAffinity: 'fa!{username}',
+        Sites.Weasyl: '[url=https://www.weasyl.com/~{username}]{username}[/url]',
+        Sites.FurryNetwork: (
+            '[url=https://beta.furrynetwork.com/{username}]{username}[/url]'
+        ),
+        Sites.Inkbunny: 'ib!{username}',
+        Sites.Twitter: '[url=https://twitter.com/{username}]{username}[/url]',
+        Sites.Mastodon: '[url={mastodon}]{username}[/url]',
+        Sites.Tumblr: '[url=https://{username}.tumblr.com/]{username}[/url]',
+        Sites.DeviantArt: '[url=https://{lower}.deviantart.com/]{username}[/url]',
+    }
+    MARKUP = replace(BBCODE, rule='\n[rule]')
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -36,19 +59,20 @@ class SoFurry(Site):
         }
 
     def add_account(self, data: Optional[dict]) -> List[Account]:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         assert data is not None
 
-        req = sess.post(
-            'https://www.sofurry.com/user/login',
-            data={
-                'LoginForm[sfLoginUsername]': data['username'],
-                'LoginForm[sfLoginPassword]': data['password'],
-            },
-            headers=HEADERS,
-            allow_redirects=False,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://www.sofurry.com/user/login',
+                data={
+                    'LoginForm[sfLoginUsername]': data['username'],
+                    'LoginForm[sfLoginPassword]': data['password'],
+                },
+                headers=HEADERS,
+                allow_redirects=False,
+            )
         write_site_response(self.SITE.value, req)
 
         if 'sfuser' not in req.cookies:
@@ -67,7 +91,7 @@ class SoFurry(Site):
         return [account]
 
     def submit_artwork(self, submission: Submission, extra: Any = None) -> str:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         clear_recorded_pages()
 
@@ -77,15 +101,16 @@ class SoFurry(Site):
         if not isinstance(extra, dict):
             raise BadData()
 
-        req = sess.post(
-            'https://www.sofurry.com/user/login',
-            data={
-                'LoginForm[sfLoginUsername]': self.credentials['username'],
-                'LoginForm[sfLoginPassword]': self.credentials['password'],
-            },
-            headers=HEADERS,
-            allow_redirects=False,
-        )
+        with idempotent(sess):
+            req = sess.post(
+                'https://www.sofurry.com/user/login',
+                data={
+                    'LoginForm[sfLoginUsername]': self.credentials['username'],
+                    'LoginForm[sfLoginPassword]': self.credentials['password'],
+                },
+                headers=HEADERS,
+                allow_redirects=False,
+            )
         record_page(req)
         write_site_response(self.SITE.value, req)
 
@@ -109,8 +134,7 @@ class SoFurry(Site):
         if not submission.rating:
             raise BadData()
 
-        req = sess.post(
-            'https://www.sofurry.com/upload/details?contentType=1',
+        body = MultipartBody(
             data={
                 'UploadForm[P_title]': submission.title,
                 'UploadForm[contentLevel]': self.map_rating(submission.rating),
@@ -120,7 +144,13 @@ class SoFurry(Site):
                 'UploadForm[P_id]': key2,
             },
             files={'UploadForm[binarycontent]': submission.get_image()},
-            headers=HEADERS,
+        )
+
+        self.posting = True
+        req = sess.post(
+            'https://www.sofurry.com/upload/details?contentType=1',
+            data=body,
+            headers=body.headers(HEADERS),
         )
         record_page(req)
         write_site_response(self.SITE.value, req)
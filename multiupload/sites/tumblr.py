@@ -6,6 +6,8 @@ import tumblpy
 from werkzeug import Response
 
 from multiupload.constant import Sites
+from multiupload.description import MARKDOWN_MENTIONS
+from multiupload.imaging import EncodingProfile
 from multiupload.models import Account, AccountData, SubmissionGroup, db
 from multiupload.sites import (
     BadCredentials,
@@ -23,6 +25,9 @@ class Tumblr(Site):
     """Tumblr."""
 
     SITE = Sites.Tumblr
+    PROFILE = EncodingProfile(max_bytes=10 * 1024 * 1024)
+
+    MENTIONS = MARKDOWN_MENTIONS
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -141,6 +146,9 @@ class Tumblr(Site):
                 '## ' + submission.title + '\n\n' + submission.description
             )
 
+        _, image = self.fit_image(submission)
+
+        self.posting = True
         try:
             res = t.post(
                 'post',
@@ -148,7 +156,7 @@ class Tumblr(Site):
                 params={
                     'type': 'photo',
                     'caption': submission.description_for_site(self.SITE),
-                    'data': submission.image_bytes,
+                    'data': image,
                     'state': 'published',
                     'format': 'markdown',
                     'tags': self.tag_str(submission.tags),
@@ -188,7 +196,7 @@ class Tumblr(Site):
         s = master.submission
         submissions = group.submissions
 
-        images = self.collect_images(submissions)
+        images = self.collect_images(submissions, profile=self.profile())
 
         image_bytes = [image.data for image in images]
 
@@ -212,6 +220,7 @@ class Tumblr(Site):
         for idx, image in enumerate(image_bytes):
             params['data[{0}]'.format(idx)] = image
 
+        self.posting = True
         try:
             res = t.post('post', blog_url=self.account.username, params=params)
         except tumblpy.TumblpyError as ex:
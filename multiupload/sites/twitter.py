@@ -6,6 +6,7 @@ import tweepy
 from werkzeug import Response
 
 from multiupload.constant import Sites
+from multiupload.imaging import EncodingProfile
 from multiupload.models import Account, SavedSubmission, SubmissionGroup, db
 from multiupload.sentry import sentry
 from multiupload.sites import (
@@ -37,6 +38,11 @@ class Twitter(Site):
     """Twitter."""
 
     SITE = Sites.Twitter
+    PROFILE = EncodingProfile(
+        max_bytes=5 * 1024 * 1024,
+        max_dimension=1280,
+        formats=('JPEG', 'PNG', 'GIF', 'WEBP'),
+    )
 
     def __init__(
         self, credentials: Optional[bytes] = None, account: Optional[Account] = None
@@ -160,10 +166,12 @@ class Twitter(Site):
             if submission.rating == Rating.explicit and (
                 noimage and noimage.val == 'yes'
             ):
+                self.posting = True
                 tweet = api.update_status(status=status, possibly_sensitive=True)
             else:
-                filename, bytes = submission.resize_image(1280, 1280)
+                filename, bytes = self.fit_image(submission)
 
+                self.posting = True
                 tweet = api.update_with_media(
                     filename=filename,
                     file=bytes,
@@ -184,7 +192,9 @@ class Twitter(Site):
         s: Submission = master.submission
         submissions: List[SavedSubmission] = group.submissions
 
-        images = list(self.collect_images(submissions, max_size=2000))
+        images = list(
+            self.collect_images(submissions, profile=self.profile(max_dimension=2000))
+        )
 
         auth = self._get_oauth_handler()
         if not self.credentials or not isinstance(self.credentials, dict):
@@ -228,6 +238,7 @@ class Twitter(Site):
                 )
                 media_ids.append(res.media_id)
 
+            self.posting = True
             tweet = api.update_status(
                 status=status,
                 media_ids=media_ids,
@@ -1,11 +1,11 @@
 from typing import Any, Dict, List, Optional
 
 from bs4 import BeautifulSoup
-import cfscrape
 from flask import g, session
 
 from multiupload.constant import HEADERS, Sites
 from multiupload.models import Account, AccountData, db
+from multiupload.multipart import MultipartBody
 from multiupload.sites import (
     AccountExists,
     BadCredentials,
@@ -27,12 +27,25 @@ class Weasyl(Site):
     """Weasyl."""
 
     SITE = Sites.Weasyl
+    PROBE_URL = 'https://www.weasyl.com/'
+
+    MENTIONS = {
+        Sites.Weasyl: {0: '<~{username}>', 1: '<!{username}>', 2: '<!~{username}>'},
+        Sites.FurAffinity: '<fa:{username}>',
+        Sites.FurryNetwork: '[{username}](https://beta.furrynetwork.com/{username})',
+        Sites.Inkbunny: '<ib:{username}>',
+        Sites.SoFurry: '<sf:{username}>',
+        Sites.Twitter: '[{username}](https://twitter.com/{username})',
+        Sites.Mastodon: '[{username}]({mastodon})',
+        Sites.Tumblr: '[{username}](https://{lower}.tumblr.com/)',
+        Sites.DeviantArt: '<da:{username}>',
+    }
 
     def parse_add_form(self, form: dict) -> dict:
         return {'token': form.get('api_token', '').strip()}
 
     def add_account(self, data: Optional[dict]) -> List[Account]:
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         assert data is not None
 
@@ -75,7 +88,7 @@ class Weasyl(Site):
             raise BadCredentials()
         auth_headers[AUTH_HEADER] = self.credentials.decode('utf-8')
 
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         clear_recorded_pages()
 
@@ -108,11 +121,13 @@ class Weasyl(Site):
         if folder and folder != 'None':
             data['folderid'] = folder
 
+        body = MultipartBody(data=data, files={'submitfile': submission.get_image()})
+
+        self.posting = True
         req = sess.post(
             'https://www.weasyl.com/submit/visual',
-            data=data,
-            files={'submitfile': submission.get_image()},
-            headers=auth_headers,
+            data=body,
+            headers=body.headers(auth_headers),
         )
         record_page(req)
         write_site_response(self.SITE.value, req)
@@ -150,7 +165,7 @@ class Weasyl(Site):
             raise BadCredentials()
         auth_headers[AUTH_HEADER] = self.credentials.decode('utf-8')
 
-        sess = cfscrape.create_scraper()
+        sess = self.create_session()
 
         req = sess.get('https://www.weasyl.com/manage/folders', headers=auth_headers)
 
@@ -1,10 +1,38 @@
 const uploadBody = document.querySelector('#uploadModal .modal-body');
 const uploadClose = document.querySelector('#uploadModal button');
+function addCancelButton(jobId) {
+    const footer = uploadClose.parentNode;
+    // Reconnecting to a job sends its ID again
+    if (footer.querySelector('.cancel-upload'))
+        return;
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.classList.add('btn', 'btn-danger', 'cancel-upload');
+    button.innerHTML = 'Cancel';
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        await fetch(`/upload/job/${jobId}/cancel`, {
+            method: 'POST',
+            credentials: 'include',
+            headers: {
+                'X-CSRFToken': Multiupload.csrf,
+            },
+        });
+    });
+    footer.appendChild(button);
+}
+function removeCancelButton() {
+    const button = document.querySelector('#uploadModal .cancel-upload');
+    if (!button || !button.parentNode)
+        return;
+    button.parentNode.removeChild(button);
+}
 function uploadWithEvents(id) {
     const source = new EventSource(`/upload/art/saved?id=${id}`);
     let hadError = false;
     let count = 0;
     let uploaded = 0;
+    let queued = false;
     uploadBody.innerHTML = '';
     const p = document.createElement('p');
     uploadBody.appendChild(p);
@@ -31,6 +59,10 @@ function uploadWithEvents(id) {
             uploadBody.appendChild(e);
         }
     }
+    source.addEventListener('job', ev => {
+        queued = true;
+        addCancelButton(parseInt(ev.data, 10));
+    });
     source.addEventListener('count', ev => {
         count = parseFloat(ev.data);
         p.innerHTML = `Creating ${count} submissions.`;
@@ -59,7 +91,21 @@ function uploadWithEvents(id) {
         const data = JSON.parse(ev.data);
         setError(`Got status code ${data['code']} from ${data['site']} when uploading to ${data['account']}.`);
     });
+    source.addEventListener('cancelled', ev => {
+        const data = JSON.parse(ev.data);
+        const e = document.createElement('div');
+        e.innerHTML = `Cancelled uploading to ${data['account']} on ${data['site']}.`;
+        uploadBody.appendChild(e);
+    });
+    source.addEventListener('failed', ev => {
+        const data = JSON.parse(ev.data);
+        setError(data['msg']);
+    });
     source.addEventListener('error', ev => {
+        // Queued uploads continue on the server, let the browser reconnect
+        if (queued && source.readyState === EventSource.CONNECTING) {
+            return;
+        }
         setError('A site error occured, please try again later.');
         Raven.captureException(ev);
         source.close();
@@ -67,6 +113,7 @@ function uploadWithEvents(id) {
     source.addEventListener('done', () => {
         source.close();
         uploadClose.disabled = false;
+        removeCancelButton();
         bar.classList.remove('progress-bar-animated');
         if (!hadError) {
             bar.classList.remove('bg-info');
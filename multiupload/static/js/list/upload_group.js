@@ -6,11 +6,14 @@ class GroupUpload {
         this.bar = document.createElement('div');
         this.linkList = document.createElement('ul');
         this.delaying = document.createElement('div');
+        this.delays = {};
         this.hadError = false;
+        this.queued = false;
         this.count = 0;
         this.uploaded = 0;
         this.initHTML();
         this.source = new EventSource(`/upload/group/post?id=${id}`);
+        this.source.addEventListener('job', this.gotJob.bind(this));
         this.source.addEventListener('count', this.gotCount.bind(this));
         this.source.addEventListener('groupdone', this.gotGroupDone.bind(this));
         this.source.addEventListener('upload', this.gotUpload.bind(this));
@@ -20,10 +23,16 @@ class GroupUpload {
         this.source.addEventListener('badcreds', this.gotBadCreds.bind(this));
         this.source.addEventListener('siteerror', this.gotSiteError.bind(this));
         this.source.addEventListener('httperror', this.gotHTTPError.bind(this));
+        this.source.addEventListener('cancelled', this.gotCancelled.bind(this));
+        this.source.addEventListener('failed', this.gotFailed.bind(this));
     }
     updateProgress() {
         this.bar.style.width = `${Math.round(this.uploaded / this.count * 100)}%`;
     }
+    gotJob(ev) {
+        this.queued = true;
+        addCancelButton(parseInt(ev.data, 10));
+    }
     gotCount(ev) {
         this.count = parseInt(ev.data, 10);
         this.bar.classList.add('progress-bar-animated');
@@ -43,18 +52,31 @@ class GroupUpload {
         this.updateProgress();
     }
     gotDelay(ev) {
-        if (ev.data === 'start') {
-            this.bar.classList.remove('progress-bar-animated');
-            this.delaying.classList.remove('d-none');
+        const data = JSON.parse(ev.data);
+        const name = `${data.site} - ${data.account}`;
+        if (data.delay > 0) {
+            this.delays[name] = Date.now() + data.delay * 1000;
         }
         else {
+            delete this.delays[name];
+        }
+        const waiting = Object.keys(this.delays);
+        if (waiting.length === 0) {
             this.bar.classList.add('progress-bar-animated');
             this.delaying.classList.add('d-none');
+            return;
         }
+        this.bar.classList.remove('progress-bar-animated');
+        this.delaying.classList.remove('d-none');
+        this.delaying.innerHTML = waiting.map(account => {
+            const seconds = Math.max(Math.round((this.delays[account] - Date.now()) / 1000), 0);
+            return `Waiting ${seconds} seconds before the next upload to ${account} to avoid site rate limits`;
+        }).join('<br>');
     }
     gotDone() {
         this.source.close();
         this.close.disabled = false;
+        removeCancelButton();
         this.bar.classList.remove('progress-bar-animated');
         if (!this.hadError) {
             this.bar.classList.remove('bg-info');
@@ -63,6 +85,10 @@ class GroupUpload {
         this.close.addEventListener('click', () => window.location.reload());
     }
     gotError(ev) {
+        // Queued uploads continue on the server, let the browser reconnect
+        if (this.queued && this.source.readyState === EventSource.CONNECTING) {
+            return;
+        }
         this.setError('A site error occured, please try again later.');
         Raven.captureException(ev);
         this.source.close();
@@ -79,6 +105,16 @@ class GroupUpload {
         const data = JSON.parse(ev.data);
         this.setError(`Got a HTTP error for ${data.account} on ${data.site}: ${data.code}`);
     }
+    gotCancelled(ev) {
+        const data = JSON.parse(ev.data);
+        const e = document.createElement('div');
+        e.innerHTML = `Cancelled uploading to ${data.account} on ${data.site}.`;
+        this.body.appendChild(e);
+    }
+    gotFailed(ev) {
+        const data = JSON.parse(ev.data);
+        this.setError(data.msg);
+    }
     setError(message) {
         this.hadError = true;
         this.bar.classList.remove('bg-info');
@@ -8,7 +8,7 @@ class ImagePreview {
                     const parent = this.parentNode;
                     const imageSrc = parent.dataset.image;
 
-                    return `<img style="max-width: 200px; max-height: 200px;" src="/upload/imagepreview/${imageSrc}">`;
+                    return `<img style="max-width: 200px; max-height: 200px;" src="/upload/thumbnail/200/${imageSrc}">`;
                 },
                 trigger: 'hover',
                 html: true,
@@ -4,11 +4,45 @@ declare const $;
 const uploadBody = document.querySelector('#uploadModal .modal-body') as HTMLDivElement;
 const uploadClose = document.querySelector('#uploadModal button') as HTMLButtonElement;
 
+function addCancelButton(jobId: number) {
+    const footer = uploadClose.parentNode as HTMLDivElement;
+
+    // Reconnecting to a job sends its ID again
+    if (footer.querySelector('.cancel-upload')) return;
+
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.classList.add('btn', 'btn-danger', 'cancel-upload');
+    button.innerHTML = 'Cancel';
+
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+
+        await fetch(`/upload/job/${jobId}/cancel`, {
+            method: 'POST',
+            credentials: 'include',
+            headers: {
+                'X-CSRFToken': Multiupload.csrf,
+            },
+        });
+    });
+
+    footer.appendChild(button);
+}
+
+function removeCancelButton() {
+    const button = document.querySelector('#uploadModal .cancel-upload');
+    if (!button || !button.parentNode) return;
+
+    button.parentNode.removeChild(button);
+}
+
 function uploadWithEvents(id: number) {
     const source = new EventSource(`/upload/art/saved?id=${id}`);
     let hadError = false;
     let count = 0;
     let uploaded = 0;
+    let queued = false;
 
     uploadBody.innerHTML = '';
 
@@ -46,6 +80,12 @@ function uploadWithEvents(id: number) {
         }
     }
 
+    source.addEventListener('job', ev => {
+        queued = true;
+
+        addCancelButton(parseInt((ev as MessageEvent).data, 10));
+    });
+
     source.addEventListener('count', ev => {
         count = parseFloat((ev as MessageEvent).data);
         p.innerHTML = `Creating ${count} submissions.`;
@@ -85,7 +125,25 @@ function uploadWithEvents(id: number) {
         setError(`Got status code ${data['code']} from ${data['site']} when uploading to ${data['account']}.`);
     });
 
+    source.addEventListener('cancelled', ev => {
+        const data = JSON.parse((ev as MessageEvent).data);
+
+        const e = document.createElement('div');
+        e.innerHTML = `Cancelled uploading to ${data['account']} on ${data['site']}.`;
+        uploadBody.appendChild(e);
+    });
+
+    source.addEventListener('failed', ev => {
+        const data = JSON.parse((ev as MessageEvent).data);
+        setError(data['msg']);
+    });
+
     source.addEventListener('error', ev => {
+        // Queued uploads continue on the server, let the browser reconnect
+        if (queued && source.readyState === EventSource.CONNECTING) {
+            return;
+        }
+
         setError('A site error occured, please try again later.');
 
         Raven.captureException(ev);
@@ -96,6 +154,7 @@ function uploadWithEvents(id: number) {
     source.addEventListener('done', () => {
         source.close();
         uploadClose.disabled = false;
+        removeCancelButton();
 
         bar.classList.remove('progress-bar-animated');
 
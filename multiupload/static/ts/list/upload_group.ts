@@ -1,3 +1,9 @@
+interface StreamDelay {
+    site: string;
+    account: string;
+    delay: number;
+}
+
 interface StreamError {
     msg?: string;
     site: string;
@@ -13,7 +19,10 @@ class GroupUpload {
     private linkList = document.createElement('ul');
     private delaying = document.createElement('div');
 
+    private delays: { [account: string]: number } = {};
+
     private hadError = false;
+    private queued = false;
     private count = 0;
     private uploaded = 0;
 
@@ -24,6 +33,7 @@ class GroupUpload {
 
         this.source = new EventSource(`/upload/group/post?id=${id}`);
 
+        this.source.addEventListener('job', this.gotJob.bind(this));
         this.source.addEventListener('count', this.gotCount.bind(this));
         this.source.addEventListener('groupdone', this.gotGroupDone.bind(this));
         this.source.addEventListener('upload', this.gotUpload.bind(this));
@@ -33,12 +43,20 @@ class GroupUpload {
         this.source.addEventListener('badcreds', this.gotBadCreds.bind(this));
         this.source.addEventListener('siteerror', this.gotSiteError.bind(this));
         this.source.addEventListener('httperror', this.gotHTTPError.bind(this));
+        this.source.addEventListener('cancelled', this.gotCancelled.bind(this));
+        this.source.addEventListener('failed', this.gotFailed.bind(this));
     }
 
     private updateProgress() {
         this.bar.style.width = `${Math.round(this.uploaded / this.count * 100)}%`;
     }
 
+    private gotJob(ev: MessageEvent) {
+        this.queued = true;
+
+        addCancelButton(parseInt(ev.data, 10));
+    }
+
     private gotCount(ev: MessageEvent) {
         this.count = parseInt(ev.data, 10);
         this.bar.classList.add('progress-bar-animated');
@@ -65,18 +83,35 @@ class GroupUpload {
     }
 
     private gotDelay(ev: MessageEvent) {
-        if (ev.data === 'start') {
-            this.bar.classList.remove('progress-bar-animated');
-            this.delaying.classList.remove('d-none');
+        const data = JSON.parse(ev.data) as StreamDelay;
+        const name = `${data.site} - ${data.account}`;
+
+        if (data.delay > 0) {
+            this.delays[name] = Date.now() + data.delay * 1000;
         } else {
+            delete this.delays[name];
+        }
+
+        const waiting = Object.keys(this.delays);
+
+        if (waiting.length === 0) {
             this.bar.classList.add('progress-bar-animated');
             this.delaying.classList.add('d-none');
+            return;
         }
+
+        this.bar.classList.remove('progress-bar-animated');
+        this.delaying.classList.remove('d-none');
+        this.delaying.innerHTML = waiting.map(account => {
+            const seconds = Math.max(Math.round((this.delays[account] - Date.now()) / 1000), 0);
+            return `Waiting ${seconds} seconds before the next upload to ${account} to avoid site rate limits`;
+        }).join('<br>');
     }
 
     private gotDone() {
         this.source.close();
         this.close.disabled = false;
+        removeCancelButton();
 
         this.bar.classList.remove('progress-bar-animated');
 
@@ -89,6 +124,11 @@ class GroupUpload {
     }
 
     private gotError(ev: MessageEvent) {
+        // Queued uploads continue on the server, let the browser reconnect
+        if (this.queued && this.source.readyState === EventSource.CONNECTING) {
+            return;
+        }
+
         this.setError('A site error occured, please try again later.');
         Raven.captureException(ev);
         this.source.close();
@@ -109,6 +149,19 @@ class GroupUpload {
         this.setError(`Got a HTTP error for ${data.account} on ${data.site}: ${data.code}`);
     }
 
+    private gotCancelled(ev: MessageEvent) {
+        const data = JSON.parse(ev.data) as StreamError;
+
+        const e = document.createElement('div');
+        e.innerHTML = `Cancelled uploading to ${data.account} on ${data.site}.`;
+        this.body.appendChild(e);
+    }
+
+    private gotFailed(ev: MessageEvent) {
+        const data = JSON.parse(ev.data) as StreamError;
+        this.setError(data.msg);
+    }
+
     private setError(message?: string) {
         this.hadError = true;
 
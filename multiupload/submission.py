@@ -1,14 +1,25 @@
+from dataclasses import asdict, dataclass
 from enum import Enum
-from io import BytesIO
-from os.path import join
-from typing import Any, List, Optional, Tuple
+from io import SEEK_END, BytesIO
+from os.path import join, splitext
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 
 from PIL import Image
 from flask import current_app
 from raven import breadcrumbs
 
 from multiupload.constant import Sites
-from multiupload.description import parse_description
+from multiupload.description import render_all
+from multiupload.derivatives import get_store
+from multiupload.imaging import (
+    EncodingProfile,
+    ImageData,
+    ImageInput,
+    ImageSource,
+    ImageStream,
+    MappedReader,
+)
+from multiupload.rendition import RenditionCache
 
 
 def is_hashtag(tag: str) -> bool:
@@ -28,6 +39,71 @@ class MissingImage(Exception):
     pass
 
 
+# Extensions of formats images may be converted to for a site
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """ImageInfo is metadata about an image, read from its header without
+    decoding the image."""
+
+    width: int
+    height: int
+    format: Optional[str]
+    mode: str
+    animated: bool
+    size: int  # Bytes
+
+    @classmethod
+    def read(cls, f: Union[BinaryIO, ImageStream]) -> 'ImageInfo':
+        image = Image.open(f)
+
+        info = cls(
+            width=image.width,
+            height=image.height,
+            format=image.format,
+            mode=image.mode,
+            animated=getattr(image, 'is_animated', False),
+            size=f.seek(0, SEEK_END),
+        )
+
+        f.seek(0)
+        return info
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ImageInfo':
+        return cls(**data)
+
+
+def fit_image(
+    filename: str,
+    info: ImageInfo,
+    data: ImageInput,
+    profile: EncodingProfile,
+    renditions: RenditionCache,
+) -> Optional[Tuple[str, bytes]]:
+    """Encode an image to fit in profile, changing the extension of filename
+    if it has to be converted to another format. Returns None if the image can
+    be uploaded as it is."""
+
+    # Animations would lose every frame but the first
+    if info.animated:
+        return None
+
+    if profile.fits(info.width, info.height, info.size, info.format):
+        return None
+
+    format = profile.format_for(info.format)
+    if format != info.format:
+        filename = splitext(filename)[0] + FORMAT_EXTENSIONS.get(format or '', '')
+
+    return filename, renditions.fit(data, profile)
+
+
 class Submission(object):
     """Submission is a normalized representation of something to post."""
 
@@ -38,9 +114,17 @@ class Submission(object):
     rating: Optional[Rating] = None  # Rating of submission
 
     image_filename: Optional[str] = None  # Filename of submission
-    image_bytes: Optional[BytesIO] = None  # Bytes of image in submission
+    image_source: Optional[ImageSource] = None  # Stored file of image in submission
     image_mimetype: Optional[str] = None  # Mime type of image in submission
-    _image_size: Optional[int] = None
+    _image_bytes: Optional[ImageStream] = None
+    _image_info: Optional[ImageInfo] = None
+
+    # Shared with copies, so every site uploading it reuses the same resizes
+    renditions: Optional[RenditionCache] = None
+
+    # Descriptions rendered for each site, by the text they were rendered
+    # from. Shared with copies, so the description is only parsed once
+    _descriptions: Optional[Dict[str, Dict[Sites, str]]] = None
 
     # TODO: fix image type
     def __init__(
@@ -59,58 +143,107 @@ class Submission(object):
             if image.original_filename:
                 self.image_filename = image.original_filename
                 self.image_mimetype = image.image_mimetype
-                with open(
-                    join(current_app.config['UPLOAD_FOLDER'], image.image_filename),
-                    'rb',
-                ) as f:
-                    self.image_bytes = BytesIO(f.read())
+                self._image_info = image.image_info
+                self.image_source = ImageSource(
+                    join(current_app.config['UPLOAD_FOLDER'], image.image_filename)
+                )
         else:
             self.image_filename = image.filename
             self.image_bytes = BytesIO(image.read())
             self.image_mimetype = image.mimetype
 
-        if self.image_bytes:
-            self.image_bytes.seek(0)
+        if self._image_bytes:
+            self._image_bytes.seek(0)
+
+    def copy(self) -> 'Submission':
+        """Returns a copy with its own tags and image stream, so the same
+        submission can be uploaded to multiple accounts at once. The copy
+        shares the image and any metadata that has already been read."""
+        sub = Submission.__new__(Submission)
+        sub.__dict__.update(self.__dict__)
+
+        sub.tags = list(self.tags)
+        sub.hashtags = list(self.hashtags)
+
+        if self.image_source:
+            # Gets its own stream of the same mapped file when it is read
+            sub._image_bytes = None
+        elif self._image_bytes:
+            # Its own position in the same uploaded image, which isn't copied
+            sub._image_bytes = MappedReader(self._image_bytes.getbuffer())
+
+        return sub
+
+    @property
+    def image_bytes(self) -> Optional[ImageStream]:
+        """A stream of the image, a stored image is read without copying."""
+        if self._image_bytes is None and self.image_source:
+            self._image_bytes = self.image_source.open()
+
+        return self._image_bytes
+
+    @image_bytes.setter
+    def image_bytes(self, image_bytes: Optional[ImageStream]) -> None:
+        self._image_bytes = image_bytes
+        self.image_source = None
+
+    @property
+    def image_data(self) -> ImageData:
+        """The contents of the image, without copying them."""
+        if self.image_source:
+            return self.image_source.buffer
+
+        if not self._image_bytes:
+            raise MissingImage()
+
+        return self._image_bytes.getbuffer()
 
-    def get_image(self) -> Tuple[str, BytesIO]:
+    @property
+    def image_input(self) -> ImageInput:
+        """The image to transform, a stored image is transformed by path."""
+        return self.image_source or self.image_data
+
+    def get_image(self) -> Tuple[str, ImageStream]:
         """Returns a tuple suitable for uploading."""
         if not self.image_bytes or not self.image_filename:
             raise MissingImage()
         self.image_bytes.seek(0)
         return self.image_filename, self.image_bytes
 
-    def image_res(self) -> Tuple[int, int]:
+    @property
+    def image_info(self) -> ImageInfo:
+        """Metadata about the image, read the first time it is needed."""
+        if self._image_info:
+            return self._image_info
+
         if not self.image_bytes:
             raise MissingImage()
-        image = Image.open(self.image_bytes)
-        height, width = image.height, image.width
-        self.image_bytes.seek(0)
-        return height, width
+
+        self._image_info = ImageInfo.read(self.image_bytes)
+        return self._image_info
+
+    def image_res(self) -> Tuple[int, int]:
+        info = self.image_info
+        return info.height, info.width
 
     def resize_image(
         self, height: int, width: int, replace: bool = False
-    ) -> Tuple[str, BytesIO]:
-        """Resize image to specified height and width with antialiasing"""
+    ) -> Tuple[str, ImageStream]:
+        """Resize image to specified height and width with antialiasing, reusing
+        an earlier resize to the same size from renditions or the derivative
+        store."""
         if not self.image_bytes or not self.image_filename:
             raise MissingImage()
 
-        image = Image.open(self.image_bytes)
+        info = self.image_info
 
-        if image.height <= height and image.width <= width:
+        if info.height <= height and info.width <= width:
             self.image_bytes.seek(0)
             return self.image_filename, self.image_bytes
 
-        # need to get extension from name due to bytes not having a name
+        # need to get format from the image due to bytes not having a name
         # when resizing this causes an issue as it cannot determine type
-        if image.format:
-            f = image.format
-        else:
-            f = None
-
-        if not image.mode.startswith('RGB'):
-            image = image.convert('RGBA')  # Everything works better as RGB
-
-        image.thumbnail((height, width), Image.ANTIALIAS)
+        f = info.format
 
         breadcrumbs.record(
             message=f'Attempting to resize image with extension {f}',
@@ -118,33 +251,63 @@ class Submission(object):
             level='info',
         )
 
-        resized_image = BytesIO()
-        image.save(resized_image, f)
-        resized_image.seek(0)
+        renditions = self.renditions or RenditionCache(get_store())
+        resized_image = BytesIO(renditions.resize(self.image_input, height, width, f))
 
         breadcrumbs.record(message='Resized image', category='furryapp', level='info')
 
         if replace:
             self.image_bytes = resized_image
+            self._image_info = None
 
         self.image_bytes.seek(0)
         return self.image_filename, resized_image
 
+    def fit_image(self, profile: Optional[EncodingProfile]) -> Tuple[str, ImageStream]:
+        """Get the image encoded to fit in what a site accepts, or the image as
+        it is if it already does."""
+        if not profile or not self.image_filename:
+            return self.get_image()
+
+        renditions = self.renditions or RenditionCache(get_store())
+
+        fitted = fit_image(
+            self.image_filename, self.image_info, self.image_input, profile, renditions
+        )
+        if not fitted:
+            return self.get_image()
+
+        filename, data = fitted
+        return filename, BytesIO(data)
+
+    def descriptions_for_sites(self, sites: Iterable[Sites]) -> Dict[Sites, str]:
+        """Returns formatted descriptions for each of sites, only rendering
+        the ones that haven't been already."""
+        if self._descriptions is None:
+            self._descriptions = {}
+
+        rendered = self._descriptions.setdefault(self.description or '', {})
+
+        sites = set(sites)
+        missing = [site for site in sites if site not in rendered]
+        if missing:
+            values = render_all(self.description, (site.value for site in missing))
+            rendered.update({site: values[site.value] or '' for site in missing})
+
+        return {site: rendered[site] for site in sites}
+
     def description_for_site(self, site: Sites) -> str:
         """Returns a formatted description for a specific site."""
-        return parse_description(self.description, site.value) or ''
+        return self.descriptions_for_sites([site])[site]
 
     @property
     def image_size(self) -> int:
-        if self._image_size:
-            return self._image_size
+        """Size of the image in bytes, known even if it isn't an image Pillow
+        can read."""
+        if self._image_info:
+            return self._image_info.size
 
-        if not self.image_bytes:
-            raise MissingImage()
-
-        self._image_size = len(self.image_bytes.getbuffer())
-        self.image_bytes.seek(0)
-        return self._image_size
+        return len(self.image_data)
 
     @staticmethod
     def tags_from_str(tags: str) -> Tuple[List[str], List[str]]:
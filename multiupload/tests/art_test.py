@@ -1,8 +1,23 @@
 # type: ignore
 
+import random
 import unittest
-
-from multiupload.description import get_mastodon_link, parse_description
+from unittest.mock import patch
+
+from multiupload.constant import Sites
+from multiupload.description import (
+    BBCODE,
+    MARKUP,
+    MENTION,
+    MENTIONS,
+    DescriptionCache,
+    add_known_sites,
+    add_site,
+    get_mastodon_link,
+    parse_description,
+    render_all,
+    render_mention,
+)
 
 
 class TestMastodonLink(unittest.TestCase):
@@ -148,3 +163,193 @@ class TestDescriptionToWeasyl(unittest.TestCase):
             unparsed = "<|Syfaro,5,%d|>" % t
 
             self.assertEqual(should_be, parse_description(unparsed, 2))
+
+
+class TestDescriptionMarkdown(unittest.TestCase):
+    def test_emphasis(self):
+        unparsed = "**bold** and *italic* and ~~struck~~ and `code`"
+
+        self.assertEqual(
+            "[b]bold[/b] and [i]italic[/i] and [s]struck[/s] and [code]code[/code]",
+            parse_description(unparsed, 1),
+        )
+        self.assertEqual(
+            "<strong>bold</strong> and <em>italic</em> and <strike>struck</strike> and code",
+            parse_description(unparsed, 8),
+        )
+        self.assertEqual(unparsed, parse_description(unparsed, 2))
+
+    def test_nested(self):
+        self.assertEqual("[i]a [b]b[/b] c[/i]", parse_description("*a **b** c*", 1))
+        self.assertEqual(
+            "[url=https://www.google.com][b]a link[/b][/url]",
+            parse_description("[**a link**](https://www.google.com)", 4),
+        )
+        self.assertEqual(
+            "[i][url=https://www.weasyl.com/~Syfaro_]Syfaro_[/url][/i]",
+            parse_description("*<|Syfaro_,2,0|>*", 1),
+        )
+        self.assertEqual("*<~Syfaro_>*", parse_description("*<|Syfaro_,2,0|>*", 2))
+
+    def test_rule(self):
+        unparsed = "above\n-----\nbelow"
+
+        self.assertEqual("above\n[hr]\nbelow", parse_description(unparsed, 1))
+        self.assertEqual("above\n[rule]\nbelow", parse_description(unparsed, 5))
+        self.assertEqual("above\nbelow", parse_description(unparsed, 4))
+        self.assertEqual(unparsed, parse_description(unparsed, 2))
+
+    def test_many_mentions(self):
+        unparsed = " ".join("<|user{0},2,0|>".format(i) for i in range(1000))
+        parsed = parse_description(unparsed, 2)
+
+        self.assertNotIn("<|", parsed)
+        self.assertTrue(parsed.endswith("<~user999>"))
+
+
+def mentions_first(description, site):
+    """Replace only mentions, as descriptions were before Markdown was
+    converted, which is all sites with Markdown should get."""
+    return MENTION.sub(
+        lambda m: render_mention(m.group(1), int(m.group(2)), int(m.group(3)), site),
+        description,
+    )
+
+
+class TestMentionsInMarkdown(unittest.TestCase):
+    def test_underscores(self):
+        self.assertEqual(
+            "my_oc drawn by <fa:some_user>",
+            parse_description("my_oc drawn by <|some_user,1,0|>", 2),
+        )
+        self.assertEqual(
+            "x_y [a_b](https://beta.furrynetwork.com/a_b/)",
+            parse_description("x_y <|a_b,3,0|>", 3),
+        )
+        self.assertEqual(
+            "[i]a[/i] [url=https://www.weasyl.com/~b_c]b_c[/url]_",
+            parse_description("_a_ <|b_c,2,0|>_", 1),
+        )
+
+    def test_in_code(self):
+        self.assertEqual(
+            "[code]:linkSyfaro:[/code]", parse_description("`<|Syfaro,1,0|>`", 1)
+        )
+        self.assertEqual("`<~Syfaro>`", parse_description("`<|Syfaro,2,0|>`", 2))
+
+    def test_against_mentions_first(self):
+        rand = random.Random(1)
+
+        pieces = ['my_oc', ' ', '_', '*', '**', '`', '~~', 'x_y', '[a](http://b_c)']
+        usernames = ['some_user', 'a_b', 'x*y', 'Syfaro', 'a~~b']
+        sites = [1, 2, 3, 4, 5, 7, 8, 100, 101]
+
+        for _ in range(2000):
+            parts = []
+            for _ in range(rand.randint(1, 8)):
+                if rand.random() < 0.4:
+                    parts.append(
+                        '<|{0},{1},{2}|>'.format(
+                            rand.choice(usernames),
+                            rand.choice(sites),
+                            rand.randint(0, 2),
+                        )
+                    )
+                else:
+                    parts.append(rand.choice(pieces))
+
+            description = ''.join(parts)
+
+            for site in sites:
+                parsed = parse_description(description, site)
+
+                self.assertNotIn('<|', parsed, description)
+                if site not in MARKUP:
+                    self.assertEqual(
+                        mentions_first(description, site), parsed, description
+                    )
+
+
+@patch('multiupload.utils.send_to_influx')
+class TestDescriptionCache(unittest.TestCase):
+    @patch('multiupload.description.render_all', side_effect=render_all)
+    def test_cached(self, render, send_to_influx):
+        cache = DescriptionCache(10)
+
+        first = cache.render_all("*hi*", [1, 2])
+        self.assertEqual(first, {1: "[i]hi[/i]", 2: "*hi*"})
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        self.assertEqual(cache.render_all("*hi*", [2, 1]), first)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertEqual(render.call_count, 1)
+
+        cache.render_all("*hi*", [1, 8])
+        render.assert_called_with("*hi*", [8])
+
+    def test_evicted(self, send_to_influx):
+        cache = DescriptionCache(2)
+
+        cache.render_all("a", [1])
+        cache.render_all("b", [1])
+        cache.render_all("a", [1])
+        cache.render_all("c", [1])
+
+        self.assertEqual(len(cache.descriptions), 2)
+
+        cache.render_all("a", [1])
+        self.assertEqual(cache.misses, 3)
+
+        cache.render_all("b", [1])
+        self.assertEqual(cache.misses, 4)
+
+    def test_reported(self, send_to_influx):
+        cache = DescriptionCache(10)
+
+        cache.render_all("a", [1, 2])
+        cache.render_all("a", [1, 3])
+
+        self.assertEqual(
+            [call.args[0]['fields'] for call in send_to_influx.call_args_list],
+            [
+                {'hits': 0, 'misses': 2, 'size': 0},
+                {'hits': 1, 'misses': 1, 'size': 2},
+            ],
+        )
+        self.assertEqual(
+            send_to_influx.call_args.args[0]['measurement'], 'description_cache'
+        )
+
+
+class TestSiteTables(unittest.TestCase):
+    def setUp(self):
+        add_known_sites()
+
+    def test_templates(self):
+        self.assertIn((1, 1, 0), MENTIONS)
+
+        for (uploading_to, linking_to, link_type), template in MENTIONS.items():
+            text = render_mention(
+                '@Some_User@example.com', linking_to, link_type, uploading_to
+            )
+
+            self.assertIn('Some_User', text, template)
+
+    @patch('multiupload.description._known_sites_added', False)
+    def test_added_when_rendering(self):
+        with patch.dict(MENTIONS, clear=True), patch.dict(MARKUP, clear=True):
+            self.assertEqual(
+                '[i]hi[/i] :linkSyfaro:',
+                parse_description('*hi* <|Syfaro,1,0|>', Sites.FurAffinity.value),
+            )
+
+    def test_add_site(self):
+        with patch.dict(MENTIONS), patch.dict(MARKUP):
+            add_site(Sites.Twitter, {Sites.Weasyl: '@{lower}'}, BBCODE)
+
+            self.assertEqual(
+                "[i]@syfaro[/i] [url=https://example.com]site[/url]",
+                parse_description("*<|Syfaro,2,5|>* [site](https://example.com)", 100),
+            )
+
+        self.assertEqual("**", parse_description("*<|Syfaro,2,5|>*", 100))
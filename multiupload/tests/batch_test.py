@@ -0,0 +1,135 @@
+# type: ignore
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import unittest
+from unittest.mock import patch
+
+from multiupload.batch import BatchItem, batch_progress, create_batch, plan_batch
+from multiupload.constant import Sites
+from multiupload.models import JobStatus, UploadJob, db
+from multiupload.tests.database import DatabaseTestCase
+
+
+class TestPlanBatch(unittest.TestCase):
+    start = datetime(2020, 1, 1)
+    delays = {Sites.FurAffinity: 20, Sites.Weasyl: 10, Sites.Twitter: 0}
+
+    def plan(self, *items):
+        return [at for _, at in plan_batch(list(items), self.delays, self.start)]
+
+    def test_same_site_is_spaced(self):
+        times = self.plan(
+            BatchItem('art', 1, {Sites.FurAffinity: 1}),
+            BatchItem('art', 2, {Sites.FurAffinity: 1}),
+            BatchItem('art', 3, {Sites.FurAffinity: 2}),
+            BatchItem('art', 4, {Sites.FurAffinity: 1}),
+        )
+
+        self.assertEqual(
+            [(at - self.start).total_seconds() for at in times], [0, 20, 40, 80]
+        )
+
+    def test_waits_for_slowest_site(self):
+        times = self.plan(
+            BatchItem('art', 1, {Sites.FurAffinity: 1}),
+            BatchItem('art', 2, {Sites.Weasyl: 1, Sites.Twitter: 1}),
+            BatchItem('art', 3, {Sites.FurAffinity: 1, Sites.Weasyl: 1}),
+            BatchItem('art', 4, {Sites.Twitter: 1}),
+        )
+
+        self.assertEqual(
+            [(at - self.start).total_seconds() for at in times], [0, 0, 20, 0]
+        )
+
+
+class TestBatchProgress(unittest.TestCase):
+    def job(self, status, minutes):
+        return SimpleNamespace(
+            status=status,
+            scheduled_at=datetime(2020, 1, 1) + timedelta(minutes=minutes),
+            created_at=datetime(2020, 1, 1),
+        )
+
+    def batch(self, *jobs):
+        return SimpleNamespace(jobs=SimpleNamespace(all=lambda: list(jobs)))
+
+    def test_eta_from_throughput(self):
+        batch = self.batch(
+            self.job(JobStatus.done, 0),
+            self.job(JobStatus.failed, 1),
+            self.job(JobStatus.pending, 2),
+            self.job(JobStatus.pending, 3),
+        )
+
+        progress = batch_progress(batch, datetime(2020, 1, 1, 1))
+
+        self.assertEqual(progress.remaining, 2)
+        self.assertEqual(progress.throughput, 2)
+        self.assertEqual(progress.eta, datetime(2020, 1, 1, 2))
+
+    def test_eta_before_anything_finished(self):
+        batch = self.batch(
+            self.job(JobStatus.pending, 0), self.job(JobStatus.pending, 5)
+        )
+
+        progress = batch_progress(batch, datetime(2020, 1, 1))
+
+        self.assertIsNone(progress.throughput)
+        self.assertEqual(progress.eta, datetime(2020, 1, 1, 0, 5))
+
+    def test_cancelled_not_remaining(self):
+        batch = self.batch(
+            self.job(JobStatus.done, 0),
+            self.job(JobStatus.pending, 30),
+            self.job(JobStatus.cancelled, 90),
+        )
+
+        progress = batch_progress(batch, datetime(2020, 1, 1, 1))
+
+        self.assertEqual(progress.cancelled, 1)
+        self.assertEqual(progress.remaining, 1)
+        self.assertEqual(progress.eta, datetime(2020, 1, 1, 2))
+
+        batch = self.batch(
+            self.job(JobStatus.done, 0), self.job(JobStatus.cancelled, 90)
+        )
+        self.assertIsNone(batch_progress(batch, datetime(2020, 1, 1, 1)).eta)
+
+
+class TestCreateBatch(DatabaseTestCase):
+    items = [
+        BatchItem('art', 1, {Sites.Weasyl: 1}),
+        BatchItem('art', 2, {Sites.Weasyl: 1}),
+        BatchItem('group', 3, {Sites.Weasyl: 1}),
+    ]
+
+    def create(self):
+        with patch('multiupload.batch.pending_items', return_value=self.items):
+            return create_batch()
+
+    @patch('multiupload.models.encrypt', return_value=b'secret')
+    def test_password_encrypted_once(self, encrypt):
+        batch = self.create()
+
+        encrypt.assert_called_once()
+
+        jobs = batch.jobs.all()
+        self.assertEqual(len(jobs), 3)
+        for job in jobs:
+            self.assertIsNone(job.secret)
+            self.assertEqual(job.password_secret, b'secret')
+
+    def test_secret_kept_until_finished(self):
+        batch = self.create()
+        first, second, third = batch.jobs.order_by(UploadJob.id).all()
+
+        first.finish(JobStatus.done)
+        second.cancel()
+        db.session.commit()
+        self.assertIsNotNone(batch.secret)
+
+        third.status = JobStatus.running
+        third.finish(JobStatus.failed)
+        db.session.commit()
+        self.assertIsNone(batch.secret)
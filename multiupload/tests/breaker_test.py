@@ -0,0 +1,60 @@
+# type: ignore
+
+import os
+import tempfile
+import time
+import unittest
+
+from multiupload.breaker import BreakerState, CircuitBreaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+        self.breaker = CircuitBreaker(self.path, failures=2, slow=1, cooldown=0.1)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_opens_after_failures(self):
+        self.breaker.observe('site', 503, 0.1)
+        self.assertEqual(self.breaker.state('site'), BreakerState.closed)
+
+        self.breaker.observe('site', 200, 5)
+        self.assertEqual(self.breaker.state('site'), BreakerState.open)
+        self.assertGreater(self.breaker.retry_in('site'), 0)
+
+    def test_success_resets(self):
+        self.breaker.observe('site', 502, 0.1)
+        self.breaker.observe('site', 404, 0.1)
+        self.breaker.observe('site', 502, 0.1)
+
+        self.assertEqual(self.breaker.state('site'), BreakerState.closed)
+
+    def test_single_probe(self):
+        self.breaker.record('site', False)
+        self.breaker.record('site', False)
+        self.assertFalse(self.breaker.claim_probe('site'))
+
+        time.sleep(0.1)
+
+        self.assertEqual(self.breaker.state('site'), BreakerState.half_open)
+        self.assertTrue(self.breaker.claim_probe('site'))
+        self.assertFalse(self.breaker.claim_probe('site'))
+
+        # Failed probe opens the breaker for another cooldown
+        self.breaker.record('site', False)
+        self.assertEqual(self.breaker.state('site'), BreakerState.open)
+
+    def test_probe_closes(self):
+        self.breaker.record('site', False)
+        self.breaker.record('site', False)
+
+        time.sleep(0.1)
+
+        self.assertTrue(self.breaker.claim_probe('site'))
+        self.breaker.record('site', True)
+
+        self.assertEqual(self.breaker.state('site'), BreakerState.closed)
@@ -0,0 +1,48 @@
+# type: ignore
+
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from bcrypt import gensalt
+from flask import Flask, g, session
+
+from multiupload.models import User, db
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs each test in a request for a signed in user, with an empty
+    database. It is kept in a file so threads uploading have their own
+    connections."""
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+        self.app = Flask(__name__)
+        self.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + join(self.folder.name, 'test.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            SECRET_KEY='secret',
+            UPLOAD_FOLDER=self.folder.name,
+        )
+        db.init_app(self.app)
+
+        context = self.app.test_request_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+
+        # Hashing passwords properly is slow and tests don't need it
+        with patch('multiupload.models.gensalt', lambda: gensalt(4)):
+            self.user = User('test', 'password')
+        db.session.add(self.user)
+        db.session.commit()
+
+        g.user = self.user
+        session['id'] = self.user.id
+        session['password'] = 'password'
@@ -0,0 +1,56 @@
+# type: ignore
+
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from multiupload.derivatives import DerivativeStore
+
+
+class TestDerivativeStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.store = DerivativeStore(self.dir.name, 100)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def age(self, digest, transform, when):
+        os.utime(self.store.path(digest, transform), (when, when))
+
+    def test_put_get(self):
+        self.assertIsNone(self.store.get('abcd', '10x10'))
+
+        self.store.put('abcd', '10x10', b'data')
+
+        self.assertEqual(self.store.get('abcd', '10x10'), b'data')
+        self.assertIsNone(self.store.get('abcd', '20x20'))
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, 'ab')), ['abcd-10x10'])
+
+    def test_evicts_least_recently_used(self):
+        self.store.put('aaaa', '1', b'a' * 40)
+        self.store.put('bbbb', '1', b'b' * 40)
+        self.age('aaaa', '1', 1000)
+        self.age('bbbb', '1', 2000)
+
+        # Reading marks it as used again
+        self.store.get('aaaa', '1')
+
+        self.store.put('cccc', '1', b'c' * 40)
+
+        self.assertIsNotNone(self.store.get('aaaa', '1'))
+        self.assertIsNone(self.store.get('bbbb', '1'))
+        self.assertIsNotNone(self.store.get('cccc', '1'))
+
+    def test_evicts_files_from_other_workers(self):
+        self.store.put('aaaa', '1', b'a' * 10)
+        self.age('aaaa', '1', 1000)
+
+        other = DerivativeStore(self.dir.name, 100)
+        other.put('bbbb', '1', b'b' * 80)
+
+        self.store.put('cccc', '1', b'c' * 80)
+
+        self.assertIsNone(self.store.get('aaaa', '1'))
+        self.assertIsNone(self.store.get('bbbb', '1'))
+        self.assertEqual(self.store.get('cccc', '1'), b'c' * 80)
@@ -0,0 +1,296 @@
+# type: ignore
+
+from io import SEEK_END, BytesIO
+import os
+from pathlib import Path
+import pickle
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+
+from multiupload.imaging import (
+    DRAFT_GAP,
+    QUALITY,
+    REDUCING_GAP,
+    SHRINK_STEPS,
+    EncodingProfile,
+    ImagePool,
+    ImageSource,
+    ImageTooLarge,
+    MappedReader,
+    encode_under,
+    fit,
+    load,
+    plan_downscale,
+    render,
+)
+
+
+class TestPlanDownscale(unittest.TestCase):
+    def test_small_reduction_resamples_directly(self):
+        self.assertEqual(
+            plan_downscale((1600, 1200), (1280, 1280), 'JPEG'), (None, None)
+        )
+        self.assertEqual(plan_downscale((800, 600), (1280, 1280), 'JPEG'), (None, None))
+
+    def test_large_jpeg_is_drafted(self):
+        draft, gap = plan_downscale((8000, 6000), (1280, 1280), 'JPEG')
+
+        # Never decoded below twice the target size
+        self.assertEqual(draft, (1280 * DRAFT_GAP, 1280 * DRAFT_GAP))
+        self.assertEqual(gap, REDUCING_GAP)
+
+    def test_other_formats_are_not_drafted(self):
+        self.assertEqual(
+            plan_downscale((4000, 4000), (1280, 1280), 'PNG'), (None, REDUCING_GAP)
+        )
+
+
+def encode(image, format):
+    data = BytesIO()
+    image.save(data, format)
+
+    return data.getvalue()
+
+
+class TestRender(unittest.TestCase):
+    jpeg = encode(Image.new('RGB', (4000, 3000), (200, 100, 50)), 'JPEG')
+    png = encode(Image.new('RGBA', (3000, 1500), (0, 0, 255, 128)), 'PNG')
+
+    def render(self, *args, **kwargs):
+        return Image.open(BytesIO(render(*args, **kwargs)))
+
+    @patch.object(
+        JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft
+    )
+    def test_large_jpeg(self, draft):
+        image = self.render(self.jpeg, 1000, 1000)
+
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.mode, 'RGB')
+        self.assertEqual(image.size, (1000, 750))
+
+        # Pillow may try drafting again when making the thumbnail, but the
+        # image was already decoded at the size asked for first
+        self.assertEqual(
+            draft.call_args_list[0].args[1:],
+            (None, (1000 * DRAFT_GAP, 1000 * DRAFT_GAP)),
+        )
+
+    @patch.object(
+        JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft
+    )
+    def test_small_reduction(self, draft):
+        image = self.render(encode(Image.new('RGB', (1200, 900)), 'JPEG'), 1000, 1000)
+
+        self.assertEqual(image.size, (1000, 750))
+        draft.assert_not_called()
+
+    def test_box(self):
+        self.assertEqual(self.render(self.jpeg, 400, 1000).size, (400, 300))
+        self.assertEqual(self.render(self.jpeg, 1000, 150).size, (200, 150))
+
+    def test_transparent_png(self):
+        image = self.render(self.png, 600, 600)
+
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.mode, 'RGBA')
+        self.assertEqual(image.size, (600, 300))
+        self.assertEqual(image.getpixel((0, 0)), (0, 0, 255, 128))
+
+    def test_converted(self):
+        image = self.render(self.png, 600, 600, 'JPEG', 80)
+
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.mode, 'RGB')
+        self.assertEqual(image.size, (600, 300))
+
+        image = self.render(self.jpeg, 1000, 1000, 'WEBP')
+
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (1000, 750))
+
+    def test_palette(self):
+        image = Image.new('RGB', (400, 400), (255, 0, 0)).convert('P')
+
+        resized, format = load(encode(image, 'GIF'), (100, 100))
+
+        self.assertEqual(format, 'GIF')
+        self.assertEqual(resized.mode, 'RGBA')
+        self.assertEqual(resized.size, (100, 100))
+
+    def test_stored(self):
+        with TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'image.jpg')
+            Path(path).write_bytes(self.jpeg)
+
+            image, format = load(ImageSource(path), (1000, 1000))
+
+            self.assertEqual(format, 'JPEG')
+            self.assertEqual(image.size, (1000, 750))
+
+
+class TestImageSource(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def source(self, name, write):
+        path = os.path.join(self.dir.name, name)
+        write(path)
+
+        return ImageSource(path)
+
+    def test_streams_have_own_position(self):
+        source = self.source('data', lambda path: Path(path).write_bytes(b'abcdef'))
+
+        first, second = source.open(), source.open()
+
+        self.assertEqual(first.read(2), b'ab')
+        self.assertEqual(second.read(), b'abcdef')
+        self.assertEqual(first.read(), b'cdef')
+        self.assertEqual(first.seek(-1, SEEK_END), 5)
+        self.assertEqual(first.read(10), b'f')
+
+        self.assertIs(source.buffer, second.getbuffer())
+
+    def test_opened_by_pil(self):
+        source = self.source('image.png', Image.new('RGB', (30, 20)).save)
+
+        self.assertEqual(Image.open(source.open()).size, (30, 20))
+
+    def test_empty_file(self):
+        source = self.source('empty', lambda path: Path(path).touch())
+
+        self.assertEqual(source.open().read(), b'')
+
+    def test_pickled_by_path(self):
+        source = self.source('image.png', Image.new('RGB', (300, 200)).save)
+        source.buffer
+
+        data = pickle.dumps(source)
+        self.assertLess(len(data), len(source.buffer))
+
+        copy = pickle.loads(data)
+        self.assertEqual(copy.path, source.path)
+        self.assertEqual(copy.buffer, source.buffer)
+
+    @patch('multiupload.utils.send_to_influx')
+    def test_transformed_in_pool(self, send_to_influx):
+        source = self.source('image.png', Image.new('RGB', (300, 200)).save)
+
+        pool = ImagePool(1, 1)
+        self.addCleanup(pool.executor.shutdown)
+
+        self.assertEqual(pool.run(fit, source, EncodingProfile()), source.buffer)
+        send_to_influx.assert_called_once()
+
+
+class TestMappedReader(unittest.TestCase):
+    def test_readinto(self):
+        reader = MappedReader(memoryview(b'abcdef'))
+        reader.seek(4)
+
+        buffer = bytearray(4)
+        self.assertEqual(reader.readinto(buffer), 2)
+        self.assertEqual(buffer[:2], b'ef')
+        self.assertEqual(reader.tell(), 6)
+
+
+class TestEncodingProfile(unittest.TestCase):
+    profile = EncodingProfile(
+        max_bytes=1000, max_dimension=100, formats=('JPEG', 'PNG')
+    )
+
+    def test_fits(self):
+        self.assertTrue(self.profile.fits(100, 50, 1000, 'PNG'))
+        self.assertFalse(self.profile.fits(100, 50, 1001, 'PNG'))
+        self.assertFalse(self.profile.fits(50, 101, 1000, 'PNG'))
+        self.assertFalse(self.profile.fits(50, 50, 1000, 'WEBP'))
+
+        self.assertTrue(EncodingProfile().fits(10000, 10000, 10**9, 'TIFF'))
+
+    def test_format_for(self):
+        self.assertEqual(self.profile.format_for('PNG'), 'PNG')
+        self.assertEqual(self.profile.format_for('WEBP'), 'JPEG')
+        self.assertEqual(EncodingProfile().format_for('WEBP'), 'WEBP')
+
+    def test_fitting_image_unchanged(self):
+        data = BytesIO()
+        Image.new('RGB', (50, 50)).save(data, 'PNG')
+
+        self.assertEqual(fit(data.getvalue(), self.profile), data.getvalue())
+
+
+def fake_load(source, box, format=None):
+    return Image.new('RGB', box), format
+
+
+def pixel_encode_under(image, format, max_bytes):
+    """Encode to a byte per pixel, so how much to shrink is predictable."""
+    size = image.width * image.height
+
+    return (b'x' * size if size <= max_bytes else None), size
+
+
+class TestFit(unittest.TestCase):
+    def source(self, size):
+        data = BytesIO()
+        Image.new('RGB', size).save(data, 'PNG')
+
+        return data.getvalue()
+
+    @patch('multiupload.imaging.encode_under', side_effect=pixel_encode_under)
+    @patch('multiupload.imaging.load', side_effect=fake_load)
+    def test_shrinks_until_it_fits(self, load, encode_under):
+        profile = EncodingProfile(max_bytes=10000, max_dimension=300)
+
+        data = fit(self.source((400, 400)), profile)
+
+        self.assertLessEqual(len(data), 10000)
+        self.assertEqual(
+            [call.args[1] for call in load.call_args_list], [(300, 300), (90, 90)]
+        )
+
+    @patch('multiupload.imaging.encode_under', return_value=(None, 10**6))
+    @patch('multiupload.imaging.load', side_effect=fake_load)
+    def test_too_large(self, load, encode_under):
+        with self.assertRaises(ImageTooLarge):
+            fit(self.source((400, 400)), EncodingProfile(1000, 300))
+
+        self.assertEqual(load.call_count, SHRINK_STEPS)
+
+
+class TestEncodeUnder(unittest.TestCase):
+    image = Image.effect_noise((200, 200), 64).convert('RGB')
+
+    def test_highest_quality_that_fits(self):
+        best = Image.open(BytesIO(encode_under(self.image, 'JPEG', None)[0]))
+        limit = 20000
+
+        data, _ = encode_under(self.image, 'JPEG', limit)
+
+        self.assertLessEqual(len(data), limit)
+        self.assertGreater(len(data), limit * 0.9)
+        self.assertEqual(best.size, Image.open(BytesIO(data)).size)
+
+    def test_too_large(self):
+        data, smallest = encode_under(self.image, 'JPEG', 100)
+
+        self.assertIsNone(data)
+        self.assertGreater(smallest, 100)
+
+        highest = BytesIO()
+        self.image.save(highest, 'JPEG', quality=QUALITY[1])
+        self.assertLess(smallest, len(highest.getvalue()))
+
+    def test_lossless(self):
+        data, size = encode_under(self.image, 'PNG', 10**6)
+
+        self.assertEqual(len(data), size)
+        self.assertIsNone(encode_under(self.image, 'PNG', 1000)[0])
@@ -0,0 +1,149 @@
+# type: ignore
+
+from datetime import datetime, timedelta
+
+from multiupload.constant import Sites
+from multiupload.models import Account, JobStatus, UploadJob, UploadRecord, db
+from multiupload.tests.database import DatabaseTestCase
+
+
+class TestUploadRecord(DatabaseTestCase):
+    timeout = timedelta(minutes=15)
+
+    def setUp(self):
+        super().setUp()
+
+        self.account = Account(Sites.Weasyl, self.user.id, 'test', '{}')
+        db.session.add(self.account)
+        db.session.commit()
+
+    def claim(self, key='saved-1-image.png'):
+        return UploadRecord.claim(key, self.account.id, self.timeout)
+
+    def test_claimed_once(self):
+        record = self.claim()
+
+        self.assertIsNotNone(record)
+        self.assertIsNone(record.link)
+        self.assertIsNone(self.claim())
+
+        self.assertIsNotNone(self.claim('saved-2-image.png'))
+
+    def test_existing_link(self):
+        record = self.claim()
+        record.link = 'https://example.com/1'
+        db.session.commit()
+
+        self.assertEqual(self.claim().link, 'https://example.com/1')
+
+    def test_stale_claim(self):
+        record = self.claim()
+        record.started_at = datetime.utcnow() - self.timeout * 2
+        db.session.commit()
+
+        claimed = self.claim()
+
+        self.assertEqual(claimed.id, record.id)
+        self.assertGreater(claimed.started_at, datetime.utcnow() - self.timeout)
+        self.assertIsNone(self.claim())
+
+    def test_long_key(self):
+        key = 'form-' + 'a' * 1000
+
+        record = self.claim(key)
+
+        self.assertEqual(len(record.key), 64)
+        self.assertIsNone(self.claim(key))
+        self.assertIsNotNone(self.claim(key[:-1]))
+
+
+class TestUploadJob(DatabaseTestCase):
+    def job(self, target_id=1, scheduled_at=None, status=JobStatus.pending):
+        job = UploadJob(self.user, 'art', target_id, scheduled_at)
+        job.status = status
+        db.session.add(job)
+        db.session.commit()
+
+        return job
+
+    def test_claim_next(self):
+        self.job(1, status=JobStatus.running)
+        first = self.job(2)
+        second = self.job(3)
+
+        claimed = UploadJob.claim_next('worker')
+
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual(claimed.status, JobStatus.running)
+        self.assertEqual(claimed.worker, 'worker')
+
+        self.assertEqual(UploadJob.claim_next('other').id, second.id)
+        self.assertIsNone(UploadJob.claim_next('worker'))
+
+    def test_claim_when_due(self):
+        later = self.job(1, datetime.utcnow() + timedelta(hours=1))
+        due = self.job(2, datetime.utcnow() - timedelta(minutes=1))
+
+        self.assertEqual(UploadJob.claim_next('worker').id, due.id)
+        self.assertIsNone(UploadJob.claim_next('worker'))
+
+        later.scheduled_at = datetime.utcnow()
+        db.session.commit()
+
+        self.assertEqual(UploadJob.claim_next('worker').id, later.id)
+
+    def test_stale_requeued(self):
+        timeout = timedelta(minutes=15)
+
+        stale = self.job(1, status=JobStatus.running)
+        stale.worker = 'worker'
+        stale.updated_at = datetime.utcnow() - timeout * 2
+        self.job(2, status=JobStatus.running)
+        db.session.commit()
+
+        self.assertEqual([job.id for job in UploadJob.stale(timeout)], [stale.id])
+
+        stale.requeue()
+        db.session.commit()
+
+        self.assertEqual(stale.status, JobStatus.pending)
+        self.assertIsNone(stale.worker)
+        self.assertEqual(UploadJob.stale(timeout), [])
+        self.assertEqual(UploadJob.claim_next('worker').id, stale.id)
+
+    def test_heartbeat(self):
+        timeout = timedelta(minutes=15)
+
+        job = self.job(status=JobStatus.running)
+        job.updated_at = datetime.utcnow() - timeout * 2
+        db.session.commit()
+
+        UploadJob.heartbeat(job.id)
+
+        self.assertEqual(UploadJob.stale(timeout), [])
+
+    def test_cancel_pending(self):
+        job = self.job()
+
+        job.cancel()
+        db.session.commit()
+
+        self.assertEqual(job.status, JobStatus.cancelled)
+        self.assertTrue(job.finished)
+        self.assertIsNone(job.secret)
+        self.assertEqual(
+            [event.text for event in job.events_after(0)],
+            ['event: done\ndata: completed\n\n'],
+        )
+        self.assertIsNone(UploadJob.claim_next('worker'))
+
+    def test_cancel_running(self):
+        job = self.job(status=JobStatus.running)
+        self.assertFalse(UploadJob.is_cancel_requested(job.id))
+
+        job.cancel()
+        db.session.commit()
+
+        # The worker stops it and finishes the job
+        self.assertEqual(job.status, JobStatus.running)
+        self.assertTrue(UploadJob.is_cancel_requested(job.id))
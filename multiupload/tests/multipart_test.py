@@ -0,0 +1,54 @@
+# type: ignore
+
+from io import BytesIO
+import unittest
+from unittest.mock import patch
+
+from requests.models import RequestEncodingMixin
+
+from multiupload.multipart import MultipartBody
+
+
+class TestMultipartBody(unittest.TestCase):
+    def encode(self, data, files):
+        body = MultipartBody(data=data, files=files)
+
+        with patch('urllib3.filepost.choose_boundary', return_value=body.boundary):
+            expected, content_type = RequestEncodingMixin._encode_files(files, data)
+
+        return body, expected, content_type
+
+    def test_same_as_requests(self):
+        image = BytesIO(b'\x89PNG' + bytes(range(256)) * 100)
+
+        body, expected, content_type = self.encode(
+            {'title': 'Café "art"', 'tags': ['a', 'b'], 'folder': None, 'id': 3},
+            [
+                ('uploadedfile[]', ('first.png', image, 'image/png')),
+                ('uploadedfile[]', ('second.png', BytesIO(b'second'))),
+            ],
+        )
+
+        self.assertEqual(body.content_type, content_type)
+        self.assertEqual(len(body), len(expected))
+        self.assertEqual(body.read(), expected)
+
+    def test_read_in_chunks(self):
+        body, expected, _ = self.encode(
+            {'sid': 'abc'}, {'file': ('image.png', BytesIO(b'x' * 10000))}
+        )
+
+        chunks = iter(lambda: body.read(512), b'')
+        self.assertEqual(b''.join(chunks), expected)
+        self.assertEqual(body.tell(), len(expected))
+
+        body.seek(0)
+        self.assertEqual(body.read(), expected)
+
+    def test_starts_at_stream_position(self):
+        image = BytesIO(b'skipped-image')
+        image.seek(len('skipped-'))
+
+        body = MultipartBody(files={'file': ('image.png', image)})
+
+        self.assertIn(b'\r\n\r\nimage\r\n', body.read())
@@ -0,0 +1,366 @@
+# type: ignore
+
+from datetime import datetime, timedelta
+import json
+from os.path import join
+from types import SimpleNamespace
+import unittest
+from unittest.mock import Mock, patch
+
+from multiupload.constant import Sites
+from multiupload.models import (
+    Account,
+    SavedSubmission,
+    SubmissionGroup,
+    UploadRecord,
+    db,
+)
+from multiupload.pipeline import (
+    SSESink,
+    UploadEvent,
+    UploadPipeline,
+    UploadSink,
+    link_dependencies,
+    parse_twitter_accounts,
+)
+from multiupload.sites import Site, SiteError
+from multiupload.submission import Rating, Submission
+from multiupload.tests.database import DatabaseTestCase
+
+
+class TestSSESink(unittest.TestCase):
+    def event(self, kind, data=None):
+        return UploadEvent(kind, data, 1, Sites.Weasyl, 'test')
+
+    def test_upload(self):
+        text = SSESink().handle(self.event('upload', 'https://example.com'))
+
+        kind, data = text.strip().split('\n')
+
+        self.assertEqual(kind, 'event: upload')
+        self.assertEqual(
+            json.loads(data[len('data: ') :]),
+            {'link': 'https://example.com', 'name': 'Weasyl - test'},
+        )
+
+    def test_errors(self):
+        text = SSESink().handle(self.event('httperror', 503))
+
+        self.assertEqual(
+            json.loads(text.split('data: ')[1]),
+            {'site': 'Weasyl', 'account': 'test', 'code': 503},
+        )
+
+        self.assertTrue(self.event('siteerror', 'Oops').failed)
+        self.assertFalse(self.event('delay', 20).failed)
+
+    def test_done(self):
+        sink = SSESink()
+
+        self.assertEqual(
+            sink.handle(UploadEvent('count', 3)), 'event: count\ndata: 3\n\n'
+        )
+        self.assertEqual(
+            sink.handle(UploadEvent('done')), 'event: done\ndata: completed\n\n'
+        )
+
+
+class TestLinkDependencies(unittest.TestCase):
+    def test_twitter_accounts(self):
+        self.assertEqual(parse_twitter_accounts('1 2'), [1, 2])
+        self.assertEqual(parse_twitter_accounts(None), [])
+
+    def test_links_to_earlier_sites(self):
+        fa = SimpleNamespace(id=1, site=Sites.FurAffinity, site_id=1)
+        twitter = SimpleNamespace(id=2, site=Sites.Twitter, site_id=100)
+        mastodon = SimpleNamespace(id=3, site=Sites.Mastodon, site_id=101)
+
+        accounts = [fa, twitter, mastodon]
+
+        self.assertEqual(link_dependencies(fa, accounts, [1, 2, 3]), [])
+        self.assertEqual(link_dependencies(twitter, accounts, [1, 2, 3]), [1])
+        self.assertEqual(link_dependencies(mastodon, accounts, [1, 2]), [1, 2])
+
+
+class TestPublish(DatabaseTestCase):
+    key = 'saved-1-image.png'
+
+    def setUp(self):
+        super().setUp()
+
+        self.account = Account(Sites.Weasyl, self.user.id, 'test', '{}')
+        db.session.add(self.account)
+        db.session.commit()
+
+        self.pipeline = UploadPipeline([self.account], {})
+        self.site = StubSite(account=self.account)
+
+    def publish(self, post):
+        return self.pipeline.publish(self.key, self.account, self.site, post)
+
+    def test_posted_once(self):
+        post = Mock(return_value='https://example.com/1')
+
+        self.assertEqual(self.publish(post), 'https://example.com/1')
+        self.assertEqual(self.publish(post), 'https://example.com/1')
+        post.assert_called_once()
+
+    def test_without_key(self):
+        post = Mock(return_value='https://example.com/1')
+
+        self.pipeline.publish(None, self.account, self.site, post)
+        self.pipeline.publish(None, self.account, self.site, post)
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(UploadRecord.query.count(), 0)
+
+    def test_in_flight(self):
+        UploadRecord.claim(self.key, self.account.id, timedelta(minutes=15))
+
+        post = Mock(return_value='https://example.com/1')
+
+        with self.assertRaises(SiteError):
+            self.publish(post)
+        post.assert_not_called()
+
+    def test_stale_claim(self):
+        record = UploadRecord.claim(self.key, self.account.id, timedelta(minutes=15))
+        record.started_at = datetime(2020, 1, 1)
+        db.session.commit()
+
+        self.assertEqual(
+            self.publish(Mock(return_value='https://example.com/1')),
+            'https://example.com/1',
+        )
+
+    def test_failed_post(self):
+        with self.assertRaises(SiteError):
+            self.publish(Mock(side_effect=SiteError('Oops')))
+
+        self.assertEqual(UploadRecord.query.count(), 0)
+
+        self.assertEqual(
+            self.publish(Mock(return_value='https://example.com/1')),
+            'https://example.com/1',
+        )
+
+    def test_failed_after_posting(self):
+        def post():
+            self.site.posting = True
+            raise SiteError('Unable to find the submission')
+
+        with self.assertRaises(SiteError):
+            self.publish(post)
+
+        # It may have been posted, so it isn't tried again until the claim
+        # goes stale
+        record = UploadRecord.query.one()
+        self.assertIsNone(record.link)
+
+        with self.assertRaises(SiteError):
+            self.publish(Mock(return_value='https://example.com/1'))
+
+        record.started_at = datetime(2020, 1, 1)
+        db.session.commit()
+
+        self.assertEqual(
+            self.publish(Mock(return_value='https://example.com/1')),
+            'https://example.com/1',
+        )
+
+
+class StubSite(Site):
+    """Posts anything, except to accounts named failing."""
+
+    SITE = Sites.Weasyl
+
+    def post(self, title):
+        if self.account.username == 'failing':
+            raise SiteError('Oops')
+
+        return 'https://example.com/{0}/{1}'.format(self.account.id, title)
+
+    def submit_artwork(self, submission, extra=None):
+        return self.post(submission.title)
+
+
+class StubGroupSite(StubSite):
+    @staticmethod
+    def supports_group():
+        return True
+
+    def upload_group(self, group, extra=None):
+        return self.post(group.name)
+
+
+class EventSink(UploadSink):
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event)
+
+        return None
+
+    def kinds(self, kind):
+        return [event for event in self.events if event.kind == kind]
+
+
+class TestUploadPipeline(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.app.config['GROUP_DELAYS'] = {'Weasyl': 0}
+        self.app.config['JOB_POLL_INTERVAL'] = 0.01
+
+        self.accounts = [self.account('first'), self.account('second')]
+
+    def account(self, username):
+        account = Account(Sites.Weasyl, self.user.id, username, '{}')
+        db.session.add(account)
+        db.session.commit()
+
+        return account
+
+    def saved(self, title, accounts=(), group=None, master=False):
+        saved = SavedSubmission(self.user, title, 'description', 'a b', Rating.general)
+        saved.set_accounts([account.id for account in accounts])
+
+        if group:
+            saved.group_id = group.id
+            saved.master = master
+
+        if not master:
+            saved.original_filename = saved.image_filename = title + '.png'
+            with open(join(self.folder.name, saved.image_filename), 'wb') as f:
+                f.write(b'image')
+
+        db.session.add(saved)
+        db.session.commit()
+
+        return saved
+
+    def group(self, accounts):
+        group = SubmissionGroup(self.user, 'group', grouped=True)
+        db.session.add(group)
+        db.session.commit()
+
+        self.saved('master', accounts, group, master=True)
+        self.saved('one', group=group)
+        self.saved('two', group=group)
+
+        return group
+
+    def upload(self, pipeline, site=StubSite):
+        sink = EventSink()
+
+        with patch('multiupload.pipeline.site_for', return_value=site):
+            for _ in pipeline.run([sink]):
+                pass
+
+        return sink
+
+    def saved_pipeline(self, saved):
+        submission = Submission(
+            saved.title, saved.description, saved.tags, saved.rating.value, saved
+        )
+
+        return UploadPipeline(saved.accounts, {}, submission=submission, saved=saved)
+
+    def test_saved_deleted(self):
+        saved = self.saved('art', self.accounts)
+        saved_id = saved.id
+
+        sink = self.upload(self.saved_pipeline(saved))
+
+        self.assertEqual(
+            sorted(event.data for event in sink.kinds('upload')),
+            sorted(
+                'https://example.com/{0}/art'.format(account.id)
+                for account in self.accounts
+            ),
+        )
+        self.assertEqual(sink.events[-1], UploadEvent('done', False))
+        self.assertIsNone(SavedSubmission.query.get(saved_id))
+
+    def test_saved_trimmed(self):
+        failing = self.account('failing')
+        saved = self.saved('art', self.accounts + [failing])
+
+        pipeline = self.saved_pipeline(saved)
+        sink = self.upload(pipeline)
+
+        self.assertEqual(len(sink.kinds('upload')), 2)
+        self.assertEqual(len(sink.kinds('siteerror')), 1)
+        self.assertEqual(pipeline.failed, [failing.id])
+        self.assertEqual(sink.events[-1], UploadEvent('done', True))
+
+        saved = SavedSubmission.query.get(saved.id)
+        self.assertEqual(saved.account_ids, str(failing.id))
+
+    def test_record(self):
+        saved = self.saved('art', self.accounts)
+        pipeline = self.saved_pipeline(saved)
+
+        first, second = self.accounts
+
+        pipeline.record(UploadEvent.for_account('upload', first, 'link'))
+        self.assertEqual(saved.account_ids, str(second.id))
+
+        pipeline.record(UploadEvent.for_account('siteerror', second, 'Oops'))
+        pipeline.record(UploadEvent.for_account('siteerror', second, 'Oops'))
+        self.assertEqual(pipeline.failed, [second.id])
+        self.assertEqual(saved.account_ids, str(second.id))
+
+        pipeline.finish()
+        self.assertIsNotNone(SavedSubmission.query.get(saved.id))
+
+    def test_cancelled_not_finished(self):
+        saved = self.saved('art', self.accounts)
+        pipeline = self.saved_pipeline(saved)
+
+        pipeline.cancelled.set()
+        pipeline.finish()
+
+        self.assertIsNotNone(SavedSubmission.query.get(saved.id))
+
+    def group_pipeline(self, group):
+        return UploadPipeline(group.master.accounts, {}, group=group)
+
+    def test_group(self):
+        group = self.group(self.accounts)
+        group_id = group.id
+
+        sink = self.upload(self.group_pipeline(group), StubGroupSite)
+
+        self.assertEqual(len(sink.kinds('upload')), 2)
+        self.assertEqual(len(sink.kinds('groupdone')), 2)
+        self.assertIsNone(SubmissionGroup.query.get(group_id))
+        self.assertEqual(SavedSubmission.query.count(), 0)
+
+    def test_group_items(self):
+        group = self.group(self.accounts)
+        group_id = group.id
+
+        sink = self.upload(self.group_pipeline(group))
+
+        # Every item is posted to each account on sites without groups
+        self.assertEqual(
+            sorted(event.data for event in sink.kinds('upload')),
+            sorted(
+                'https://example.com/{0}/{1}'.format(account.id, title)
+                for account in self.accounts
+                for title in ('one', 'two')
+            ),
+        )
+        self.assertEqual(len(sink.kinds('groupdone')), 2)
+        self.assertIsNone(SubmissionGroup.query.get(group_id))
+
+    def test_group_kept_after_error(self):
+        group = self.group(self.accounts + [self.account('failing')])
+
+        sink = self.upload(self.group_pipeline(group), StubGroupSite)
+
+        self.assertEqual(len(sink.kinds('siteerror')), 1)
+        self.assertIsNotNone(SubmissionGroup.query.get(group.id))
+        self.assertEqual(SavedSubmission.query.count(), 3)
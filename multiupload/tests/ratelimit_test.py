@@ -0,0 +1,44 @@
+# type: ignore
+
+import os
+import tempfile
+import unittest
+
+from multiupload.ratelimit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+        self.limiter = RateLimiter(self.path)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_burst(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.reserve('site', 1, 3), 0)
+
+        self.assertGreater(self.limiter.reserve('site', 1, 3), 0)
+
+    def test_callers_queue(self):
+        self.limiter.reserve('site', 10, 1)
+
+        first = self.limiter.reserve('site', 10, 1)
+        second = self.limiter.reserve('site', 10, 1)
+
+        # Each waiting caller reserves the token after the previous one
+        self.assertAlmostEqual(first, 0.1, delta=0.02)
+        self.assertAlmostEqual(second, 0.2, delta=0.02)
+
+    def test_shared_between_instances(self):
+        other = RateLimiter(self.path)
+
+        self.assertEqual(self.limiter.reserve('site', 1, 1), 0)
+        self.assertGreater(other.reserve('site', 1, 1), 0)
+
+    def test_sites_separate(self):
+        self.assertEqual(self.limiter.reserve('a', 1, 1), 0)
+        self.assertEqual(self.limiter.reserve('b', 1, 1), 0)
@@ -0,0 +1,45 @@
+# type: ignore
+
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+import time
+import unittest
+from unittest.mock import patch
+
+from multiupload.derivatives import DerivativeStore
+from multiupload.rendition import RenditionCache
+
+
+def slow_resize(source, height, width, format=None, quality=None):
+    time.sleep(0.05)
+    return source[:height]
+
+
+class TestRenditionCache(unittest.TestCase):
+    @patch('multiupload.rendition.resize', side_effect=slow_resize)
+    def test_made_once(self, resize):
+        cache = RenditionCache()
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(
+                pool.map(lambda _: cache.resize(b'image', 2, 2, 'PNG'), range(4))
+            )
+
+        self.assertEqual(results, [b'im'] * 4)
+        self.assertEqual(resize.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        cache.resize(b'image', 3, 3, 'PNG')
+        cache.resize(b'other', 2, 2, 'PNG')
+        self.assertEqual(resize.call_count, 3)
+
+    @patch('multiupload.rendition.resize', side_effect=slow_resize)
+    def test_kept_on_disk(self, resize):
+        with TemporaryDirectory() as folder:
+            store = DerivativeStore(folder, 1024)
+
+            RenditionCache(store).resize(b'image', 2, 2)
+            data = RenditionCache(store).resize(b'image', 2, 2)
+
+        self.assertEqual(data, b'im')
+        self.assertEqual(resize.call_count, 1)
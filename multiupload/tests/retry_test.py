@@ -0,0 +1,105 @@
+# type: ignore
+
+from email.utils import formatdate
+from io import BytesIO
+import time
+import unittest
+from unittest import mock
+
+from requests import Request, Response, Session
+from requests.adapters import HTTPAdapter
+
+from multiupload.constant import Sites
+from multiupload.multipart import MultipartBody
+from multiupload.retry import RetryAdapter, idempotent, retry_after
+
+
+def response(status_code, headers=None):
+    resp = Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    resp.raw = BytesIO()
+    return resp
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.adapter = RetryAdapter(None, Sites.Weasyl, 0, 0, retries=2, backoff=0)
+
+        self.sess = Session()
+        self.sess.mount('https://', self.adapter)
+
+        patches = [
+            mock.patch('multiupload.retry.time.sleep'),
+            mock.patch('multiupload.retry.write_site_response'),
+        ]
+        _, self.write_site_response = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def send(self, method, *responses):
+        request = Request(method, 'https://www.weasyl.com/').prepare()
+
+        with mock.patch.object(HTTPAdapter, 'send', side_effect=responses) as send:
+            resp = self.adapter.send(request)
+
+        return resp, send.call_count
+
+    def test_get_retried(self):
+        resp, calls = self.send('GET', response(503), response(200))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(calls, 2)
+        self.write_site_response.assert_called_once()
+
+    def test_gives_up(self):
+        resp, calls = self.send('GET', response(502), response(502), response(502))
+
+        self.assertEqual(resp.status_code, 502)
+        self.assertEqual(calls, 3)
+
+    def test_post_not_retried(self):
+        resp, calls = self.send('POST', response(503), response(200))
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(calls, 1)
+
+    def test_idempotent_post_retried(self):
+        with idempotent(self.sess):
+            resp, calls = self.send('POST', response(429), response(200))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(self.adapter.idempotent)
+
+    def test_streamed_body_rewound(self):
+        body = MultipartBody(files={'file': ('image.png', BytesIO(b'image'))})
+        request = Request('POST', 'https://www.weasyl.com/', data=body).prepare()
+
+        sent = []
+
+        def send(request, **kwargs):
+            sent.append(request.body.read())
+            return response(503 if len(sent) == 1 else 200)
+
+        with idempotent(self.sess), mock.patch.object(
+            HTTPAdapter, 'send', side_effect=send
+        ):
+            self.adapter.send(request)
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[0], sent[1])
+
+    def test_long_retry_after(self):
+        resp, calls = self.send('GET', response(429, {'Retry-After': '3600'}))
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(calls, 1)
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after(response(503, {'Retry-After': '5'})), 5)
+        self.assertIsNone(retry_after(response(503)))
+        self.assertIsNone(retry_after(response(503, {'Retry-After': 'soon'})))
+
+        date = formatdate(time.time() + 60, usegmt=True)
+        delay = retry_after(response(503, {'Retry-After': date}))
+        self.assertAlmostEqual(delay, 60, delta=2)
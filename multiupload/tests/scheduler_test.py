@@ -0,0 +1,160 @@
+# type: ignore
+
+from threading import Event
+import time
+import unittest
+
+from multiupload.scheduler import UploadScheduler
+
+
+class TestUploadScheduler(unittest.TestCase):
+    def test_links_in_dependency_order(self):
+        scheduler = UploadScheduler(max_workers=4)
+
+        def link(name):
+            def fn(task):
+                task.publish(name)
+
+            return fn
+
+        scheduler.add(1, link('a'))
+        scheduler.add(2, link('b'))
+        scheduler.add(3, lambda task: task.emit(task.links), depends_on=[2, 1])
+
+        emitted = list(scheduler.run())
+
+        self.assertEqual(emitted, [(3, ['b', 'a'])])
+
+    def test_independent_not_blocked(self):
+        scheduler = UploadScheduler(max_workers=4)
+        slow = Event()
+
+        scheduler.add(1, lambda task: slow.wait(5))
+        scheduler.add(2, lambda task: task.emit('fast'))
+        scheduler.add(3, lambda task: task.emit('dependent'), depends_on=[1])
+
+        # The fast task finishes while the slow one is still running
+        for key, value in scheduler.run():
+            if key == 2:
+                self.assertFalse(slow.is_set())
+                slow.set()
+
+        self.assertTrue(slow.is_set())
+
+    def test_failed_dependency_releases(self):
+        scheduler = UploadScheduler(max_workers=4)
+
+        def failed(task):
+            return False
+
+        def published(task):
+            task.publish('b')
+
+        scheduler.add(1, failed)
+        scheduler.add(2, published)
+        scheduler.add(3, lambda task: task.emit(task.links), depends_on=[1, 2])
+
+        emitted = list(scheduler.run())
+
+        self.assertEqual(emitted, [(3, ['b'])])
+        self.assertEqual(scheduler.results[1], False)
+
+    def test_deferred_dependency_waited_for(self):
+        scheduler = UploadScheduler(max_workers=4)
+
+        def next_item(task):
+            task.publish('fa-link')
+
+        def weasyl(task):
+            time.sleep(0.05)  # Finishes while the other task is deferred
+            task.publish('w-link')
+
+        scheduler.add('fa', lambda task: task.defer(next_item, 0.2))
+        scheduler.add('w', weasyl)
+        scheduler.add('tw', lambda task: task.emit(task.links), depends_on=['fa', 'w'])
+
+        emitted = list(scheduler.run())
+
+        self.assertEqual(emitted, [('tw', ['fa-link', 'w-link'])])
+
+    def test_publish_before_finish(self):
+        scheduler = UploadScheduler(max_workers=4)
+        dependent_ran = Event()
+
+        def upstream(task):
+            task.publish('a')
+            self.assertTrue(dependent_ran.wait(5))
+
+        scheduler.add(1, upstream)
+        scheduler.add(2, lambda task: dependent_ran.set(), depends_on=[1])
+
+        list(scheduler.run())
+
+    def test_exception_raised(self):
+        scheduler = UploadScheduler()
+
+        def broken(task):
+            raise ValueError()
+
+        scheduler.add(1, broken)
+
+        with self.assertRaises(ValueError):
+            list(scheduler.run())
+
+    def test_circular(self):
+        scheduler = UploadScheduler()
+
+        scheduler.add(1, lambda task: task.emit(1), depends_on=[2])
+        scheduler.add(2, lambda task: task.emit(2), depends_on=[1])
+
+        self.assertEqual(sorted(value for _, value in scheduler.run()), [1, 2])
+
+    def test_defer_frees_worker(self):
+        scheduler = UploadScheduler(max_workers=1)
+
+        def first(task):
+            task.emit('first')
+            task.defer(lambda task: 'continued', 0.2)
+
+        scheduler.add(1, first)
+        scheduler.add(2, lambda task: task.emit('other'))
+        scheduler.add(3, lambda task: task.emit(task.links), depends_on=[1])
+
+        emitted = list(scheduler.run())
+
+        # Only one worker, so the other task ran while the first was deferred
+        self.assertEqual(emitted[:2], [(1, 'first'), (2, 'other')])
+        self.assertEqual(emitted[2], (3, []))
+        self.assertEqual(scheduler.results[1], 'continued')
+
+    def test_defer_shared_cooldown(self):
+        scheduler = UploadScheduler(max_workers=1)
+
+        scheduler.add(1, lambda task: task.emit(task.defer(lambda t: None, 0.2, 'a')))
+        scheduler.add(2, lambda task: task.emit(task.defer(lambda t: None, 0.1, 'a')))
+        scheduler.add(3, lambda task: task.emit(task.defer(lambda t: None, 0.1, 'b')))
+
+        delays = dict(scheduler.run())
+
+        # The second task on the same cooldown waits for the first one
+        self.assertGreater(delays[2], 0.15)
+        self.assertLess(delays[3], 0.15)
+
+    def test_stop_skips_waiting_and_deferred(self):
+        scheduler = UploadScheduler(max_workers=1)
+        stop = Event()
+
+        def first(task):
+            task.emit('first')
+            stop.set()
+            task.defer(lambda task: task.emit('continued'), 10)
+
+        scheduler.add(1, first)
+        scheduler.add(2, lambda task: task.emit('second'), depends_on=[1])
+
+        start = time.monotonic()
+        emitted = list(scheduler.run(stop.is_set, poll_interval=0.05))
+
+        self.assertEqual(emitted, [(1, 'first')])
+        self.assertEqual(scheduler.skipped, {1, 2})
+        self.assertLess(time.monotonic() - start, 1)
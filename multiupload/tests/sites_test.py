@@ -31,3 +31,6 @@ class TestSiteValidations(unittest.TestCase):
                 errors = site.validate_submission(sub)
                 self.assertTrue(errors)
                 self.assertIn('%s requires at least 2 tags' % site.SITE.name, errors)
+
+    def test_image_too_large(self):
+        self.assertIn('to Weasyl,', str(Weasyl().image_too_large()))
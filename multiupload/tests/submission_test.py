@@ -1,8 +1,14 @@
 # type: ignore
 
+from io import BytesIO
 import unittest
+from unittest.mock import patch
 
-from multiupload.submission import Submission
+from PIL import Image
+
+from multiupload.constant import Sites
+from multiupload.description import render_all
+from multiupload.submission import ImageInfo, Submission
 
 
 class TestTagParsing(unittest.TestCase):
@@ -20,3 +26,93 @@ class TestTagParsing(unittest.TestCase):
 
         self.assertListEqual(keywords, ['hello', 'world', 'extra tag'])
         self.assertListEqual(hashtags, ['#test'])
+
+
+class TestImageInfo(unittest.TestCase):
+    def image(self, size, format='PNG', mode='RGB'):
+        data = BytesIO()
+        Image.new(mode, size).save(data, format)
+        data.seek(0)
+
+        return data
+
+    def submission(self, data):
+        sub = Submission.__new__(Submission)
+        sub.image_filename = 'test.png'
+        sub.image_bytes = data
+
+        return sub
+
+    def test_read(self):
+        data = self.image((30, 20))
+
+        info = ImageInfo.read(data)
+
+        self.assertEqual((info.width, info.height), (30, 20))
+        self.assertEqual(info.format, 'PNG')
+        self.assertEqual(info.mode, 'RGB')
+        self.assertFalse(info.animated)
+        self.assertEqual(info.size, len(data.getvalue()))
+        self.assertEqual(data.tell(), 0)
+
+        self.assertEqual(ImageInfo.from_dict(info.to_dict()), info)
+
+    def test_shared_by_copies(self):
+        sub = self.submission(self.image((30, 20)))
+
+        self.assertEqual(sub.image_res(), (20, 30))
+        self.assertIs(sub.copy().image_info, sub.image_info)
+
+    def test_copy_shares_image(self):
+        data = self.image((30, 20))
+        sub = self.submission(data)
+
+        copy = sub.copy()
+        self.assertEqual(copy.image_bytes.read(4), b'\x89PNG')
+        self.assertEqual(sub.image_bytes.tell(), 0)
+
+        # Not a copy of the image, changes to it are seen by the copy
+        data.getbuffer()[1:4] = b'GIF'
+        self.assertEqual(copy.image_bytes.getvalue(), data.getvalue())
+
+    def test_size_of_anything(self):
+        sub = self.submission(BytesIO(b'not an image'))
+
+        self.assertEqual(sub.image_size, 12)
+        with self.assertRaises(OSError):
+            sub.image_info
+
+
+class TestDescriptions(unittest.TestCase):
+    def submission(self, description):
+        sub = Submission.__new__(Submission)
+        sub.description = description
+
+        return sub
+
+    @patch('multiupload.submission.render_all', side_effect=render_all)
+    def test_rendered_once(self, render):
+        sub = self.submission('**hi** <|Syfaro,2,0|>')
+        sites = [Sites.FurAffinity, Sites.Weasyl, Sites.Inkbunny]
+
+        descriptions = sub.descriptions_for_sites(sites)
+        self.assertEqual(descriptions[Sites.Weasyl], '**hi** <~Syfaro>')
+
+        copies = [sub.copy() for _ in range(4)]
+        for site in sites:
+            for copy in copies:
+                self.assertEqual(copy.description_for_site(site), descriptions[site])
+
+        self.assertEqual(render.call_count, 1)
+
+    def test_changed(self):
+        sub = self.submission('*hi*')
+        self.assertEqual(sub.description_for_site(Sites.FurAffinity), '[i]hi[/i]')
+
+        sub.description = '## Title\n\n*hi*'
+        self.assertEqual(
+            sub.description_for_site(Sites.FurAffinity), '## Title\n\n[i]hi[/i]'
+        )
+
+        sub.description = None
+        self.assertEqual(sub.description_for_site(Sites.FurAffinity), '')
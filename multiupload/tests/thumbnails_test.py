@@ -0,0 +1,51 @@
+# type: ignore
+
+import os
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from multiupload.derivatives import DerivativeStore
+from multiupload.thumbnails import etag, thumbnail
+
+
+def fake_resize(source, height, width, format=None, quality=None):
+    return bytes(source.buffer[:height])
+
+
+class TestThumbnails(unittest.TestCase):
+    @patch('multiupload.thumbnails.resize', side_effect=fake_resize)
+    def test_kept_in_store(self, resize):
+        with TemporaryDirectory() as folder:
+            path = join(folder, 'image.png')
+            with open(path, 'wb') as f:
+                f.write(b'image' * 100)
+
+            store = DerivativeStore(join(folder, 'derivatives'), 1024 ** 2)
+
+            first = thumbnail(path, 200, 'WEBP', store)
+            second = thumbnail(path, 200, 'WEBP', store)
+
+            self.assertEqual(first, second)
+            self.assertEqual(resize.call_count, 1)
+
+            thumbnail(path, 200, 'JPEG', store)
+            self.assertEqual(resize.call_count, 2)
+
+    def test_etag_changes(self):
+        with TemporaryDirectory() as folder:
+            path = join(folder, 'image.png')
+            with open(path, 'wb') as f:
+                f.write(b'image')
+
+            tag = etag(path, 200, 'WEBP')
+            self.assertEqual(tag, etag(path, 200, 'WEBP'))
+            self.assertNotEqual(tag, etag(path, 1200, 'WEBP'))
+            self.assertNotEqual(tag, etag(path, 200, 'JPEG'))
+
+            with open(path, 'wb') as f:
+                f.write(b'other image')
+            os.utime(path, ns=(0, 0))
+
+            self.assertNotEqual(tag, etag(path, 200, 'WEBP'))
@@ -0,0 +1,169 @@
+# type: ignore
+
+from datetime import datetime, timedelta
+
+from flask import g, get_flashed_messages, session
+from werkzeug.exceptions import BadRequest
+
+from multiupload.models import JobStatus, SavedSubmission, UploadJob, db
+from multiupload.routes.list import app as list_app
+from multiupload.routes.upload import app as upload_app
+from multiupload.routes.upload import schedule, stream_job, tail_job
+from multiupload.submission import Rating
+from multiupload.tests.database import DatabaseTestCase
+
+
+class UploadRouteTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.app.register_blueprint(upload_app, url_prefix='/upload')
+        self.app.register_blueprint(list_app, url_prefix='/list')
+        self.app.config['UPLOAD_QUEUE'] = True
+
+    def request(self, view, path, **kwargs):
+        """Call a view in a request for the signed in user."""
+        with self.app.test_request_context(path, **kwargs):
+            session['id'] = self.user.id
+            session['password'] = 'password'
+            g.user = self.user
+
+            return view(), get_flashed_messages()
+
+    def stream(self, target_id, last_event_id=None):
+        """Get the first event streamed for an upload."""
+        headers = {'Last-Event-ID': str(last_event_id)} if last_event_id else {}
+
+        with self.app.test_request_context(headers=headers):
+            g.user = self.user
+
+            return next(iter(stream_job('art', target_id).response))
+
+    def job(self, target_id=1, status=JobStatus.pending, scheduled_at=None):
+        job = UploadJob(self.user, 'art', target_id, scheduled_at)
+        job.status = status
+        db.session.add(job)
+        db.session.commit()
+
+        return job
+
+
+class TestTailJob(UploadRouteTestCase):
+    def test_reattach(self):
+        job = self.job(status=JobStatus.running)
+        events = [
+            job.add_event('event: upload\ndata: {0}\n\n'.format(i)) for i in range(3)
+        ]
+        job.finish(JobStatus.done)
+        db.session.commit()
+
+        self.assertEqual(
+            list(tail_job(job.id, events[0].id)),
+            ['event: job\ndata: {0}\n\n'.format(job.id)]
+            + [
+                'id: {0}\nevent: upload\ndata: {1}\n\n'.format(event.id, i)
+                for i, event in enumerate(events)
+                if i > 0
+            ],
+        )
+
+    def test_reattach_by_last_event(self):
+        job = self.job(1, status=JobStatus.running)
+        event = job.add_event('event: count\ndata: 1\n\n')
+        db.session.commit()
+
+        # The job is found from its event, even if the target was removed
+        self.assertEqual(
+            self.stream(0, event.id), 'event: job\ndata: {0}\n\n'.format(job.id)
+        )
+        self.assertEqual(UploadJob.query.count(), 1)
+
+    def test_scheduled_starts_now(self):
+        job = self.job(1, scheduled_at=datetime.utcnow() + timedelta(hours=1))
+
+        self.assertEqual(self.stream(1), 'event: job\ndata: {0}\n\n'.format(job.id))
+
+        self.assertIsNone(UploadJob.query.get(job.id).scheduled_at)
+        self.assertEqual(UploadJob.query.count(), 1)
+
+
+class TestSchedule(UploadRouteTestCase):
+    def setUp(self):
+        super().setUp()
+
+        saved = SavedSubmission(
+            self.user, 'title', 'description', 'a b', Rating.general
+        )
+        saved.account_ids = '1'
+        saved.image_filename = 'image.png'
+        db.session.add(saved)
+        db.session.commit()
+
+        self.saved_id = saved.id
+
+    def schedule(self, **form):
+        form.setdefault('kind', 'art')
+        form.setdefault('id', self.saved_id)
+
+        _, messages = self.request(
+            schedule, '/upload/schedule', method='POST', data=form
+        )
+
+        return messages
+
+    def at(self, delta):
+        return (datetime.utcnow() + delta).strftime('%Y-%m-%dT%H:%M')
+
+    def test_scheduled(self):
+        self.schedule(scheduled_at=self.at(timedelta(days=1)))
+
+        job = UploadJob.query.one()
+        self.assertEqual(job.status, JobStatus.pending)
+        self.assertGreater(job.scheduled_at, datetime.utcnow())
+
+        # Scheduling again moves the same job
+        self.schedule(scheduled_at=self.at(timedelta(days=2)))
+
+        self.assertEqual(UploadJob.query.count(), 1)
+        self.assertGreater(
+            UploadJob.query.one().scheduled_at, datetime.utcnow() + timedelta(days=1)
+        )
+
+    def test_invalid(self):
+        self.assertEqual(
+            self.schedule(scheduled_at='tomorrow'), ['Invalid time to schedule at.']
+        )
+        self.assertEqual(
+            self.schedule(scheduled_at=self.at(timedelta(days=1)), id='one'),
+            ['Invalid time to schedule at.'],
+        )
+        self.assertEqual(
+            self.schedule(scheduled_at=self.at(-timedelta(hours=1))),
+            ['Scheduled time must be in the future.'],
+        )
+        self.assertEqual(
+            self.schedule(scheduled_at=self.at(timedelta(days=1)), id=0),
+            ['Submission is not ready to be uploaded.'],
+        )
+
+        with self.assertRaises(BadRequest):
+            self.schedule(scheduled_at=self.at(timedelta(days=1)), kind='other')
+
+        self.assertEqual(UploadJob.query.count(), 0)
+
+    def test_already_started(self):
+        self.job(self.saved_id, status=JobStatus.running)
+
+        self.assertEqual(
+            self.schedule(scheduled_at=self.at(timedelta(days=1))),
+            ['Upload has already started.'],
+        )
+
+    def test_queue_disabled(self):
+        self.app.config['UPLOAD_QUEUE'] = False
+
+        self.assertEqual(
+            self.schedule(scheduled_at=self.at(timedelta(days=1))),
+            ['Scheduling uploads is not enabled.'],
+        )
+        self.assertEqual(UploadJob.query.count(), 0)
@@ -0,0 +1,75 @@
+# type: ignore
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from multiupload.models import JobStatus, UploadBatch, UploadJob, db
+from multiupload.tests.database import DatabaseTestCase
+from multiupload.worker import job_poller, run_job
+
+
+class WorkerTestCase(DatabaseTestCase):
+    """Runs the worker with the test app."""
+
+    def setUp(self):
+        super().setUp()
+
+        patcher = patch('multiupload.worker.app', self.app)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestRunJob(WorkerTestCase):
+    def test_released_secret(self):
+        batch = UploadBatch(self.user)
+        db.session.add(batch)
+        db.session.commit()
+
+        job = UploadJob(self.user, 'art', 1, batch=batch)
+        job.status = JobStatus.running
+        db.session.add(job)
+
+        batch.secret = None
+        db.session.commit()
+        job_id = job.id
+
+        run_job(job)
+
+        job = UploadJob.query.get(job_id)
+        self.assertEqual(job.status, JobStatus.failed)
+        self.assertEqual(
+            [event.text for event in job.events_after(0)],
+            [
+                'event: failed\ndata: {"msg": "Unable to finish uploading."}\n\n',
+                'event: done\ndata: completed\n\n',
+            ],
+        )
+
+
+class TestJobPoller(WorkerTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.job = UploadJob(self.user, 'art', 1)
+        self.job.status = JobStatus.running
+        self.job.updated_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.add(self.job)
+        db.session.commit()
+
+    def test_heartbeat(self):
+        self.app.config['JOB_TIMEOUT'] = 0
+
+        self.assertFalse(job_poller(self.job.id)())
+        self.assertEqual(UploadJob.stale(timedelta(minutes=15)), [])
+
+    def test_not_every_poll(self):
+        self.assertFalse(job_poller(self.job.id)())
+        self.assertEqual(
+            [job.id for job in UploadJob.stale(timedelta(minutes=15))], [self.job.id]
+        )
+
+    def test_cancelled(self):
+        self.job.cancel()
+        db.session.commit()
+
+        self.assertTrue(job_poller(self.job.id)())
@@ -0,0 +1,54 @@
+"""Small previews of stored images, for pages listing and reviewing them.
+
+Thumbnails are made the first time they are requested and kept in the
+DerivativeStore. Stored images are never changed once written, but they are
+still named by their path, size and modification time instead of a hash of
+their contents, so serving a thumbnail never reads the whole image.
+"""
+
+from hashlib import sha256
+import os
+from typing import Optional
+
+from multiupload.derivatives import DerivativeStore
+from multiupload.imaging import ImageSource, resize
+
+# The largest side of a thumbnail in pixels, for lists and the review page
+SIZES = (200, 1200)
+
+QUALITY = 80
+
+
+def identity(path: str) -> str:
+    """Name a stored image by where it is and when it was last written."""
+    stat = os.stat(path)
+
+    return sha256(
+        '{0}-{1}-{2}'.format(path, stat.st_size, stat.st_mtime_ns).encode('utf-8')
+    ).hexdigest()
+
+
+def transform(size: int, format: str) -> str:
+    return 'thumbnail-{0}-{1}-{2}'.format(size, format, QUALITY)
+
+
+def etag(path: str, size: int, format: str) -> str:
+    """A tag changing whenever the thumbnail would be different."""
+    return '{0}-{1}'.format(identity(path), transform(size, format))
+
+
+def thumbnail(
+    path: str, size: int, format: str, store: Optional[DerivativeStore] = None
+) -> bytes:
+    """Get a thumbnail of the image at path fitting in size, making it if it
+    wasn't in store."""
+    key = (identity(path), transform(size, format))
+
+    data = store.get(*key) if store else None
+    if data is None:
+        data = resize(ImageSource(path), size, size, format, QUALITY)
+
+        if store:
+            store.put(*key, data)
+
+    return data
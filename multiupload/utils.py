@@ -12,6 +12,8 @@ from flask import current_app, flash, g, redirect, request, session, url_for
 import requests
 from werkzeug.datastructures import MultiDict
 
+from multiupload.breaker import get_breaker
+from multiupload.constant import Sites
 from multiupload.models import Notice, User
 from multiupload.sentry import sentry
 
@@ -143,19 +145,24 @@ def write_upload_time(
     send_to_influx(point)
 
 
-def write_site_response(site: int, req: requests.Response) -> None:
+def write_site_response(site: int, req: requests.Response, retry: bool = False) -> None:
+    tags = {'site': site, 'method': req.request.method, 'status_code': req.status_code}
+
+    if retry:
+        tags['retry'] = True
+
     point = {
         'measurement': 'site_response',
         'fields': {'duration': req.elapsed.total_seconds()},
-        'tags': {
-            'site': site,
-            'method': req.request.method,
-            'status_code': req.status_code,
-        },
+        'tags': tags,
     }
 
     send_to_influx(point)
 
+    get_breaker().observe(
+        Sites(site).name, req.status_code, req.elapsed.total_seconds()
+    )
+
 
 def parse_resize(s: str) -> Union[None, Tuple[int, int]]:
     match = RESIZE_EXP.match(s.strip())
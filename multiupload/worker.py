@@ -0,0 +1,159 @@
+"""Runs queued and scheduled uploads outside of web requests when UPLOAD_QUEUE
+is enabled.
+
+Start with `python -m multiupload.worker`, as many processes as needed.
+"""
+
+from datetime import timedelta
+import os
+import socket
+from threading import Thread
+import time
+from typing import Callable, Dict, Optional
+
+from flask import g, session
+from influxdb import InfluxDBClient
+import simplecrypt
+
+from multiupload import app
+from multiupload.models import JobStatus, UploadJob, User, db
+from multiupload.pipeline import JobLogSink, UploadEvent, UploadPipeline
+from multiupload.ratelimit import get_limiter
+from multiupload.routes.upload import group_pipeline, saved_pipeline
+from multiupload.sentry import sentry
+
+JOB_KINDS: Dict[str, Callable[[int], Optional[UploadPipeline]]] = {
+    'art': saved_pipeline,
+    'group': group_pipeline,
+}
+
+
+def spread_scheduled(job: UploadJob) -> None:
+    """Wait for a turn to start a scheduled job. Many jobs are scheduled for
+    the same round times, so they are started at a steady rate shared by every
+    worker instead of all at once."""
+    if not job.scheduled_at:
+        return
+
+    get_limiter().acquire(
+        'scheduled-jobs',
+        app.config.get('SCHEDULE_RATE', 0.2),
+        app.config.get('SCHEDULE_BURST', 5),
+    )
+
+
+def job_poller(job_id: int) -> Callable[[], bool]:
+    """Check if a job was cancelled while it runs, and send a heartbeat a few
+    times within JOB_TIMEOUT so other workers don't expire it."""
+    interval = app.config.get('JOB_TIMEOUT', 900) / 3
+    last_beat = time.monotonic()
+
+    def should_stop() -> bool:
+        nonlocal last_beat
+
+        if time.monotonic() - last_beat >= interval:
+            UploadJob.heartbeat(job_id)
+            last_beat = time.monotonic()
+
+        return UploadJob.is_cancel_requested(job_id)
+
+    return should_stop
+
+
+def run_job(job: UploadJob) -> None:
+    """Run a claimed job as the user who created it, recording each event."""
+    with app.app_context(), app.test_request_context():
+        session['id'] = job.user_id
+
+        g.user = User.query.get(job.user_id)
+        g.job_id = job.id
+
+        influx = app.config.get('INFLUXDB', None)
+        if influx:
+            g.influx = InfluxDBClient(**influx)
+
+        status = JobStatus.done
+        sink = JobLogSink(job)
+
+        try:
+            # Fails if the batch's secret was released or SECRET_KEY changed
+            password = simplecrypt.decrypt(
+                app.config['SECRET_KEY'], job.password_secret
+            )
+            session['password'] = password.decode('utf-8')
+
+            pipeline = JOB_KINDS[job.kind](job.target_id)
+
+            if pipeline:
+                for _ in pipeline.run([sink], job_poller(job.id)):
+                    pass
+
+                if pipeline.cancelled.is_set():
+                    status = JobStatus.cancelled
+            else:
+                # Target was removed after the job was queued
+                sink.handle(UploadEvent('done'))
+        except Exception:
+            sentry.captureException()
+            db.session.rollback()
+
+            sink.handle(UploadEvent('failed', 'Unable to finish uploading.'))
+            sink.handle(UploadEvent('done'))
+            status = JobStatus.failed
+
+        job.finish(status)
+        db.session.commit()
+
+
+def expire_stale_jobs() -> None:
+    """Fail jobs whose worker stopped, so clients following them finish.
+
+    Submissions in a batch are queued again instead, accounts are removed
+    from them as they are uploaded to so nothing is posted twice."""
+    timeout = timedelta(seconds=app.config.get('JOB_TIMEOUT', 900))
+
+    for job in UploadJob.stale(timeout):
+        if job.batch_id and job.kind == 'art' and not job.cancel_requested:
+            job.requeue()
+            continue
+
+        job.add_event('event: done\ndata: completed\n\n')
+        job.finish(JobStatus.failed)
+
+    db.session.commit()
+
+
+def work(name: str) -> None:
+    poll_interval = app.config.get('JOB_POLL_INTERVAL', 0.5)
+
+    while True:
+        with app.app_context():
+            job = UploadJob.claim_next(name)
+            if job:
+                spread_scheduled(job)
+                run_job(job)
+                continue
+
+            expire_stale_jobs()
+
+        time.sleep(poll_interval)
+
+
+def main() -> None:
+    base_name = '{host}:{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+
+    threads = []
+    for i in range(app.config.get('JOB_WORKERS', 2)):
+        name = '{base}:{i}'.format(base=base_name, i=i)
+
+        thread = Thread(target=work, args=(name,), daemon=True)
+        thread.start()
+
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()